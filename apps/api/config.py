@@ -11,12 +11,31 @@ NOTEBOOKS_DB_DIR = DATA_DIR / "notebooks"
 LOGS_DIR = DATA_DIR / "logs"
 CITATIONS_DIR = DATA_DIR / "citations"
 NOTES_DIR = DATA_DIR / "notes"
+# Маркер первого запуска: демо-ноутбук создаётся, только пока его нет (FORCE_SEED=1 — всегда).
+SEED_MARKER = DATA_DIR / ".seeded"
+FORCE_SEED = os.getenv("FORCE_SEED", "0").strip().lower() in {"1", "true", "yes"}
 
 EMBEDDING_ENABLED = os.getenv("EMBEDDING_ENABLED", "1").strip().lower() not in {"0", "false", "no"}
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "ollama")
 EMBEDDING_ENDPOINT = os.getenv("EMBEDDING_ENDPOINT") or None
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
 EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL", "http://localhost:11434").rstrip("/")
+# Строить движок эмбеддингов при старте сервера, а не на первом запросе поиска.
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "1").strip().lower() not in {"0", "false", "no"}
+# Кэш векторов по тексту чанка: повторный парсинг без изменений текста не ходит к провайдеру.
+# Пустая строка отключает кэш.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", str(DATA_DIR / "embedding_cache.db")).strip() or None
+
+# Формат файлов промежуточного слоя парсинга: "json" (один документ) или "jsonl" (построчно).
+PARSING_FORMAT = os.getenv("PARSING_FORMAT", "json").strip().lower()
+# Сжатие файлов промежуточного слоя: "zstd" (нужен пакет zstandard) или "none".
+PARSING_COMPRESSION = os.getenv("PARSING_COMPRESSION", "none").strip().lower()
+
+# Параллельных заданий индексации (парсинг + эмбеддинг + запись в БД).
+INDEX_WORKERS = max(1, int(os.getenv("INDEX_WORKERS") or min(8, os.cpu_count() or 1)))
+
+# Сколько последних сообщений чата ноутбука держать в памяти (старые вытесняются).
+MAX_CHAT_MESSAGES = max(1, int(os.getenv("MAX_CHAT_MESSAGES", "1000")))
 
 MAX_UPLOAD_MB = 25
 UPLOAD_MAX_BYTES = MAX_UPLOAD_MB * 1024 * 1024
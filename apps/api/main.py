@@ -1,14 +1,18 @@
 """Точка входа FastAPI-приложения и регистрация middleware/роутеров."""
 
 # --- Imports ---
+import asyncio
 import logging
 import time
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
+from .config import EMBEDDING_WARMUP
 from .logging_setup import setup_logging
 from .routers import agents, chat, citations, client_events, global_notes, llm, notebooks, sources
+from .services.search_service import warmup_engine
+from .store import store
 
 app = FastAPI(title="Local RAG Assistant API")
 logger = logging.getLogger(__name__)
@@ -33,14 +37,22 @@ app.include_router(agents.router)
 
 # --- Основные блоки ---
 @app.on_event("startup")
-def on_startup() -> None:
+async def on_startup() -> None:
     app_log, ui_log = setup_logging()
+    if EMBEDDING_WARMUP:
+        # Движок эмбеддингов строится в фоне, пока сервер дозапускается: первый поиск его уже застаёт.
+        app.state.embedding_warmup = asyncio.get_running_loop().run_in_executor(None, warmup_engine)
     logger.info(
         "Application startup completed",
         extra={"event": "app.ready", "details": f"app_log={app_log} | ui_log={ui_log}"},
     )
 
 
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    store.shutdown()
+
+
 @app.middleware("http")
 async def http_logging_middleware(request: Request, call_next):
     started = time.perf_counter()
@@ -8,7 +8,7 @@ from uuid import uuid4
 from fastapi import APIRouter, Query
 from fastapi.responses import StreamingResponse
 
-from ..schemas import ChatRequest, ChatResponse, Citation, CitationLocation
+from ..schemas import ChatMessage, ChatRequest, ChatResponse, Citation, CitationLocation
 from .agents import resolve_agent
 from ..services.chat_modes import (
     CHAT_MODES_BY_CODE,
@@ -34,7 +34,7 @@ def _to_citation(notebook_id: str, chunk: dict, source_order_map: dict[str, int]
     doc_order = source_order_map.get(source_id, 0)
     score = min(1.0, max(0.0, float(chunk.get("score", 0.0))))
     return Citation(
-        id=str(uuid4()),
+        id=uuid4().hex,
         notebook_id=notebook_id,
         source_id=source_id,
         filename=filename,
@@ -86,9 +86,9 @@ def _agent_context(selected_agent: dict | None) -> str:
     )
 
 
-@router.get("/notebooks/{notebook_id}/messages")
-def list_messages(notebook_id: str):
-    return store.messages.get(notebook_id, [])
+@router.get("/notebooks/{notebook_id}/messages", response_model=list[ChatMessage])
+def list_messages(notebook_id: str) -> list[ChatMessage]:
+    return [message.to_schema() for message in store.messages.get(notebook_id, ())]
 
 
 @router.delete("/notebooks/{notebook_id}/messages", status_code=204)
@@ -104,7 +104,7 @@ async def chat(payload: ChatRequest) -> ChatResponse:
 
     if mode == "agent":
         selected_agent = resolve_agent(payload.agent_id)
-        history = build_chat_history(store.messages.get(payload.notebook_id, []))
+        history = build_chat_history(store.messages.get(payload.notebook_id, ()))
         response_text = await generate_model_answer(
             provider=payload.provider or str((selected_agent or {}).get("provider", "ollama")),
             base_url=_resolve_base_url(payload.base_url),
@@ -126,7 +126,7 @@ async def chat(payload: ChatRequest) -> ChatResponse:
         if mode == "rag" and not sources_found:
             response_text = RAG_NO_SOURCES_MESSAGE
         else:
-            history = build_chat_history(store.messages.get(payload.notebook_id, []))
+            history = build_chat_history(store.messages.get(payload.notebook_id, ()))
             rag_context = build_rag_context(relevant_chunks, source_order_map) if sources_found else ""
             response_text = await generate_model_answer(
                 provider=payload.provider,
@@ -139,7 +139,7 @@ async def chat(payload: ChatRequest) -> ChatResponse:
             )
 
     assistant_message = store.add_message(payload.notebook_id, "assistant", response_text)
-    return ChatResponse(message=assistant_message, citations=citations)
+    return ChatResponse(message=assistant_message.to_schema(), citations=citations)
 
 
 @router.get("/chat/stream")
@@ -177,7 +177,7 @@ async def chat_stream(
 
         if normalized_mode == "agent":
             selected_agent = resolve_agent(agent_id)
-            history = build_chat_history(store.messages.get(notebook_id, []), limit=max_history)
+            history = build_chat_history(store.messages.get(notebook_id, ()), limit=max_history)
             citations: list[Citation] = []
             assembled: list[str] = []
             try:
@@ -230,7 +230,7 @@ async def chat_stream(
             yield to_sse("done", {"message_id": assistant.id})
             return
 
-        history = build_chat_history(store.messages.get(notebook_id, []), limit=max_history)
+        history = build_chat_history(store.messages.get(notebook_id, ()), limit=max_history)
         rag_context = build_rag_context(relevant_chunks, source_order_map) if sources_found else ""
 
         assembled: list[str] = []
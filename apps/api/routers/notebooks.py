@@ -45,14 +45,14 @@ def duplicate_notebook(notebook_id: str) -> Notebook:
 
 
 @router.delete("/notebooks/{notebook_id}", status_code=204)
-def delete_notebook(notebook_id: str) -> None:
-    if not store.delete_notebook(notebook_id):
+async def delete_notebook(notebook_id: str) -> None:
+    if not await store.delete_notebook_async(notebook_id):
         raise HTTPException(status_code=404, detail="Notebook not found")
 
 
 @router.get("/notebooks/{notebook_id}/index/status", response_model=IndexStatus)
 def index_status(notebook_id: str) -> IndexStatus:
-    items = [source for source in store.sources.values() if source.notebook_id == notebook_id]
+    items = store.sources_for_notebook(notebook_id)
     return IndexStatus(
         total=len(items),
         indexed=sum(1 for source in items if source.status == "indexed"),
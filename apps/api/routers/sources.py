@@ -3,6 +3,7 @@
 # --- Imports ---
 from __future__ import annotations
 
+import asyncio
 import importlib.util
 import os
 import subprocess
@@ -15,10 +16,13 @@ from starlette.datastructures import UploadFile as StarletteUploadFile
 
 from ..config import DOCS_DIR, UPLOAD_MAX_BYTES
 from ..schemas import AddPathRequest, ReorderSourcesRequest, Source, UpdateSourceRequest
+from ..services.orchestrator import UploadTooLargeError
 from ..store import store
 
 router = APIRouter(prefix="/api", tags=["sources"])
 HAS_MULTIPART = importlib.util.find_spec("multipart") is not None
+# Запасной парсер multipart пишет тело на диск порциями не меньше этой (запись — в пуле потоков).
+_FALLBACK_WRITE_BYTES = 1024 * 1024
 
 
 # --- Основные блоки ---
@@ -46,10 +50,15 @@ def _ensure_notebook_exists(notebook_id: str) -> None:
         raise HTTPException(status_code=404, detail="Notebook not found")
 
 
-async def _persist_content(notebook_id: str, filename: str, content: bytes) -> Source:
-    if len(content) > UPLOAD_MAX_BYTES:
+async def _persist_upload(notebook_id: str, upload: StarletteUploadFile) -> Source:
+    if upload.size is not None and upload.size > UPLOAD_MAX_BYTES:
         raise HTTPException(status_code=413, detail="Upload too large")
-    return await store.save_upload(notebook_id, _sanitize_filename(filename), content)
+    try:
+        return await store.save_upload(
+            notebook_id, _sanitize_filename(upload.filename or "upload.bin"), upload, max_bytes=UPLOAD_MAX_BYTES
+        )
+    except UploadTooLargeError as exc:
+        raise HTTPException(status_code=413, detail="Upload too large") from exc
 
 
 async def _save_multipart_file_stream(request: Request, notebook_id: str) -> tuple[str, Path]:
@@ -91,24 +100,24 @@ async def _save_multipart_file_stream(request: Request, notebook_id: str) -> tup
                 _cleanup_partial_file()
                 raise HTTPException(status_code=400, detail="Multipart file field 'file' not found")
             filename = _extract_filename(headers)
-            output_path = store._next_available_path(notebook_id, filename)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_file = output_path.open("wb")
+            output_path = await asyncio.to_thread(store._next_available_path, notebook_id, filename)
+            output_file = await asyncio.to_thread(output_path.open, "wb")
             header_done = True
             buffer = bytearray(body)
 
         if header_done and output_file:
             boundary_index = buffer.find(marker)
             if boundary_index != -1:
-                output_file.write(buffer[:boundary_index])
+                await asyncio.to_thread(output_file.write, buffer[:boundary_index])
                 output_file.close()
                 return output_path.name, output_path
 
+            # Хвост длины маркера придерживаем: граница может прийти разрезанной между чанками.
             keep_tail = len(marker) + 4
-            if len(buffer) > keep_tail:
+            if len(buffer) - keep_tail >= _FALLBACK_WRITE_BYTES:
                 writable = len(buffer) - keep_tail
-                output_file.write(buffer[:writable])
-                buffer = buffer[writable:]
+                await asyncio.to_thread(output_file.write, buffer[:writable])
+                del buffer[:writable]
 
     _cleanup_partial_file()
     raise HTTPException(status_code=400, detail="Malformed multipart payload")
@@ -117,7 +126,7 @@ async def _save_multipart_file_stream(request: Request, notebook_id: str) -> tup
 @router.get("/notebooks/{notebook_id}/sources", response_model=list[Source])
 def list_sources(notebook_id: str) -> list[Source]:
     _ensure_notebook_exists(notebook_id)
-    sources = [source for source in store.sources.values() if source.notebook_id == notebook_id]
+    sources = store.sources_for_notebook(notebook_id)
     return sorted(sources, key=lambda s: (s.sort_order, s.added_at))
 
 
@@ -133,11 +142,10 @@ async def upload_source(notebook_id: str, request: Request) -> Source:
         file = form.get("file")
         if not isinstance(file, StarletteUploadFile):
             raise HTTPException(status_code=400, detail="Multipart file field 'file' not found")
-        content = await file.read()
-        return await _persist_content(notebook_id, file.filename or "upload.bin", content)
+        return await _persist_upload(notebook_id, file)
 
     _, file_path = await _save_multipart_file_stream(request, notebook_id)
-    return store.add_source_from_path(notebook_id, str(file_path), indexed=False)
+    return await asyncio.to_thread(store.add_source_from_path, notebook_id, str(file_path), indexed=False)
 
 
 @router.post("/notebooks/{notebook_id}/sources/add-path", response_model=Source)
@@ -2,10 +2,16 @@
 
 from __future__ import annotations
 
+import base64
+import hashlib
 import json
 import logging
 import math
 import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
@@ -14,6 +20,7 @@ from typing import Callable, Literal, Optional
 import httpx
 
 from ..config import CHUNKS_DIR, NOTEBOOKS_DB_DIR
+from .parse.serializer import find_parsing_file, load_parsing_payload
 
 try:
     import numpy as np
@@ -22,6 +29,13 @@ except Exception:  # noqa: BLE001
 
 logger = logging.getLogger(__name__)
 
+# Батч эмбеддингов ограничен и числом текстов, и приблизительным бюджетом токенов (~4 символа на токен).
+_MAX_BATCH_SIZE = 96
+_MAX_BATCH_TOKENS = 8192
+_CHARS_PER_TOKEN = 4
+# Одновременных HTTP-запросов к провайдеру при эмбеддинге нескольких батчей одного документа.
+_EMBED_CONCURRENCY = 4
+
 
 class EmbeddingServerUnavailableError(RuntimeError):
     pass
@@ -41,6 +55,8 @@ class EmbeddingProviderConfig:
     enabled: bool = True
     fallback_dim: int = 384
     api_timeout: int = 120
+    # SQLite-кэш векторов по (хеш текста, провайдер, модель); None — без кэша.
+    cache_path: str | None = None
 
 
 @dataclass
@@ -65,6 +81,9 @@ class EmbeddingConfig:
     parsing_root: str = str(CHUNKS_DIR)
     base_root: str = str(NOTEBOOKS_DB_DIR)
     delete_parsing_after_embed: bool = False
+    # int8 в chunk-файлах process_document: эти файлы никто не читает обратно,
+    # поэтому по умолчанию пишутся float-списки; включать вместе с потребителем decode_chunk_embedding.
+    quantize_chunk_files: bool = False
 
 
 @dataclass
@@ -131,16 +150,89 @@ class ProcessingReport:
     embedding_dim: int
 
 
+class _EmbeddingCache:
+    """Персистентный кэш эмбеддингов: ключ — (blake2b текста, провайдер, base_url, модель), вектор — float32 BLOB."""
+
+    def __init__(self, db_path: str | Path) -> None:
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Это только кэш: таблицу старой схемы (без base_url в ключе) проще пересоздать, чем мигрировать.
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if columns and "base_url" not in columns:
+            self._conn.execute("DROP TABLE embeddings")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                hash BLOB NOT NULL,
+                provider TEXT NOT NULL,
+                base_url TEXT NOT NULL,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (hash, provider, base_url, model)
+            ) WITHOUT ROWID
+            """
+        )
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, hashes: list[bytes], scope: tuple[str, str, str]) -> dict[bytes, list[float]]:
+        """Найденные векторы по хешам в ``scope`` = (провайдер, base_url, модель); отсутствующих ключей нет."""
+        unique = list(dict.fromkeys(hashes))
+        found: dict[bytes, list[float]] = {}
+        with self._lock:
+            # Не больше 900 параметров на запрос — ниже лимита SQLite на старых сборках.
+            for offset in range(0, len(unique), 900):
+                part = unique[offset : offset + 900]
+                rows = self._conn.execute(
+                    "SELECT hash, vector FROM embeddings WHERE provider = ? AND base_url = ? AND model = ? "
+                    f"AND hash IN ({','.join('?' * len(part))})",
+                    (*scope, *part),
+                ).fetchall()
+                for digest, blob in rows:
+                    found[bytes(digest)] = array("f", bytes(blob)).tolist()
+        return found
+
+    def put_many(self, pairs: list[tuple[bytes, list[float]]], scope: tuple[str, str, str]) -> None:
+        if not pairs:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, provider, base_url, model, vector) VALUES (?, ?, ?, ?, ?)",
+                [(digest, *scope, array("f", vector).tobytes()) for digest, vector in pairs],
+            )
+
+
 class EmbeddingClient:
     """HTTP-клиент эмбеддингов с авто-подбором endpoint и fallback-моделей."""
     def __init__(self, provider: EmbeddingProviderConfig):
         self._provider = provider
-        self._client = httpx.Client(timeout=provider.api_timeout)
+        self._client = httpx.Client(
+            timeout=provider.api_timeout,
+            headers={"Accept-Encoding": "gzip"},
+            limits=httpx.Limits(max_keepalive_connections=_EMBED_CONCURRENCY, keepalive_expiry=30.0),
+        )
         self._base_url = provider.base_url.rstrip("/")
         self._embedding_dim = max(1, int(provider.fallback_dim or 384))
         self._active_embed_target = self._embedding_targets()[0]
+        # None — ещё не известно; True — сервер принял батч (native/openai), и поштучный
+        # legacy-endpoint больше не пробуется; False — работает только legacy.
+        self._batched: bool | None = None
         self._model_candidates = self._build_model_candidates(provider.model_name)
         self._active_model = self._model_candidates[0]
+        # Модель, уже ответившая эмбеддингами: для неё /api/tags перед каждым батчем не запрашивается.
+        self._verified_model: str | None = None
+        self._cache = _EmbeddingCache(provider.cache_path) if provider.cache_path else None
+        # Выбор модели/endpoint-а — общий для потоков, эмбеддящих батчи параллельно: снимок и
+        # смена состояния под блокировкой, перебор кандидатов — один поток за раз.
+        self._select_lock = threading.Lock()
+        # Растёт при каждой смене модели: по нему вызывающий видит, что часть батчей ушла в другую модель.
+        self.model_generation = 0
         self._disabled_due_to_model_not_found = False
         self._available = False
         if not provider.enabled:
@@ -205,10 +297,11 @@ class EmbeddingClient:
             return [(custom, "native")]
         if (self._provider.provider or "ollama").lower() == "openai":
             return [("/v1/embeddings", "openai")]
+        # Батчевые endpoint-ы раньше legacy: тот принимает один prompt за запрос.
         if self._base_url.endswith("/api"):
-            return [("/embed", "native"), ("/embeddings", "legacy"), ("/v1/embeddings", "openai")]
+            return [("/embed", "native"), ("/v1/embeddings", "openai"), ("/embeddings", "legacy")]
         else:
-            return [('/api/embed', 'native'), ('/api/embeddings', 'legacy'), ('/v1/embeddings', 'openai')]
+            return [('/api/embed', 'native'), ('/v1/embeddings', 'openai'), ('/api/embeddings', 'legacy')]
 
     def _parse_embeddings_response(self, response: httpx.Response, expected_size: int) -> list[list[float]]:
         data = response.json()
@@ -231,54 +324,116 @@ class EmbeddingClient:
                 return [single]
         return [self._zero() for _ in range(expected_size)]
 
-    def _request_embeddings(self, path: str, mode: Literal["native", "openai", "legacy"], texts: list[str]) -> list[list[float]]:
+    def _request_embeddings(self, path: str, mode: Literal["native", "openai", "legacy"], texts: list[str], model: str) -> list[list[float]]:
         url = f"{self._base_url}{path}"
         if mode == "legacy":
             vectors: list[list[float]] = []
             for text in texts:
-                response = self._client.post(url, json={"model": self._active_model, "prompt": text})
+                response = self._client.post(url, json={"model": model, "prompt": text})
                 response.raise_for_status()
                 vectors.extend(self._parse_embeddings_response(response, 1))
             return vectors
-        payload = {"model": self._active_model, "input": texts}
+        payload = {"model": model, "input": texts}
         response = self._client.post(url, json=payload)
         response.raise_for_status()
         return self._parse_embeddings_response(response, len(texts))
 
     def get_embeddings(self, texts: list[str], use_retry: bool = True) -> list[list[float]]:
-        """Запрашивает эмбеддинги батчем; при ошибках возвращает нулевые векторы."""
-        if not self._provider.enabled:
-            return [self._zero() for _ in texts]
+        """Запрашивает эмбеддинги батчем; при ошибках возвращает нулевые векторы.
+
+        С ``cache_path`` по сети уходят только тексты, которых нет в кэше.
+        """
+        if self._cache is None or not self._provider.enabled or not texts:
+            return self._fetch_embeddings(texts, use_retry)[0]
+        hashes = [self._cache.text_hash(text) for text in texts]
+        with self._select_lock:
+            model = self._active_model
+        scope = self._cache_scope(model)
+        cached = self._cache.get_many(hashes, scope)
+        missing = [idx for idx, digest in enumerate(hashes) if digest not in cached]
+        if not missing:
+            return [cached[digest] for digest in hashes]
+        fetched, answered = self._fetch_embeddings([texts[idx] for idx in missing], use_retry)
+        if answered is not None and answered != model:
+            # Ответила другая модель-кандидат: её векторы нельзя ни класть под ключ прежней модели,
+            # ни смешивать с попаданиями из кэша — считаем весь батч заново.
+            return self._fetch_embeddings(texts, use_retry)[0] if cached else fetched
+        if answered is not None:
+            # Нулевые векторы — признак ошибки провайдера, их не кэшируем.
+            self._cache.put_many([(hashes[idx], vector) for idx, vector in zip(missing, fetched) if any(vector)], scope)
+        result = [cached.get(digest) for digest in hashes]
+        for idx, vector in zip(missing, fetched):
+            result[idx] = vector
+        return result
+
+    def _cache_scope(self, model: str) -> tuple[str, str, str]:
+        """Ключ кэша без хеша: провайдер, нормализованный base_url и модель, которая ответила."""
+        base_url = self._base_url.lower()
+        # "http://host:11434" и "http://host:11434/api" — один и тот же сервер.
+        if base_url.endswith("/api"):
+            base_url = base_url[: -len("/api")]
+        return (self._provider.provider or "ollama").lower(), base_url, model
+
+    def _fetch_embeddings(self, texts: list[str], use_retry: bool) -> tuple[list[list[float]], str | None]:
+        """Векторы и модель, которая их посчитала (``None`` — ошибка, векторы нулевые).
+
+        Модель и endpoint передаются в запрос явно, а не читаются из общего состояния: параллельные
+        батчи не могут получить векторы разных моделей из-за чужой смены ``_active_model``.
+        """
+        if not self._provider.enabled or self._disabled_due_to_model_not_found:
+            return [self._zero() for _ in texts], None
+        with self._select_lock:
+            model, target, verified = self._active_model, self._active_embed_target, self._verified_model
+        if model and model == verified:
+            # Быстрый путь: проверенная пара модель/endpoint, без блокировки на время запроса.
+            try:
+                return self._to_vectors(self._request_embeddings(target[0], target[1], texts, model)), model
+            except Exception:  # noqa: BLE001
+                pass
+        with self._select_lock:
+            return self._select_and_fetch(texts, use_retry)
+
+    def _select_and_fetch(self, texts: list[str], use_retry: bool) -> tuple[list[list[float]], str | None]:
+        """Перебор моделей-кандидатов и endpoint-ов; вызывается под ``_select_lock``."""
         if self._disabled_due_to_model_not_found:
-            return [self._zero() for _ in texts]
-
+            return [self._zero() for _ in texts], None
         last_error: Exception | None = None
         model_candidates = [self._active_model] + [item for item in self._model_candidates if item != self._active_model]
 
         for model_name in model_candidates:
             if not model_name:
                 continue
-            if use_retry and not self._model_exists_on_server(model_name):
+            if use_retry and model_name != self._verified_model and not self._model_exists_on_server(model_name):
                 continue
 
-            self._active_model = model_name
             targets = [self._active_embed_target] + [item for item in self._embedding_targets() if item != self._active_embed_target]
+            if self._batched:
+                targets = [item for item in targets if item[1] != "legacy"]
             for candidate in targets:
                 try:
-                    embeddings = self._request_embeddings(candidate[0], candidate[1], texts)
-                    self._active_embed_target = candidate
-                    self._available = True
-                    return [[float(x) for x in item] if isinstance(item, list) and item else self._zero() for item in embeddings]
+                    embeddings = self._request_embeddings(candidate[0], candidate[1], texts, model_name)
                 except Exception as exc:  # noqa: BLE001
                     last_error = exc
                     continue
+                if model_name != self._active_model:
+                    self.model_generation += 1
+                self._active_model = model_name
+                self._active_embed_target = candidate
+                self._batched = candidate[1] != "legacy"
+                self._verified_model = model_name
+                self._available = True
+                return self._to_vectors(embeddings), model_name
 
         if last_error and self._is_model_not_found_error(last_error):
             self._disabled_due_to_model_not_found = True
             logger.warning('Embedding model not found on Ollama server: %s', self._provider.model_name)
 
+        self._verified_model = None
         self._available = False
-        return [self._zero() for _ in texts]
+        return [self._zero() for _ in texts], None
+
+    def _to_vectors(self, embeddings: list) -> list[list[float]]:
+        return [[float(x) for x in item] if isinstance(item, list) and item else self._zero() for item in embeddings]
 
 
 class EmbeddingEngine:
@@ -294,45 +449,89 @@ class EmbeddingEngine:
         return self.client.is_available
 
     def process_document(self, notebook_id: str, doc_id: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> list[EmbeddedChunk]:
-        """Полный цикл документа: parsing JSON -> эмбеддинг -> запись результатов."""
-        parsing_file = Path(self.config.parsing_root) / notebook_id / f"{doc_id}.json"
-        payload = json.loads(parsing_file.read_text(encoding="utf-8"))
-        chunks = payload["chunks"] if isinstance(payload, dict) and "chunks" in payload else payload
+        """Полный цикл документа: результат парсинга -> эмбеддинг -> запись результатов."""
+        chunks = self.parsing_chunks(notebook_id, doc_id)
         built = self.embed_chunks(chunks, notebook_id=notebook_id, doc_id=doc_id, progress_callback=progress_callback)
         self._add_vectors(notebook_id, [item.embedding for item in built if not item.embedding_failed])
 
         out_dir = Path(self.config.base_root) / notebook_id / "chunks"
         out_dir.mkdir(parents=True, exist_ok=True)
-        (out_dir / f"{doc_id}.json").write_text(json.dumps([_embedded_to_dict(item) for item in built], ensure_ascii=False, indent=2), encoding="utf-8")
+        rows = [_embedded_to_dict(item) for item in built]
+        quantization = self.config.quantization
+        if self.config.quantize_chunk_files and quantization.enabled and quantization.method != "none":
+            _quantize_rows_int8(rows)
+        (out_dir / f"{doc_id}.json").write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
         self._update_registry(notebook_id, doc_id, len(built))
         if self.config.delete_parsing_after_embed:
-            parsing_file.unlink(missing_ok=True)
+            parsing_file = find_parsing_file(notebook_id, doc_id, root=Path(self.config.parsing_root))
+            if parsing_file is not None:
+                parsing_file.unlink(missing_ok=True)
         return built
 
     def embed_document_from_parsing(self, notebook_id: str, doc_id: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> list[EmbeddedChunk]:
-        parsing_file = Path(self.config.parsing_root) / notebook_id / f"{doc_id}.json"
-        payload = json.loads(parsing_file.read_text(encoding="utf-8"))
-        chunks = payload["chunks"] if isinstance(payload, dict) and "chunks" in payload else payload
+        chunks = self.parsing_chunks(notebook_id, doc_id)
         return self.embed_chunks(chunks, notebook_id=notebook_id, doc_id=doc_id, progress_callback=progress_callback)
 
+    def parsing_chunks(self, notebook_id: str, doc_id: str) -> list[dict]:
+        """Чанки документа из результата парсинга: БД ноутбука, затем файл промежуточного слоя."""
+        # Для дерева по умолчанию (CHUNKS_DIR) основной источник — БД ноутбука.
+        root = None if Path(self.config.parsing_root) == CHUNKS_DIR else Path(self.config.parsing_root)
+        return load_parsing_payload(notebook_id, doc_id, root=root)["chunks"]
+
+    def embed_texts(self, texts: list[str], batch_size: int | None = None) -> list[list[float]]:
+        """Эмбеддинги произвольного набора текстов запросами по ``batch_size`` (с нормализацией)."""
+        batch_size = batch_size or self.config.batch_size
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.client.get_embeddings(texts[start : start + batch_size])
+            if self.config.normalize_embeddings:
+                batch = [_normalize(vec) for vec in batch]
+            vectors.extend(batch)
+        return vectors
+
+    def embed_batch(self, texts: list[str], max_batch_tokens: int = _MAX_BATCH_TOKENS, max_batch_size: int = _MAX_BATCH_SIZE) -> list[list[float]]:
+        """Эмбеддинги ``texts`` в исходном порядке: батчи по бюджету токенов, до ``_EMBED_CONCURRENCY`` запросов параллельно."""
+        return [vec for batch in self._embed_batches(texts, max_batch_tokens, max_batch_size) for vec in batch]
+
+    def _embed_batches(self, texts: list[str], max_batch_tokens: int, max_batch_size: int):
+        """Генератор векторов по батчам в исходном порядке (для прогресса по мере готовности)."""
+        bounds = _token_budget_batches(texts, max_batch_tokens, max_batch_size)
+        if len(bounds) <= 1:
+            for start, end in bounds:
+                yield self.embed_texts(texts[start:end], batch_size=end - start)
+            return
+        generation = getattr(self.client, "model_generation", 0)
+        with ThreadPoolExecutor(max_workers=min(_EMBED_CONCURRENCY, len(bounds)), thread_name_prefix="embed") as pool:
+            batches = list(pool.map(lambda bound: self.embed_texts(texts[bound[0] : bound[1]], batch_size=bound[1] - bound[0]), bounds))
+        if getattr(self.client, "model_generation", 0) != generation:
+            # Посреди документа клиент сменил модель: векторы разных моделей несравнимы —
+            # пересчитываем весь документ последовательно уже выбранной моделью.
+            batches = [self.embed_texts(texts[start:end], batch_size=end - start) for start, end in bounds]
+        yield from batches
+
+    def build_embedded_chunks(self, chunks: list[dict], vectors: list[list[float]], notebook_id: str, doc_id: str, start: int = 0, total: int | None = None) -> list[EmbeddedChunk]:
+        """Собирает EmbeddedChunk с мета-информацией из чанков и уже посчитанных векторов."""
+        total = len(chunks) if total is None else total
+        now = _now_iso()
+        built: list[EmbeddedChunk] = []
+        for offset, (chunk, vector) in enumerate(zip(chunks, vectors)):
+            idx = start + offset
+            chunk_id = chunk.get("chunk_id") or f"{doc_id}:{idx}"
+            meta = ChunkMeta(chunk_id=chunk_id, doc_id=doc_id, notebook_id=notebook_id, chunk_index=idx, total_chunks=total, page_start=chunk.get("page_number"), page_end=chunk.get("page_number"), char_count=len(chunk.get("text", "")), token_count=max(1, len(chunk.get("text", "").split())) if chunk.get("text") else 0, language=None, content_type=_map_content_type(chunk), prev_chunk_id=f"{doc_id}:{idx - 1}" if idx > 0 else None, next_chunk_id=f"{doc_id}:{idx + 1}" if idx + 1 < total else None, heading_path=[v for v in [chunk.get("parent_header"), chunk.get("section_header")] if v], source_created_at=None, indexed_at=now)
+            built.append(EmbeddedChunk(parsed_chunk=chunk, embedding=vector, embedding_model=self.config.provider.model_name, embedded_at=now, meta=meta, embedding_failed=not any(abs(x) > 0 for x in vector)))
+        return built
+
     def embed_chunks(self, chunks: list[dict], notebook_id: str, doc_id: str, progress_callback: Optional[Callable[[int, int], None]] = None) -> list[EmbeddedChunk]:
         """Батчево эмбеддит чанки и обогащает их служебной мета-информацией."""
-        total, done = len(chunks), 0
+        total = len(chunks)
         all_chunks: list[EmbeddedChunk] = []
-        now = _now_iso()
-        for start in range(0, total, self.config.batch_size):
-            batch = chunks[start : start + self.config.batch_size]
-            vectors = self.client.get_embeddings([item.get("embedding_text") or item.get("text", "") for item in batch])
-            if self.config.normalize_embeddings:
-                vectors = [_normalize(vec) for vec in vectors]
-            for batch_index, (chunk, vector) in enumerate(zip(batch, vectors)):
-                idx = start + batch_index
-                chunk_id = chunk.get("chunk_id") or f"{doc_id}:{idx}"
-                meta = ChunkMeta(chunk_id=chunk_id, doc_id=doc_id, notebook_id=notebook_id, chunk_index=idx, total_chunks=total, page_start=chunk.get("page_number"), page_end=chunk.get("page_number"), char_count=len(chunk.get("text", "")), token_count=max(1, len(chunk.get("text", "").split())) if chunk.get("text") else 0, language=None, content_type=_map_content_type(chunk), prev_chunk_id=f"{doc_id}:{idx - 1}" if idx > 0 else None, next_chunk_id=f"{doc_id}:{idx + 1}" if idx + 1 < total else None, heading_path=[v for v in [chunk.get("parent_header"), chunk.get("section_header")] if v], source_created_at=None, indexed_at=now)
-                all_chunks.append(EmbeddedChunk(parsed_chunk=chunk, embedding=vector, embedding_model=self.config.provider.model_name, embedded_at=now, meta=meta, embedding_failed=not any(abs(x) > 0 for x in vector)))
-                done += 1
+        texts = [embedding_text(item) for item in chunks]
+        for vectors in self._embed_batches(texts, _MAX_BATCH_TOKENS, _MAX_BATCH_SIZE):
+            start = len(all_chunks)
+            batch = chunks[start : start + len(vectors)]
+            all_chunks.extend(self.build_embedded_chunks(batch, vectors, notebook_id, doc_id, start=start, total=total))
             if progress_callback:
-                progress_callback(done, total)
+                progress_callback(len(all_chunks), total)
         return all_chunks
 
     def embed_query(self, query_text: str) -> list[float]:
@@ -375,6 +574,24 @@ def _largest_divisor_le(value: int, limit: int) -> int:
     return 1
 
 
+def _token_budget_batches(texts: list[str], max_batch_tokens: int, max_batch_size: int) -> list[tuple[int, int]]:
+    """Границы ``[start, end)`` батчей: не больше ``max_batch_size`` текстов и ~``max_batch_tokens`` токенов.
+
+    Текст длиннее бюджета уходит отдельным батчем.
+    """
+    bounds: list[tuple[int, int]] = []
+    start, tokens = 0, 0
+    for idx, text in enumerate(texts):
+        cost = max(1, len(text) // _CHARS_PER_TOKEN)
+        if idx > start and (idx - start >= max_batch_size or tokens + cost > max_batch_tokens):
+            bounds.append((start, idx))
+            start, tokens = idx, 0
+        tokens += cost
+    if start < len(texts):
+        bounds.append((start, len(texts)))
+    return bounds
+
+
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -397,5 +614,44 @@ def _map_content_type(chunk: dict) -> Literal["text", "heading", "list", "table"
     return "text"
 
 
+def embedding_text(chunk: dict) -> str:
+    """Текст чанка, который отправляется в модель эмбеддингов."""
+    return chunk.get("embedding_text") or chunk.get("text", "")
+
+
 def _embedded_to_dict(item: EmbeddedChunk) -> dict:
     return asdict(item)
+
+
+def _quantize_rows_int8(rows: list[dict]) -> None:
+    """Заменяет ``embedding`` строк на int8 (base64) с масштабом на вектор: 1 байт на компоненту."""
+    if not rows:
+        return
+    if np is not None and len({len(row["embedding"]) for row in rows}) == 1:
+        arr = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+        scales = np.abs(arr).max(axis=1) / 127
+        # Нулевой вектор (ошибка эмбеддинга) кодируется нулями при любом масштабе.
+        scales[scales == 0] = 1.0
+        quantized = np.rint(arr / scales[:, None]).astype(np.int8)
+        encoded = [(base64.b64encode(q.tobytes()).decode("ascii"), float(scale)) for q, scale in zip(quantized, scales)]
+    else:
+        encoded = []
+        for row in rows:
+            scale = max((abs(x) for x in row["embedding"]), default=0.0) / 127 or 1.0
+            values = array("b", [max(-127, min(127, round(x / scale))) for x in row["embedding"]])
+            encoded.append((base64.b64encode(values.tobytes()).decode("ascii"), scale))
+    for row, (embedding, scale) in zip(rows, encoded):
+        row["embedding"] = embedding
+        row["embedding_scale"] = scale
+        row["quant"] = "int8"
+
+
+def decode_chunk_embedding(row: dict) -> list[float]:
+    """Вектор строки chunk-файла ``process_document``: int8 (``quant == "int8"``) либо список float."""
+    if row.get("quant") != "int8":
+        return [float(x) for x in row["embedding"]]
+    raw = base64.b64decode(row["embedding"])
+    scale = float(row["embedding_scale"])
+    if np is not None:
+        return (np.frombuffer(raw, dtype=np.int8).astype(np.float32) * scale).tolist()
+    return [x * scale for x in array("b", raw)]
@@ -0,0 +1,82 @@
+"""Файловые утилиты сервисного слоя: копирование с клонированием экстентов (reflink/CoW)."""
+# --- Imports ---
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import fcntl
+except Exception:  # noqa: BLE001
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+# _IOW(0x94, 9, int): ioctl клонирования файла целиком (btrfs, XFS с reflink=1, bcachefs).
+_FICLONE = 0x40049409
+# Порция copy_file_range: ядро само делает reflink/server-side copy там, где это возможно.
+_COPY_RANGE_CHUNK = 1 << 30
+
+
+# --- Functions ---
+def _clone_linux(src: Path, dst: Path) -> bool:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                return True
+            except OSError:
+                pass
+        if not hasattr(os, "copy_file_range"):
+            return False
+        try:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, _COPY_RANGE_CHUNK))
+                if copied == 0:
+                    break
+                remaining -= copied
+            return remaining == 0
+        except OSError:
+            return False
+
+
+def _clone_macos(src: Path, dst: Path) -> bool:
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return False
+    clonefile = getattr(ctypes.CDLL(libc_name, use_errno=True), "clonefile", None)
+    if clonefile is None:
+        return False
+    # clonefile не перезаписывает существующий файл.
+    dst.unlink(missing_ok=True)
+    return clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+
+
+def reflink_copy(src: str | Path, dst: str | Path) -> Path:
+    """Копирует файл как ``shutil.copy2``, но на CoW-файловых системах клонирует экстенты.
+
+    Linux: ioctl FICLONE, затем ``os.copy_file_range``; macOS (APFS): ``clonefile``.
+    Если клонирование недоступно (другая ФС/ОС, разные тома), используется ``shutil.copy2``.
+    """
+    src, dst = Path(src), Path(dst)
+    cloned = False
+    try:
+        if sys.platform.startswith("linux"):
+            cloned = _clone_linux(src, dst)
+        elif sys.platform == "darwin":
+            cloned = _clone_macos(src, dst)
+    except OSError:
+        logger.debug("reflink copy failed for %s, falling back to copy2", src, exc_info=True)
+        cloned = False
+    if not cloned:
+        shutil.copy2(src, dst)
+        return dst
+    shutil.copystat(src, dst)
+    return dst
@@ -12,6 +12,63 @@ from typing import Any
 from ..config import DATA_DIR
 
 GLOBAL_DB_PATH = DATA_DIR / "store.db"
+# Временные таблицы/индексы сортировок — в памяти; файл БД читается через mmap (до 256 МБ).
+_MMAP_SIZE = 256 * 1024 * 1024
+
+_UPSERT_SOURCE_SQL = """
+    INSERT INTO sources (
+        id, notebook_id, filename, file_path, file_type, size_bytes, status,
+        added_at, is_enabled, has_docs, has_parsing, has_base, embeddings_status, index_warning, individual_config, sort_order
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        filename=excluded.filename, file_path=excluded.file_path,
+        file_type=excluded.file_type, size_bytes=excluded.size_bytes,
+        status=excluded.status, is_enabled=excluded.is_enabled,
+        has_docs=excluded.has_docs, has_parsing=excluded.has_parsing,
+        has_base=excluded.has_base,
+        embeddings_status=excluded.embeddings_status,
+        index_warning=excluded.index_warning, individual_config=excluded.individual_config,
+        sort_order=excluded.sort_order
+"""
+
+
+# Колонки, которые можно обновлять точечно через update_source_fields.
+_SOURCE_COLUMNS = frozenset({
+    "filename", "file_path", "file_type", "size_bytes", "status", "is_enabled", "has_docs",
+    "has_parsing", "has_base", "embeddings_status", "index_warning", "individual_config", "sort_order",
+})
+
+
+def _source_column_value(column: str, value: Any) -> Any:
+    """Значение колонки sources в представлении SQLite (bool → 0/1, конфиг → JSON)."""
+    if column == "individual_config":
+        return json.dumps(value, ensure_ascii=False) if value is not None else None
+    if isinstance(value, bool):
+        return 1 if value else 0
+    return value
+
+
+def _source_params(src: dict[str, Any]) -> tuple[Any, ...]:
+    """Параметры _UPSERT_SOURCE_SQL из словаря источника (с дефолтами и сериализацией конфига)."""
+    indiv = src.get("individual_config")
+    return (
+        src["id"],
+        src["notebook_id"],
+        src["filename"],
+        src["file_path"],
+        src.get("file_type", "other"),
+        src.get("size_bytes", 0),
+        src.get("status", "new"),
+        src["added_at"],
+        1 if src.get("is_enabled", True) else 0,
+        1 if src.get("has_docs", True) else 0,
+        1 if src.get("has_parsing", False) else 0,
+        1 if src.get("has_base", False) else 0,
+        src.get("embeddings_status", "unavailable"),
+        src.get("index_warning"),
+        json.dumps(indiv, ensure_ascii=False) if indiv is not None else None,
+        src.get("sort_order", 0),
+    )
 
 
 # --- Основные блоки ---
@@ -29,6 +86,8 @@ class GlobalDB:
         self._conn.row_factory = sqlite3.Row
         self._conn.execute("PRAGMA journal_mode=WAL")
         self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
         self._migrate()
 
     def _migrate(self) -> None:
@@ -128,44 +187,52 @@ class GlobalDB:
 
     def upsert_source(self, src: dict[str, Any]) -> None:
         """Создает/обновляет запись источника вместе с индивидуальной конфигурацией."""
-        indiv = src.get("individual_config")
-        indiv_json = json.dumps(indiv, ensure_ascii=False) if indiv is not None else None
+        params = _source_params(src)
         with self._lock:
-            self._conn.execute(
-                """
-                INSERT INTO sources (
-                    id, notebook_id, filename, file_path, file_type, size_bytes, status,
-                    added_at, is_enabled, has_docs, has_parsing, has_base, embeddings_status, index_warning, individual_config, sort_order
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    filename=excluded.filename, file_path=excluded.file_path,
-                    file_type=excluded.file_type, size_bytes=excluded.size_bytes,
-                    status=excluded.status, is_enabled=excluded.is_enabled,
-                    has_docs=excluded.has_docs, has_parsing=excluded.has_parsing,
-                    has_base=excluded.has_base,
-                    embeddings_status=excluded.embeddings_status,
-                    index_warning=excluded.index_warning, individual_config=excluded.individual_config,
-                    sort_order=excluded.sort_order
-                """,
-                (
-                    src["id"],
-                    src["notebook_id"],
-                    src["filename"],
-                    src["file_path"],
-                    src.get("file_type", "other"),
-                    src.get("size_bytes", 0),
-                    src.get("status", "new"),
-                    src["added_at"],
-                    1 if src.get("is_enabled", True) else 0,
-                    1 if src.get("has_docs", True) else 0,
-                    1 if src.get("has_parsing", False) else 0,
-                    1 if src.get("has_base", False) else 0,
-                    src.get("embeddings_status", "unavailable"),
-                    src.get("index_warning"),
-                    indiv_json,
-                    src.get("sort_order", 0),
-                ),
-            )
+            self._conn.execute(_UPSERT_SOURCE_SQL, params)
+            self._conn.commit()
+
+    def upsert_sources_many(self, sources: list[dict[str, Any]]) -> None:
+        """Пакетный upsert источников одной транзакцией (один COMMIT/fsync на весь пакет)."""
+        if not sources:
+            return
+        params = [_source_params(src) for src in sources]
+        with self._lock:
+            self._conn.executemany(_UPSERT_SOURCE_SQL, params)
+            self._conn.commit()
+
+    def update_source_fields(self, source_id: str, fields: dict[str, Any]) -> None:
+        """Обновляет только переданные колонки источника (UPDATE вместо полного upsert)."""
+        unknown = set(fields) - _SOURCE_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown source columns: {sorted(unknown)}")
+        if not fields:
+            return
+        assignments = ", ".join(f"{column}=?" for column in fields)
+        values = [_source_column_value(column, value) for column, value in fields.items()]
+        with self._lock:
+            self._conn.execute(f"UPDATE sources SET {assignments} WHERE id=?", (*values, source_id))
+            self._conn.commit()
+
+    def update_sources_fields_many(self, updates: list[tuple[str, dict[str, Any]]]) -> None:
+        """Как :meth:`update_source_fields` для многих источников — одной транзакцией.
+
+        Обновления с одинаковым набором колонок идут одним ``executemany``.
+        """
+        groups: dict[tuple[str, ...], list[tuple[Any, ...]]] = {}
+        for source_id, fields in updates:
+            unknown = set(fields) - _SOURCE_COLUMNS
+            if unknown:
+                raise ValueError(f"Unknown source columns: {sorted(unknown)}")
+            if fields:
+                values = tuple(_source_column_value(column, value) for column, value in fields.items())
+                groups.setdefault(tuple(fields), []).append((*values, source_id))
+        if not groups:
+            return
+        with self._lock:
+            for columns, rows in groups.items():
+                assignments = ", ".join(f"{column}=?" for column in columns)
+                self._conn.executemany(f"UPDATE sources SET {assignments} WHERE id=?", rows)
             self._conn.commit()
 
     def get_max_sort_order(self, notebook_id: str) -> int:
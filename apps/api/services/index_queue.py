@@ -0,0 +1,175 @@
+"""Фоновая очередь индексации: пул воркеров на общем event loop и батчер эмбеддингов.
+
+Индексация не создаёт поток на каждый источник: задания складываются в ``asyncio.Queue``
+отдельного фонового loop-а, их разбирают ``workers`` корутин. Тексты чанков нескольких
+документов, пришедшие в пределах окна ``flush_ms``, уходят к провайдеру эмбеддингов общими
+запросами по ``max_batch`` текстов.
+"""
+# --- Imports ---
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+_DEFAULT_MAX_BATCH = 64
+_DEFAULT_FLUSH_MS = 200
+
+
+# --- Models / Classes ---
+class EmbeddingBatcher:
+    """Копит запросы эмбеддингов от разных воркеров и отправляет их общими батчами.
+
+    ``embed`` — синхронная функция ``list[str] -> list[list[float]]``; вызывается в пуле потоков,
+    чтобы HTTP-запрос не блокировал event loop. Разбиение на HTTP-запросы по ``max_batch`` текстов
+    (и их параллельная отправка) — на стороне ``embed``.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[str]], list[list[float]]],
+        max_batch: int = _DEFAULT_MAX_BATCH,
+        flush_ms: int = _DEFAULT_FLUSH_MS,
+    ):
+        self._embed = embed
+        self.max_batch = max(1, max_batch)
+        self.flush_s = max(0, flush_ms) / 1000
+        self._pending: list[tuple[list[str], asyncio.Future]] = []
+        self._pending_size = 0
+        self._timer: asyncio.TimerHandle | None = None
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Векторы для ``texts`` в исходном порядке; запрос может быть объединён с чужими."""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(texts), future))
+        self._pending_size += len(texts)
+        if self._pending_size >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_s, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_size = self._pending, [], 0
+        if pending:
+            asyncio.get_running_loop().create_task(self._run(pending))
+
+    async def _run(self, pending: list[tuple[list[str], asyncio.Future]]) -> None:
+        texts = [text for chunk_texts, _ in pending for text in chunk_texts]
+        try:
+            vectors = await asyncio.to_thread(self._embed, texts)
+        except Exception as exc:  # noqa: BLE001
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        # Раздаём векторы обратно по смещениям исходных запросов.
+        offset = 0
+        for chunk_texts, future in pending:
+            if not future.done():
+                future.set_result(vectors[offset : offset + len(chunk_texts)])
+            offset += len(chunk_texts)
+
+
+class IndexQueue:
+    """Очередь заданий индексации с ограниченным пулом воркеров на собственном фоновом loop-е.
+
+    ``submit`` потокобезопасен и вызывается из синхронного кода роутеров; loop и воркеры
+    запускаются лениво при первом задании.
+    """
+
+    def __init__(self, handler: Callable[[str], Awaitable[None]], workers: int):
+        self._handler = handler
+        self.workers = max(1, workers)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue[tuple[str, Future]] | None = None
+        self._lock = threading.Lock()
+        # Сколько раз источник стоит в очереди и какие из них сняты до того, как их взял воркер.
+        self._pending: dict[str, int] = {}
+        self._cancelled: set[str] = set()
+
+    def submit(self, source_id: str) -> Future:
+        """Поставить источник в очередь индексации.
+
+        Возвращает сразу; ``Future`` завершается, когда воркер отработал задание
+        (отменяется, если задание снято через :meth:`cancel`).
+        """
+        loop = self._ensure_loop()
+        future: Future = Future()
+        with self._lock:
+            self._cancelled.discard(source_id)
+            self._pending[source_id] = self._pending.get(source_id, 0) + 1
+        loop.call_soon_threadsafe(self._queue.put_nowait, (source_id, future))
+        return future
+
+    def cancel(self, source_id: str) -> bool:
+        """Отменить ещё не начатую индексацию источника (уже идущая доработает до конца).
+
+        Возвращает True, если источник ждал в очереди.
+        """
+        with self._lock:
+            if source_id not in self._pending:
+                return False
+            self._cancelled.add(source_id)
+            return True
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                thread = threading.Thread(target=self._run_loop, args=(loop, ready), name="index-queue", daemon=True)
+                thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop, ready: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        # Блокирующие шаги воркеров (asyncio.to_thread) идут в собственный ограниченный пул:
+        # не больше потоков, чем воркеров, и без конкуренции с пулом по умолчанию.
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="index")
+        loop.set_default_executor(executor)
+        atexit.register(executor.shutdown, wait=False)
+        self._queue = asyncio.Queue()
+        for idx in range(self.workers):
+            loop.create_task(self._worker(), name=f"index-worker-{idx}")
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    async def _worker(self) -> None:
+        while True:
+            source_id, future = await self._queue.get()
+            with self._lock:
+                cancelled = source_id in self._cancelled
+                remaining = self._pending.get(source_id, 1) - 1
+                if remaining > 0:
+                    self._pending[source_id] = remaining
+                else:
+                    self._pending.pop(source_id, None)
+                    self._cancelled.discard(source_id)
+            if cancelled:
+                future.cancel()
+                self._queue.task_done()
+                continue
+            future.set_running_or_notify_cancel()
+            try:
+                await self._handler(source_id)
+                future.set_result(None)
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("[index] worker failed for source %s", source_id)
+                future.set_exception(exc)
+            finally:
+                self._queue.task_done()
@@ -2,25 +2,42 @@
 
 from __future__ import annotations
 
+import asyncio
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
 from .notebook_db import db_for_notebook
 from .parse_service import DocumentParser, ParserConfig
 
+_EMPTY_INDIVIDUAL_CONFIG = {
+    "chunk_size": None, "chunk_overlap": None, "ocr_enabled": None, "ocr_language": None,
+    "chunking_method": None, "context_window": None, "use_llm_summary": None,
+    "doc_type": None, "parent_chunk_size": None, "child_chunk_size": None, "symbol_separator": None,
+}
 
-def get_notebook_blocks(notebook_id: str) -> list[dict[str, Any]]:
-    """Возвращает плоский список чанков ноутбука в формате retrieval-слоя."""
+
+@dataclass(slots=True, frozen=True)
+class SourceState:
+    """Состояние источника, нужное парсеру: без копии всей модели Source на каждое задание."""
+
+    individual_config: dict[str, Any] | None = None
+    is_enabled: bool = True
+
+
+def get_notebook_blocks(
+    notebook_id: str,
+    selected_source_ids: list[str] | None = None,
+    only_enabled_tags: bool = False,
+) -> list[dict[str, Any]]:
+    """Возвращает плоский список чанков ноутбука в формате retrieval-слоя.
+
+    ``selected_source_ids`` и ``only_enabled_tags`` применяются прямо в SQL,
+    без материализации всех чанков ноутбука и фильтрации списка в Python.
+    """
     notebook_db = db_for_notebook(notebook_id)
     try:
-        rows = notebook_db.conn.execute(
-            """
-            SELECT c.chunk_id, c.doc_id, c.chunk_text, c.page_number, c.section_header,
-                   d.filepath
-            FROM chunks c
-            JOIN documents d ON d.doc_id=c.doc_id
-            """
-        ).fetchall()
+        rows = notebook_db.list_chunks(selected_source_ids, only_enabled_tags)
         return [
             {
                 "source_id": row["doc_id"],
@@ -42,26 +59,32 @@ async def index_source(
     source_id: str,
     file_path: str,
     *,
-    parser_config: dict[str, Any] | None = None,
-    source_state: dict[str, Any] | None = None,
+    parser_config: ParserConfig | dict[str, Any] | None = None,
+    source_state: SourceState | dict[str, Any] | None = None,
 ) -> tuple[Any, list[Any]]:
     """Запускает парсинг конкретного source c учетом переданного parser_config."""
     # Источник индексируется из фактического файла на диске (uploaded source).
     path = Path(file_path)
-    # parser_config приходит с UI/Runtime и перекрывает дефолты ParserConfig.
-    parser = DocumentParser(ParserConfig(**(parser_config or {})))
-    return parser.parse(
+    # parser_config приходит с UI/Runtime и перекрывает дефолты ParserConfig
+    # (готовый ParserConfig используется как есть, dict — как набор переопределений).
+    if not isinstance(parser_config, ParserConfig):
+        parser_config = ParserConfig(**(parser_config or {}))
+    if not isinstance(source_state, SourceState):
+        # dict (например, model_dump() источника) — берём только нужные парсеру поля.
+        state = source_state or {}
+        source_state = SourceState(state.get("individual_config"), state.get("is_enabled", True))
+    parser = DocumentParser(parser_config)
+    # Парсинг блокирующий (CPU + диск) — уводим в пул потоков, event loop остаётся свободным.
+    return await asyncio.to_thread(
+        parser.parse,
         str(path),
         notebook_id,
         # metadata_override фиксирует doc_id и индивидуальные настройки конкретного source.
         metadata_override={
             "doc_id": source_id,
-            "individual_config": (source_state or {}).get("individual_config")
-            or {
-                "chunk_size": None, "chunk_overlap": None, "ocr_enabled": None, "ocr_language": None,
-                "chunking_method": None, "context_window": None, "use_llm_summary": None,
-                "doc_type": None, "parent_chunk_size": None, "child_chunk_size": None, "symbol_separator": None,
-            },
-            "is_enabled": (source_state or {}).get("is_enabled", True),
+            "individual_config": source_state.individual_config or dict(_EMPTY_INDIVIDUAL_CONFIG),
+            "is_enabled": source_state.is_enabled,
         },
+        # Результат парсинга хранится в БД ноутбука вместе с индексом, отдельный файл не пишется.
+        save_result=False,
     )
@@ -2,6 +2,6 @@
 # --- Imports ---
 from __future__ import annotations
 
-from .db import NotebookDB, db_for_notebook  # noqa: F401
+from .db import NotebookDB, close_notebook_connections, db_for_notebook, notebook_version  # noqa: F401
 
-__all__ = ["NotebookDB", "db_for_notebook"]
+__all__ = ["NotebookDB", "close_notebook_connections", "db_for_notebook", "notebook_version"]
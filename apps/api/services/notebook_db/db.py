@@ -2,7 +2,11 @@
 # --- Imports ---
 from __future__ import annotations
 
+import logging
 import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any
 
@@ -13,22 +17,60 @@ from . import documents as _docs
 from . import schema as _schema
 from . import search as _search
 
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+# Счётчики изменений содержимого ноутбуков (в пределах процесса): по ним кэши поиска
+# понимают, что выдача устарела, без обращения к файлу БД.
+_VERSIONS: dict[str, int] = {}
+_VERSIONS_LOCK = threading.Lock()
+# Живых соединений на поток (LRU): открытие БД ноутбука — это файл, PRAGMA и миграции схемы.
+_POOL_SIZE = 16
+_POOL_LOCAL = threading.local()
+# Пулы всех потоков — чтобы закрыть соединения ноутбука при его удалении и на shutdown.
+_POOLS: weakref.WeakSet[_ConnectionPool] = weakref.WeakSet()
+_POOLS_LOCK = threading.Lock()
+# Удалённые ноутбуки: их БД больше не открывается (файлы уже удаляются, id не переиспользуются).
+_RETIRED: set[str] = set()
+# Сколько ждать, пока поток-владелец вернёт соединение, прежде чем закрыть его принудительно.
+_CLOSE_WAIT_S = 10.0
+
 
 # --- Models / Classes ---
 class NotebookDB:
     """Локальная БД ноутбука: документы, чанки, индексы и теги фильтрации."""
 
-    def __init__(self, notebook_id: str):
+    def __init__(self, notebook_id: str, pooled: bool = False):
         self.notebook_id = notebook_id
+        self.pooled = pooled
+        # Для экземпляра из пула: его пул и число незакрытых выдач через db_for_notebook.
+        self._pool: _ConnectionPool | None = None
+        self.leases = 0
         NOTEBOOKS_DB_DIR.mkdir(parents=True, exist_ok=True)
         self.db_path = NOTEBOOKS_DB_DIR / f"{notebook_id}.db"
-        self.conn = sqlite3.connect(self.db_path)
+        # Соединение из пула использует только поток-владелец, но закрыть свободное соединение
+        # (удаление ноутбука, остановка) может другой поток — см. close_notebook_connections.
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=not pooled)
         self.conn.row_factory = sqlite3.Row
         _schema.configure_connection(self.conn)
         _schema.migrate(self.conn)
 
     def close(self) -> None:
-        self.conn.close()
+        """Закрывает соединение; экземпляр из пула лишь откатывает незавершённую транзакцию и возвращается в пул."""
+        if not self.pooled:
+            self.conn.close()
+            return
+        try:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+        except sqlite3.ProgrammingError:
+            # Соединение уже закрыто принудительно (см. close_notebook_connections).
+            pass
+        pool = self._pool
+        if pool is not None:
+            with pool.returned:
+                self.leases = max(0, self.leases - 1)
+                pool.returned.notify_all()
 
     def upsert_document(
         self,
@@ -37,18 +79,41 @@ class NotebookDB:
         tags: list[str] | None = None,
         is_enabled: bool = True,
         index_error: str | None = None,
+        chunks_blob: bytes | None = None,
     ) -> None:
-        """Перезаписывает документ целиком: метаданные, чанки, FTS и эмбеддинги."""
-        _docs.upsert_document(self.conn, metadata, embedded_chunks, tags, is_enabled, index_error)
+        """Перезаписывает документ целиком: метаданные, чанки, FTS, эмбеддинги и результат парсинга."""
+        _docs.upsert_document(self.conn, metadata, embedded_chunks, tags, is_enabled, index_error, chunks_blob)
+        _bump_version(self.notebook_id)
+
+    def get_chunks_blob(self, doc_id: str) -> bytes | None:
+        """Результат парсинга документа, сохранённый при индексации (см. ``encode_parsing_blob``)."""
+        return _docs.get_chunks_blob(self.conn, doc_id)
+
+    def delete_document(self, doc_id: str) -> None:
+        """Удаляет документ вместе с чанками (каскадно)."""
+        self.conn.execute("DELETE FROM documents WHERE doc_id=?", (doc_id,))
+        self.conn.commit()
+        _bump_version(self.notebook_id)
 
     def set_document_enabled(self, doc_id: str, enabled: bool) -> None:
         _docs.set_document_enabled(self.conn, doc_id, enabled)
+        _bump_version(self.notebook_id)
 
     def set_document_tags(self, doc_id: str, tags: list[str]) -> None:
         _docs.set_document_tags(self.conn, doc_id, tags)
+        _bump_version(self.notebook_id)
 
     def set_tag_enabled(self, tag: str, enabled: bool) -> None:
         _docs.set_tag_enabled(self.conn, tag, enabled)
+        _bump_version(self.notebook_id)
+
+    def list_chunks(
+        self,
+        selected_source_ids: list[str] | None = None,
+        only_enabled_tags: bool = False,
+    ) -> list[sqlite3.Row]:
+        """Чанки ноутбука, отфильтрованные по источникам и включённым тегам на стороне SQLite."""
+        return _search.list_chunks(self.conn, selected_source_ids, only_enabled_tags)
 
     def search_fts(
         self,
@@ -67,11 +132,87 @@ class NotebookDB:
         selected_source_ids: list[str] | None = None,
         only_enabled_tags: bool = True,
     ) -> list[dict[str, Any]]:
-        """Векторный поиск по cosine similarity поверх сохраненных embedding JSON."""
+        """Векторный поиск по cosine similarity поверх сохраненных эмбеддингов (float16 BLOB или JSON)."""
         return _search.search_vector(self.conn, query_vector, top_k, selected_source_ids, only_enabled_tags)
 
 
+class _ConnectionPool:
+    """LRU соединений одного потока: notebook_id → NotebookDB.
+
+    ``lock`` защищает ``entries`` и счётчики выдач; ``returned`` будит того, кто ждёт
+    возврата соединения, чтобы закрыть его (удаление ноутбука, остановка).
+    """
+
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, NotebookDB] = OrderedDict()
+        self.lock = threading.Lock()
+        self.returned = threading.Condition(self.lock)
+
+
 # --- Functions ---
+def _bump_version(notebook_id: str) -> None:
+    with _VERSIONS_LOCK:
+        _VERSIONS[notebook_id] = _VERSIONS.get(notebook_id, 0) + 1
+
+
+def notebook_version(notebook_id: str) -> int:
+    """Номер версии содержимого ноутбука; растёт при каждой записи через NotebookDB."""
+    return _VERSIONS.get(notebook_id, 0)
+
+
+def _thread_pool() -> _ConnectionPool:
+    pool = getattr(_POOL_LOCAL, "pool", None)
+    if pool is None:
+        pool = _POOL_LOCAL.pool = _ConnectionPool()
+        with _POOLS_LOCK:
+            _POOLS.add(pool)
+    return pool
+
+
 def db_for_notebook(notebook_id: str) -> NotebookDB:
-    """Создаёт и возвращает экземпляр NotebookDB для заданного ноутбука."""
-    return NotebookDB(notebook_id)
+    """NotebookDB заданного ноутбука из LRU-пула текущего потока.
+
+    Соединение переиспользуется между вызовами; ``close()`` у такого экземпляра не закрывает его.
+    """
+    pool = _thread_pool()
+    with pool.lock:
+        if notebook_id in _RETIRED:
+            raise LookupError(f"Notebook {notebook_id} is deleted")
+        entries = pool.entries
+        notebook_db = entries.get(notebook_id)
+        if notebook_db is not None:
+            entries.move_to_end(notebook_id)
+        else:
+            notebook_db = NotebookDB(notebook_id, pooled=True)
+            notebook_db._pool = pool
+            entries[notebook_id] = notebook_db
+            # Вытесняем самые старые свободные соединения; выданные (вложенное использование) не трогаем.
+            for key in [key for key, item in entries.items() if item.leases == 0][: max(0, len(entries) - _POOL_SIZE)]:
+                entries.pop(key).conn.close()
+        notebook_db.leases += 1
+    return notebook_db
+
+
+def close_notebook_connections(notebook_id: str | None = None) -> None:
+    """Закрывает соединения одного ноутбука или все (``None``) в пулах всех потоков.
+
+    Выданное соединение закрывается только после того, как поток-владелец вернёт его
+    (``close()``), — не посреди чужой транзакции. После возврата из функции ни одного
+    открытого дескриптора файла БД ноутбука не остаётся, и его можно удалять (в том числе
+    на Windows). Удаляемый ноутбук больше не открывается через :func:`db_for_notebook`.
+    """
+    with _POOLS_LOCK:
+        if notebook_id is not None:
+            _RETIRED.add(notebook_id)
+        pools = list(_POOLS)
+    for pool in pools:
+        with pool.returned:
+            keys = list(pool.entries) if notebook_id is None else [notebook_id]
+            for key in keys:
+                notebook_db = pool.entries.get(key)
+                if notebook_db is None:
+                    continue
+                if not pool.returned.wait_for(lambda db=notebook_db: db.leases == 0, timeout=_CLOSE_WAIT_S):
+                    logger.warning("Closing notebook DB %s that is still in use", key)
+                pool.entries.pop(key, None)
+                notebook_db.conn.close()
@@ -9,6 +9,7 @@ from typing import Any
 
 from ..embedding_service import EmbeddedChunk
 from ..parse_service import DocumentMetadata
+from .vectors import encode_embedding
 
 
 # --- Functions ---
@@ -19,16 +20,17 @@ def upsert_document(
     tags: list[str] | None = None,
     is_enabled: bool = True,
     index_error: str | None = None,
+    chunks_blob: bytes | None = None,
 ) -> None:
-    """Перезаписывает документ целиком: метаданные, чанки, FTS и эмбеддинги."""
+    """Перезаписывает документ целиком: метаданные, чанки, FTS, эмбеддинги и результат парсинга."""
     now = datetime.now(timezone.utc).isoformat()
     conn.execute(
         """
         INSERT INTO documents (
             doc_id, source_id, filename, filepath, file_hash, size_bytes,
             title, authors, year, source, is_enabled, is_indexed, index_error,
-            created_at, indexed_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            created_at, indexed_at, chunks_blob
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT(doc_id) DO UPDATE SET
             source_id=excluded.source_id,
             filename=excluded.filename,
@@ -42,7 +44,8 @@ def upsert_document(
             is_enabled=excluded.is_enabled,
             is_indexed=excluded.is_indexed,
             index_error=excluded.index_error,
-            indexed_at=excluded.indexed_at
+            indexed_at=excluded.indexed_at,
+            chunks_blob=excluded.chunks_blob
         """,
         (
             metadata.doc_id,
@@ -60,6 +63,7 @@ def upsert_document(
             index_error,
             now,
             now,
+            chunks_blob,
         ),
     )
 
@@ -97,13 +101,19 @@ def upsert_document(
         conn.execute("INSERT INTO chunks_fts(rowid, chunk_text) VALUES (?, ?)", (rowid, chunk.get("text", "")))
         conn.execute(
             "INSERT OR REPLACE INTO chunk_embeddings(chunk_rowid, embedding) VALUES (?, ?)",
-            (rowid, json.dumps(item.embedding, ensure_ascii=False)),
+            (rowid, encode_embedding(item.embedding)),
         )
 
     _set_document_tags(conn, metadata.doc_id, tags or metadata.tags)
     conn.commit()
 
 
+def get_chunks_blob(conn: sqlite3.Connection, doc_id: str) -> bytes | None:
+    """Сохранённый результат парсинга документа (BLOB) или None."""
+    row = conn.execute("SELECT chunks_blob FROM documents WHERE doc_id=?", (doc_id,)).fetchone()
+    return row[0] if row is not None else None
+
+
 def set_document_enabled(conn: sqlite3.Connection, doc_id: str, enabled: bool) -> None:
     """Включает или отключает документ в поиске."""
     conn.execute("UPDATE documents SET is_enabled=? WHERE doc_id=?", (1 if enabled else 0, doc_id))
@@ -44,7 +44,8 @@ def migrate(conn: sqlite3.Connection) -> None:
             is_indexed INTEGER NOT NULL DEFAULT 1,
             index_error TEXT,
             created_at TEXT,
-            indexed_at TEXT
+            indexed_at TEXT,
+            chunks_blob BLOB
         );
 
         CREATE TABLE IF NOT EXISTS chunks (
@@ -103,6 +104,7 @@ def migrate(conn: sqlite3.Connection) -> None:
     for _sql in [
         "ALTER TABLE chunks ADD COLUMN embedding_text TEXT",
         "ALTER TABLE chunks ADD COLUMN parent_chunk_id TEXT",
+        "ALTER TABLE documents ADD COLUMN chunks_blob BLOB",
     ]:
         try:
             conn.execute(_sql)
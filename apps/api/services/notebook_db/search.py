@@ -2,11 +2,25 @@
 # --- Imports ---
 from __future__ import annotations
 
-import json
+import heapq
 import math
+import re
 import sqlite3
 from typing import Any
 
+from .vectors import decode_embedding, decode_embedding_array
+
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
+# --- Constants ---
+# Термы запроса: слова и дефисные составные; скомпилировано один раз на модуль.
+_TOKEN_RE = re.compile(r"[\w\-]+")
+# Сколько термов идёт в LIKE-fallback: каждый терм — отдельный полный скан chunk_text.
+_LIKE_MAX_TERMS = 6
+
 
 # --- Functions ---
 def _enabled_filter_clause(selected_source_ids: list[str] | None, only_enabled_tags: bool) -> tuple[str, list[Any]]:
@@ -14,9 +28,11 @@ def _enabled_filter_clause(selected_source_ids: list[str] | None, only_enabled_t
     where = ["d.is_enabled=1", "c.is_enabled=1"]
     params: list[Any] = []
     if selected_source_ids:
-        placeholders = ",".join("?" for _ in selected_source_ids)
+        # Повторы в выборе источников не раздувают IN-список.
+        unique_ids = list(dict.fromkeys(selected_source_ids))
+        placeholders = ",".join("?" for _ in unique_ids)
         where.append(f"d.doc_id IN ({placeholders})")
-        params.extend(selected_source_ids)
+        params.extend(unique_ids)
     if only_enabled_tags:
         where.append(
             """
@@ -31,6 +47,31 @@ def _enabled_filter_clause(selected_source_ids: list[str] | None, only_enabled_t
     return " AND ".join(where), params
 
 
+def list_chunks(
+    conn: sqlite3.Connection,
+    selected_source_ids: list[str] | None = None,
+    only_enabled_tags: bool = False,
+) -> list[sqlite3.Row]:
+    """Чанки ноутбука с фильтрами, применёнными в SQL (индексы idx_chunks_doc / idx_documents_enabled)."""
+    if only_enabled_tags:
+        where_clause, params = _enabled_filter_clause(selected_source_ids, True)
+    elif selected_source_ids:
+        params = list(dict.fromkeys(selected_source_ids))
+        where_clause = f"c.doc_id IN ({','.join('?' for _ in params)})"
+    else:
+        where_clause, params = "1", []
+    return conn.execute(
+        f"""
+        SELECT c.chunk_id, c.doc_id, c.chunk_text, c.page_number, c.section_header,
+               d.filepath
+        FROM chunks c
+        JOIN documents d ON d.doc_id=c.doc_id
+        WHERE {where_clause}
+        """,
+        params,
+    ).fetchall()
+
+
 def search_fts(
     conn: sqlite3.Connection,
     query: str,
@@ -40,6 +81,11 @@ def search_fts(
 ) -> list[dict[str, Any]]:
     """Полнотекстовый поиск с fallback на LIKE и общий резервный список."""
     where_clause, params = _enabled_filter_clause(selected_source_ids, only_enabled_tags)
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return []
+    # Каждый терм в кавычках: пунктуация и слова-операторы FTS5 не ломают синтаксис MATCH.
+    match_query = " ".join(f'"{token}"' for token in tokens)
     rows = conn.execute(
         f"""
         SELECT c.rowid, c.chunk_id, c.doc_id, c.chunk_text, c.page_number, c.section_header,
@@ -51,14 +97,12 @@ def search_fts(
         ORDER BY score
         LIMIT ?
         """,
-        [query, *params, top_k],
+        [match_query, *params, top_k],
     ).fetchall()
     if rows:
         return [dict(row) for row in rows]
 
-    terms = [term for term in query.strip().split() if term]
-    if not terms:
-        return []
+    terms = [token for token in tokens if len(token) > 1][:_LIKE_MAX_TERMS] or tokens[:_LIKE_MAX_TERMS]
     like_clauses = " OR ".join(["c.chunk_text LIKE ?" for _ in terms])
     like_values = [f"%{term}%" for term in terms]
     fallback_rows = conn.execute(
@@ -97,7 +141,7 @@ def search_vector(
     selected_source_ids: list[str] | None = None,
     only_enabled_tags: bool = True,
 ) -> list[dict[str, Any]]:
-    """Векторный поиск по cosine similarity поверх сохраненных embedding JSON."""
+    """Векторный поиск по cosine similarity поверх сохраненных эмбеддингов (float16 BLOB или JSON)."""
     where_clause, params = _enabled_filter_clause(selected_source_ids, only_enabled_tags)
     rows = conn.execute(
         f"""
@@ -111,15 +155,61 @@ def search_vector(
         params,
     ).fetchall()
 
+    if np is not None:
+        return _rank_rows_numpy(rows, query_vector, top_k)
+
     q_norm = math.sqrt(sum(x * x for x in query_vector)) or 1.0
-    scored: list[dict[str, Any]] = []
+    scores: list[float] = []
     for row in rows:
-        vec = [float(x) for x in json.loads(row["embedding"])]
+        vec = decode_embedding(row["embedding"])
         vec_norm = math.sqrt(sum(x * x for x in vec)) or 1.0
-        score = float(sum(a * b for a, b in zip(vec, query_vector)) / (vec_norm * q_norm))
-        item = dict(row)
-        item["score"] = score
-        scored.append(item)
+        scores.append(float(sum(a * b for a, b in zip(vec, query_vector)) / (vec_norm * q_norm)))
+
+    # heapq.nlargest: O(N log top_k) и устойчив к равенству оценок, как sort + срез.
+    top = heapq.nlargest(top_k, range(len(rows)), key=scores.__getitem__)
+    return [{**dict(rows[idx]), "score": scores[idx]} for idx in top]
+
+
+def _top_indices(scores, top_k: int):
+    """Индексы top_k наибольших оценок по убыванию; при равенстве — в исходном порядке строк."""
+    if top_k <= 0:
+        return scores[:0].astype(np.intp)
+    if top_k >= scores.shape[0]:
+        return np.argsort(-scores, kind="stable")
+    # Порог — top_k-я оценка (np.partition, O(N)); из равных порогу берутся первые по порядку,
+    # поэтому результат совпадает с устойчивой сортировкой, но сортируются только top_k строк.
+    threshold = -np.partition(-scores, top_k - 1)[top_k - 1]
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[: top_k - above.shape[0]]
+    candidates = np.concatenate((above, ties))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def _rank_rows_numpy(rows: list[sqlite3.Row], query_vector: list[float], top_k: int) -> list[dict[str, Any]]:
+    """Cosine similarity для всех строк одним матричным умножением; dict собираются только для top_k."""
+    if not rows:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    q_norm = float(np.linalg.norm(query)) or 1.0
+    vectors = [decode_embedding_array(row["embedding"]) for row in rows]
+    scores = np.zeros(len(rows), dtype=np.float64)
+    same_dim = [idx for idx, vec in enumerate(vectors) if vec.shape[0] == query.shape[0]]
+    if same_dim:
+        matrix = np.stack([vectors[idx] for idx in same_dim])
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0.0] = 1.0
+        scores[same_dim] = (matrix @ query) / (norms * q_norm)
+    # Векторы другой размерности (смена модели без переиндексации) — как раньше, по общему префиксу.
+    for idx, vec in enumerate(vectors):
+        if vec.shape[0] != query.shape[0]:
+            size = min(vec.shape[0], query.shape[0])
+            vec_norm = float(np.linalg.norm(vec)) or 1.0
+            scores[idx] = float(vec[:size] @ query[:size]) / (vec_norm * q_norm)
 
-    scored.sort(key=lambda item: item["score"], reverse=True)
-    return scored[:top_k]
+    order = _top_indices(scores, top_k)
+    result: list[dict[str, Any]] = []
+    for idx in order:
+        item = dict(rows[idx])
+        item["score"] = float(scores[idx])
+        result.append(item)
+    return result
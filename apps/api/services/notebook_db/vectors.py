@@ -0,0 +1,39 @@
+"""Кодирование эмбеддингов для хранения в БД ноутбука: компактный float16 BLOB вместо JSON."""
+# --- Imports ---
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any
+
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
+# --- Constants ---
+# Little-endian IEEE 754 half precision: 2 байта на компоненту против ~20 в JSON.
+_F16 = "<f2"
+
+
+# --- Functions ---
+def encode_embedding(vector: list[float]) -> bytes:
+    """Упаковывает вектор в float16 BLOB."""
+    if np is not None:
+        return np.asarray(vector, dtype=_F16).tobytes()
+    return struct.pack(f"<{len(vector)}e", *vector)
+
+
+def decode_embedding(value: Any) -> list[float]:
+    """Распаковывает сохранённый эмбеддинг: float16 BLOB либо JSON-строку старого формата."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+        return list(struct.unpack(f"<{len(raw) // 2}e", raw))
+    return [float(x) for x in json.loads(value)]
+
+
+def decode_embedding_array(value: Any):
+    """То же, что :func:`decode_embedding`, но сразу в ``np.ndarray`` float32 (требует numpy)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=_F16).astype(np.float32)
+    return np.asarray(json.loads(value), dtype=np.float32)
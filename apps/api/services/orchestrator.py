@@ -5,16 +5,23 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
+import shutil
 import threading
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Protocol
 from uuid import uuid4
 
-from ..config import CHUNKS_DIR, CITATIONS_DIR, DOCS_DIR, NOTES_DIR, NOTEBOOKS_DB_DIR, EMBEDDING_BASE_URL, EMBEDDING_DIM, EMBEDDING_ENABLED, EMBEDDING_ENDPOINT, EMBEDDING_PROVIDER
+from ..config import CHUNKS_DIR, CITATIONS_DIR, DOCS_DIR, NOTES_DIR, NOTEBOOKS_DB_DIR, EMBEDDING_BASE_URL, EMBEDDING_CACHE_PATH, EMBEDDING_DIM, EMBEDDING_ENABLED, EMBEDDING_ENDPOINT, EMBEDDING_PROVIDER, FORCE_SEED, INDEX_WORKERS, SEED_MARKER
 from ..schemas import Notebook, ParsingSettings, Source, now_iso
-from .embedding_service import EmbeddingConfig, EmbeddingEngine, EmbeddingProviderConfig
+from .embedding_service import EmbeddedChunk, EmbeddingConfig, EmbeddingEngine, EmbeddingProviderConfig, embedding_text
+from .file_utils import reflink_copy
 from .global_db import GlobalDB
-from .index_service import index_source
-from .notebook_db import db_for_notebook
+from .index_queue import EmbeddingBatcher, IndexQueue
+from .index_service import SourceState, index_source
+from .notebook_db import close_notebook_connections, db_for_notebook
+from .parse_service import DocumentMetadata, ParserConfig
+from .parse.serializer import chunk_dicts, delete_parsing_files, encode_parsing_blob
 from .state import InMemoryState
 
 DOCS_DIR.mkdir(parents=True, exist_ok=True)
@@ -27,65 +34,185 @@ logger = logging.getLogger(__name__)
 
 _global_db = GlobalDB()
 
+# Батч эмбеддингов, общий для всех воркеров: не больше _EMBED_MAX_BATCH текстов в запросе,
+# неполный батч уходит через _EMBED_FLUSH_MS.
+_EMBED_MAX_BATCH = 64
+_EMBED_FLUSH_MS = 200
+# Расширение файла → Source.file_type (всё прочее — "other").
+_FILE_TYPES = {".pdf": "pdf", ".docx": "docx", ".xlsx": "xlsx"}
+# Порция потоковой записи загрузки на диск: 1 МиБ в памяти на загрузку.
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+# --- Functions ---
+def _build_embedding_engine(provider: str, base_url: str, model_name: str) -> EmbeddingEngine:
+    return EmbeddingEngine(
+        EmbeddingConfig(
+            embedding_dim=EMBEDDING_DIM,
+            provider=EmbeddingProviderConfig(
+                base_url=base_url,
+                model_name=model_name,
+                provider=provider,
+                endpoint=EMBEDDING_ENDPOINT,
+                enabled=EMBEDDING_ENABLED,
+                fallback_dim=EMBEDDING_DIM,
+                cache_path=EMBEDDING_CACHE_PATH,
+            )
+        )
+    )
+
+
+def _parser_config_for(source: Source, global_cfg: ParsingSettings) -> ParserConfig:
+    """Настройки парсинга источника: индивидуальные значения поверх настроек ноутбука."""
+    indiv = source.individual_config or {}
+    return ParserConfig(
+        chunk_size=int(indiv.get("chunk_size") or global_cfg.chunk_size),
+        chunk_overlap=int(indiv.get("chunk_overlap") or global_cfg.chunk_overlap),
+        min_chunk_size=global_cfg.min_chunk_size,
+        ocr_enabled=bool(global_cfg.ocr_enabled if indiv.get("ocr_enabled") is None else indiv.get("ocr_enabled")),
+        ocr_language=str(indiv.get("ocr_language") or global_cfg.ocr_language),
+        chunking_method=str(indiv.get("chunking_method") or global_cfg.chunking_method),
+        context_window=int(indiv.get("context_window") or global_cfg.context_window),
+        use_llm_summary=bool(global_cfg.use_llm_summary if indiv.get("use_llm_summary") is None else indiv.get("use_llm_summary")),
+        doc_type=str(indiv.get("doc_type") or global_cfg.doc_type),
+        parent_chunk_size=int(indiv.get("parent_chunk_size") or global_cfg.parent_chunk_size),
+        child_chunk_size=int(indiv.get("child_chunk_size") or global_cfg.child_chunk_size),
+        symbol_separator=str(indiv.get("symbol_separator") or global_cfg.symbol_separator),
+    )
+
+
+def _write_document(notebook_id: str, metadata: DocumentMetadata, chunks: list[dict], embedded_chunks: list[EmbeddedChunk], is_enabled: bool) -> None:
+    """Запись документа в БД ноутбука через соединение из пула вызывающего потока (:func:`db_for_notebook`).
+
+    Результат парсинга ложится в ``documents.chunks_blob`` той же транзакцией, что и индекс:
+    состояния «файл парсинга есть, индекса нет» и обратно не возникает.
+    """
+    chunks_blob = encode_parsing_blob(metadata, chunks)
+    notebook_db = db_for_notebook(notebook_id)
+    try:
+        notebook_db.upsert_document(
+            metadata=metadata, embedded_chunks=embedded_chunks, tags=[], is_enabled=is_enabled, chunks_blob=chunks_blob
+        )
+    finally:
+        notebook_db.close()
+
+
+def _next_name_counter(directory: Path, stem: str, suffix: str) -> int:
+    """Номер, с которого искать свободное имя: 0 — имя свободно, иначе max(N) + 1 среди ``stem_N.suffix``."""
+    prefix = f"{stem}_"
+    taken = -1
+    for name in _existing_names(directory):
+        if name == f"{stem}{suffix}":
+            taken = max(taken, 0)
+        elif name.startswith(prefix) and name.endswith(suffix):
+            number = name[len(prefix) : len(name) - len(suffix)]
+            if number.isdigit():
+                taken = max(taken, int(number))
+    return taken + 1
+
+
+def _open_upload_part(path: Path) -> int:
+    """Открывает временный файл загрузки на запись (с подсказкой ядру о последовательной записи)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return fd
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    """Пишет ``data`` целиком (``os.write`` может записать меньше запрошенного)."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _unlink_file(path: str | Path) -> None:
+    """Удаляет файл одним системным вызовом; отсутствующий файл или каталог по пути — не ошибка."""
+    try:
+        os.unlink(path)
+    except (FileNotFoundError, IsADirectoryError):
+        pass
+
+
+def _existing_names(directory: Path) -> set[str]:
+    """Имена записей каталога за один проход ``os.scandir`` (пустое множество, если каталога нет)."""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
 
 # --- Models / Classes ---
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class AsyncReadable(Protocol):
+    """Источник байтов загрузки (например, ``UploadFile``): ``await read(size)`` до пустой порции."""
+
+    async def read(self, size: int = -1) -> bytes: ...
+
+
 class InMemoryStore(InMemoryState):
     """Оркестратор: расширяет InMemoryState вызовами сервисов и координацией индексации."""
 
     def __init__(self) -> None:
         super().__init__()
         self._embedding_engine: EmbeddingEngine | None = None
+        # (provider, base_url, model): движок строится по ним и сбрасывается только при их смене.
+        self._embedding_settings = (EMBEDDING_PROVIDER, EMBEDDING_BASE_URL, os.getenv("EMBEDDING_MODEL", "nomic-embed-text"))
+        self._engine_lock = threading.Lock()
+        # notebook_id -> {(stem, suffix): следующий номер} для _next_available_path.
+        self._name_counters: dict[str, dict[tuple[str, str], int]] = {}
+        self._name_lock = threading.Lock()
+        # source_id -> (настройки ноутбука, individual_config, собранный ParserConfig); см. _parser_config.
+        self._parser_configs: dict[str, tuple[ParsingSettings, dict, ParserConfig]] = {}
+        self._embedding_batcher = EmbeddingBatcher(self._embed_texts, _EMBED_MAX_BATCH, _EMBED_FLUSH_MS)
+        self._index_queue = IndexQueue(self._index_source, INDEX_WORKERS)
         self.seed_data()
 
     def _get_embedding_engine(self) -> EmbeddingEngine:
-        if self._embedding_engine is None:
-            self._embedding_engine = EmbeddingEngine(
-                EmbeddingConfig(
-                    embedding_dim=EMBEDDING_DIM,
-                    provider=EmbeddingProviderConfig(
-                        base_url=EMBEDDING_BASE_URL,
-                        model_name=os.getenv("EMBEDDING_MODEL", "nomic-embed-text"),
-                        provider=EMBEDDING_PROVIDER,
-                        endpoint=EMBEDDING_ENDPOINT,
-                        enabled=EMBEDDING_ENABLED,
-                        fallback_dim=EMBEDDING_DIM,
-                    )
-                )
-            )
-        return self._embedding_engine
+        engine = self._embedding_engine
+        if engine is not None:
+            return engine
+        # Двойная проверка: движок (с HTTP-пробой провайдера) строит только один поток.
+        with self._engine_lock:
+            if self._embedding_engine is None:
+                self._embedding_engine = _build_embedding_engine(*self._embedding_settings)
+            return self._embedding_engine
+
+    def _embed_texts(self, texts: list[str]) -> list[list[float]]:
+        return self._get_embedding_engine().embed_batch(texts, max_batch_size=_EMBED_MAX_BATCH)
 
     def reconfigure_embedding(self, provider: str, base_url: str, model_name: str) -> None:
-        """Пересоздать движок эмбеддингов с новыми настройками провайдера/модели."""
-        self._embedding_engine = EmbeddingEngine(
-            EmbeddingConfig(
-                embedding_dim=EMBEDDING_DIM,
-                provider=EmbeddingProviderConfig(
-                    base_url=base_url or EMBEDDING_BASE_URL,
-                    model_name=model_name,
-                    provider=provider or EMBEDDING_PROVIDER,
-                    endpoint=EMBEDDING_ENDPOINT,
-                    enabled=EMBEDDING_ENABLED,
-                    fallback_dim=EMBEDDING_DIM,
-                )
-            )
-        )
+        """Применить новые настройки провайдера/модели; движок пересоздаётся лениво при следующем эмбеддинге."""
+        settings = (provider or EMBEDDING_PROVIDER, base_url or EMBEDDING_BASE_URL, model_name)
+        with self._engine_lock:
+            if settings == self._embedding_settings:
+                return
+            self._embedding_settings = settings
+            self._embedding_engine = None
         from .search_service import reconfigure_engine
-        reconfigure_engine(provider or EMBEDDING_PROVIDER, base_url or EMBEDDING_BASE_URL, model_name)
+        reconfigure_engine(*settings)
 
     def seed_data(self) -> None:
+        # Строки приходят из нашей же GlobalDB, где типы уже нормализованы (load_all_*):
+        # model_construct собирает модели без повторной валидации каждого поля.
         # Восстановить ноутбуки из персистентного хранилища
         for nb_dict in _global_db.load_all_notebooks():
-            notebook = Notebook(**nb_dict)
+            notebook = Notebook.model_construct(**nb_dict)
             self.notebooks[notebook.id] = notebook
-            self.messages.setdefault(notebook.id, [])
+            self.chat_history(notebook.id)
             self.chat_versions.setdefault(notebook.id, 0)
 
         # Восстановить настройки парсинга
         for ps_dict in _global_db.load_all_parsing_settings():
             nb_id = ps_dict.pop("notebook_id")
-            self.parsing_settings[nb_id] = ParsingSettings(**ps_dict)
+            self.parsing_settings[nb_id] = ParsingSettings.model_construct(**ps_dict)
 
         # Восстановить источники; исправить устаревшие состояния
+        stale: list[dict] = []
         for src_dict in _global_db.load_all_sources():
             if src_dict["notebook_id"] not in self.notebooks:
                 continue
@@ -99,38 +226,71 @@ class InMemoryStore(InMemoryState):
                 src_dict["status"] = "failed"
                 changed = True
             if changed:
-                _global_db.upsert_source(src_dict)
-            self.sources[src_dict["id"]] = Source(**src_dict)
-
-        # Первый запуск: ноутбуков нет → создать демо
-        if not self.notebooks:
+                stale.append(src_dict)
+            self._add_source(Source.model_construct(**src_dict))
+        # Исправления пишем одной транзакцией, а не COMMIT на каждый источник.
+        _global_db.upsert_sources_many(stale)
+
+        # Первый запуск (маркера ещё нет) и ноутбуков нет → создать демо. После этого
+        # маркер не даёт пересоздавать демо, даже если пользователь удалил все ноутбуки.
+        first_run = not os.path.exists(SEED_MARKER)
+        if not self.notebooks and (first_run or FORCE_SEED):
             self._seed_demo()
+        if first_run:
+            SEED_MARKER.touch()
 
     def _seed_demo(self) -> None:
         """Создаёт первый пустой ноутбук при первом запуске."""
         self.create_notebook("Ноутбук 1")
 
     def _next_available_path(self, notebook_id: str, filename: str) -> Path:
-        notebook_dir = DOCS_DIR / notebook_id
-        notebook_dir.mkdir(parents=True, exist_ok=True)
+        """Свободное имя файла в каталоге документов ноутбука: ``name.ext``, затем ``name_N.ext``.
+
+        Имя сразу резервируется пустым файлом (``O_CREAT | O_EXCL``), поэтому параллельные
+        загрузки одного и того же файла не получат один путь. Исходное имя пробуется всегда
+        (освободившееся после удаления файла переиспользуется); если оно занято, номер берётся
+        из счётчика в памяти — каталог сканируется один раз на пару (ноутбук, имя).
+        """
+        notebook_dir = self._ensure_dir(DOCS_DIR / notebook_id)
         stem = Path(filename).stem
         suffix = Path(filename).suffix
-        candidate = notebook_dir / filename
-        counter = 1
-        while candidate.exists():
-            candidate = notebook_dir / f"{stem}_{counter}{suffix}"
-            counter += 1
-        return candidate
+        key = (stem, suffix)
+        with self._name_lock:
+            counter = 0
+            while True:
+                name = filename if counter == 0 else f"{stem}_{counter}{suffix}"
+                try:
+                    os.close(os.open(notebook_dir / name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                except FileExistsError:
+                    if counter == 0:
+                        counters = self._name_counters.setdefault(notebook_id, {})
+                        counter = counters.get(key) or max(1, _next_name_counter(notebook_dir, stem, suffix))
+                    else:
+                        counter += 1
+                    continue
+                except FileNotFoundError:
+                    # Каталог удалили извне — создаём заново и повторяем.
+                    self._forget_dir(notebook_dir)
+                    self._ensure_dir(notebook_dir)
+                    continue
+                if counter:
+                    self._name_counters.setdefault(notebook_id, {})[key] = counter + 1
+                return notebook_dir / name
+
+    def _forget_name_counters(self, notebook_id: str) -> None:
+        """Сбрасывает счётчики имён ноутбука: после удаления файлов номера пересчитываются по каталогу."""
+        with self._name_lock:
+            self._name_counters.pop(notebook_id, None)
 
     def create_notebook(self, title: str) -> Notebook:
         ts = now_iso()
-        notebook = Notebook(id=str(uuid4()), title=title, created_at=ts, updated_at=ts)
+        notebook = Notebook(id=uuid4().hex, title=title, created_at=ts, updated_at=ts)
         self.notebooks[notebook.id] = notebook
-        self.messages.setdefault(notebook.id, [])
+        self.chat_history(notebook.id)
         self.chat_versions.setdefault(notebook.id, 0)
         settings = ParsingSettings()
         self.parsing_settings[notebook.id] = settings
-        (DOCS_DIR / notebook.id).mkdir(parents=True, exist_ok=True)
+        self._ensure_dir(DOCS_DIR / notebook.id)
         _global_db.upsert_notebook(notebook.id, notebook.title, notebook.created_at, notebook.updated_at)
         _global_db.upsert_parsing_settings(
             notebook.id,
@@ -160,135 +320,200 @@ class InMemoryStore(InMemoryState):
         return notebook
 
     def delete_notebook(self, notebook_id: str) -> bool:
-        if notebook_id not in self.notebooks:
+        # Ноутбук исчезает из API сразу, до медленной очистки диска; повторное удаление даст 404.
+        if self.notebooks.pop(notebook_id, None) is None:
+            return False
+        self._delete_notebook_storage(notebook_id, self._release_notebook_sources(notebook_id))
+        self._drop_notebook_state(notebook_id)
+        return True
+
+    async def delete_notebook_async(self, notebook_id: str) -> bool:
+        """То же, что :meth:`delete_notebook`, но файловая часть уходит в пул потоков.
+
+        rmtree/unlink большого ноутбука занимают сотни миллисекунд — event loop их не ждёт.
+        """
+        if self.notebooks.pop(notebook_id, None) is None:
             return False
+        external_files = self._release_notebook_sources(notebook_id)
+        await asyncio.to_thread(self._delete_notebook_storage, notebook_id, external_files)
+        self._drop_notebook_state(notebook_id)
+        return True
 
-        for source_id, source in list(self.sources.items()):
-            if source.notebook_id != notebook_id:
-                continue
-            path = Path(source.file_path)
-            if path.exists() and path.is_file():
-                path.unlink(missing_ok=True)
-            self.sources.pop(source_id, None)
-
-        for directory in (DOCS_DIR / notebook_id, CHUNKS_DIR / notebook_id):
-            if directory.exists() and directory.is_dir():
-                for file in directory.glob("*"):
-                    if file.is_file():
-                        file.unlink(missing_ok=True)
-                directory.rmdir()
-
-        # Delete citations for this notebook
+    def _release_notebook_sources(self, notebook_id: str) -> list[str]:
+        """Снимает источники ноутбука из индекса и очереди; возвращает внешние файлы к удалению."""
+        docs_dir = DOCS_DIR / notebook_id
+        external_files: list[str] = []
+        # Индекс ноутбука снимается целиком: O(k) по его источникам, одна блокировка на всех.
+        for source in self._pop_notebook_sources(notebook_id):
+            self._index_queue.cancel(source.id)
+            self._parser_configs.pop(source.id, None)
+            # Файлы из каталога документов ноутбука уйдут вместе с ним; отдельно — только внешние.
+            if Path(source.file_path).parent != docs_dir:
+                external_files.append(source.file_path)
+        return external_files
+
+    def _delete_notebook_storage(self, notebook_id: str, external_files: list[str]) -> None:
+        """Блокирующая часть удаления: файлы, каталоги, БД ноутбука и запись в глобальной БД."""
+        for file_path in external_files:
+            _unlink_file(file_path)
+
+        # Каталоги удаляются целиком: rmtree обходит их через os.scandir без stat на каждый файл.
         citations_dir = CITATIONS_DIR / notebook_id
-        if citations_dir.exists():
-            for f in citations_dir.glob("*.json"):
-                f.unlink(missing_ok=True)
-            citations_dir.rmdir()
-
-        (NOTEBOOKS_DB_DIR / f"{notebook_id}.db").unlink(missing_ok=True)
+        for directory in (DOCS_DIR / notebook_id, CHUNKS_DIR / notebook_id, citations_dir):
+            shutil.rmtree(directory, ignore_errors=True)
+            self._forget_dir(directory)
+        self._invalidate_listing(citations_dir)
+
+        # Пулированные соединения держат файл БД открытым — закрываем их до удаления.
+        close_notebook_connections(notebook_id)
+        for suffix in (".db", ".db-wal", ".db-shm"):
+            (NOTEBOOKS_DB_DIR / f"{notebook_id}{suffix}").unlink(missing_ok=True)
+        _global_db.delete_notebook(notebook_id)
 
-        del self.notebooks[notebook_id]
+    def _drop_notebook_state(self, notebook_id: str) -> None:
+        self._forget_name_counters(notebook_id)
+        self._source_locks.pop(notebook_id, None)
         self.messages.pop(notebook_id, None)
         self.chat_versions.pop(notebook_id, None)
         self.parsing_settings.pop(notebook_id, None)
-        _global_db.delete_notebook(notebook_id)
-        return True
 
     def add_source_from_path(self, notebook_id: str, path: str, indexed: bool = False) -> Source:
         file_path = Path(path)
-        ext = file_path.suffix.lower().replace(".", "")
-        file_type = ext if ext in {"pdf", "docx", "xlsx"} else "other"
+        # Один stat вместо exists() + stat() + exists().
+        try:
+            size_bytes, exists = os.stat(file_path).st_size, True
+        except FileNotFoundError:
+            size_bytes, exists = 0, False
+        file_type = _FILE_TYPES.get(file_path.suffix.lower(), "other")
         settings = self.get_parsing_settings(notebook_id)
         should_index = indexed or settings.auto_parse_on_upload
         # Compute next sort_order for this notebook
         next_order = _global_db.get_max_sort_order(notebook_id) + 1
         source = Source(
-            id=str(uuid4()),
+            id=uuid4().hex,
             notebook_id=notebook_id,
             filename=file_path.name,
             file_path=str(file_path),
             file_type=file_type,
-            size_bytes=file_path.stat().st_size if file_path.exists() else 0,
+            size_bytes=size_bytes,
             status="indexed" if indexed else ("indexing" if should_index else "new"),
             added_at=now_iso(),
-            has_docs=file_path.exists(),
+            has_docs=exists,
             has_parsing=indexed,
             sort_order=next_order,
         )
-        self.sources[source.id] = source
+        self._add_source(source)
         _global_db.upsert_source(source.model_dump())
         if indexed:
             return source
         if should_index:
-            thread = threading.Thread(target=self._index_source_sync, args=(source.id,), daemon=True)
-            thread.start()
+            self.schedule_index(source.id)
         return source
 
-    async def save_upload(self, notebook_id: str, filename: str, content: bytes) -> Source:
-        target = self._next_available_path(notebook_id, filename)
-        target.write_bytes(content)
-        return self.add_source_from_path(notebook_id, str(target), indexed=False)
-
-    def _index_source_sync(self, source_id: str) -> None:
+    async def save_upload(self, notebook_id: str, filename: str, upload: AsyncReadable, max_bytes: int | None = None) -> Source:
+        """Потоково пишет загрузку на диск порциями по _UPLOAD_CHUNK_BYTES и регистрирует источник.
+
+        В памяти держится только текущая порция. Запись идёт во временный ``<имя>.part``,
+        который после fsync атомарно переименовывается в целевой файл: после сбоя посреди
+        загрузки в каталоге документов не остаётся обрезанного файла. При превышении
+        ``max_bytes`` временный файл удаляется и поднимается UploadTooLargeError.
+        """
+        # Диск (mkdir/scandir, write, fsync, rename) и GlobalDB — в пуле потоков:
+        # event loop продолжает принимать другие запросы, пока идёт запись.
+        target = await asyncio.to_thread(self._next_available_path, notebook_id, filename)
+        tmp = target.with_name(target.name + ".part")
+        written = 0
+        try:
+            fd = await asyncio.to_thread(_open_upload_part, tmp)
+            try:
+                while chunk := await upload.read(_UPLOAD_CHUNK_BYTES):
+                    written += len(chunk)
+                    if max_bytes is not None and written > max_bytes:
+                        raise UploadTooLargeError(f"upload exceeds {max_bytes} bytes")
+                    await asyncio.to_thread(_write_all, fd, chunk)
+                await asyncio.to_thread(os.fsync, fd)
+            finally:
+                os.close(fd)
+            await asyncio.to_thread(os.replace, tmp, target)
+        except BaseException:
+            # Вместе с временным файлом убираем и зарезервированное пустое имя.
+            tmp.unlink(missing_ok=True)
+            target.unlink(missing_ok=True)
+            raise
+        return await asyncio.to_thread(self.add_source_from_path, notebook_id, str(target), indexed=False)
+
+    def shutdown(self) -> None:
+        """Закрывает пулированные соединения с БД ноутбуков (остановка приложения)."""
+        close_notebook_connections()
+
+    def _set_source_fields(self, source: Source, fields: dict) -> None:
+        """Меняет поля источника в памяти и сохраняет в GlobalDB только их, без полного model_dump().
+
+        Под блокировкой ноутбука: воркеры индексации и запросы API меняют источник согласованно,
+        не полагаясь на GIL, а ноутбуки друг друга не ждут.
+        """
+        with self._notebook_lock(source.notebook_id):
+            for name, value in fields.items():
+                setattr(source, name, value)
+            _global_db.update_source_fields(source.id, fields)
+
+    def schedule_index(self, source_id: str) -> Future:
+        """Поставить источник в фоновую очередь индексации (потокобезопасно, без ожидания).
+
+        Возвращённый ``Future`` завершается по окончании индексации источника.
+        """
+        return self._index_queue.submit(source_id)
+
+    def _parser_config(self, source: Source) -> ParserConfig:
+        """ParserConfig источника, закэшированный до смены настроек ноутбука или individual_config.
+
+        Оба объекта при изменении заменяются целиком (update_parsing_settings, PATCH источника),
+        поэтому актуальность кэша проверяется сравнением ссылок, без повторного слияния словарей.
+        """
+        global_cfg = self.get_parsing_settings(source.notebook_id)
+        indiv = source.individual_config
+        cached = self._parser_configs.get(source.id)
+        if cached is not None and cached[0] is global_cfg and cached[1] is indiv:
+            return cached[2]
+        config = _parser_config_for(source, global_cfg)
+        self._parser_configs[source.id] = (global_cfg, indiv, config)
+        return config
+
+    async def _index_source(self, source_id: str) -> None:
         source = self.sources.get(source_id)
         if not source:
             return
-        source.status = "indexing"
+        with self._notebook_lock(source.notebook_id):
+            source.status = "indexing"
         try:
-            global_cfg = self.get_parsing_settings(source.notebook_id)
-            indiv = source.individual_config or {}
-            parser_config = {
-                "chunk_size": int(indiv.get("chunk_size") or global_cfg.chunk_size),
-                "chunk_overlap": int(indiv.get("chunk_overlap") or global_cfg.chunk_overlap),
-                "min_chunk_size": global_cfg.min_chunk_size,
-                "ocr_enabled": bool(global_cfg.ocr_enabled if indiv.get("ocr_enabled") is None else indiv.get("ocr_enabled")),
-                "ocr_language": str(indiv.get("ocr_language") or global_cfg.ocr_language),
-                "chunking_method": str(indiv.get("chunking_method") or global_cfg.chunking_method),
-                "context_window": int(indiv.get("context_window") or global_cfg.context_window),
-                "use_llm_summary": bool(global_cfg.use_llm_summary if indiv.get("use_llm_summary") is None else indiv.get("use_llm_summary")),
-                "doc_type": str(indiv.get("doc_type") or global_cfg.doc_type),
-                "parent_chunk_size": int(indiv.get("parent_chunk_size") or global_cfg.parent_chunk_size),
-                "child_chunk_size": int(indiv.get("child_chunk_size") or global_cfg.child_chunk_size),
-                "symbol_separator": str(indiv.get("symbol_separator") or global_cfg.symbol_separator),
-            }
-            metadata, _ = asyncio.run(
-                index_source(
-                    source.notebook_id,
-                    source.id,
-                    source.file_path,
-                    parser_config=parser_config,
-                    source_state=source.model_dump(),
-                )
+            parser_config = self._parser_config(source)
+            metadata, parsed_chunks = await index_source(
+                source.notebook_id,
+                source.id,
+                source.file_path,
+                parser_config=parser_config,
+                source_state=SourceState(source.individual_config, source.is_enabled),
             )
-            engine = self._get_embedding_engine()
-            embedded_chunks = engine.embed_document_from_parsing(source.notebook_id, source.id)
+            # Всё блокирующее (HTTP-проба провайдера, SQLite) — через to_thread,
+            # чтобы воркеры на общем loop-е не ждали друг друга.
+            engine = await asyncio.to_thread(self._get_embedding_engine)
+            chunks = chunk_dicts(parsed_chunks)
+            vectors = await self._embedding_batcher.embed([embedding_text(chunk) for chunk in chunks])
+            embedded_chunks = engine.build_embedded_chunks(chunks, vectors, source.notebook_id, source.id)
             vector_ready = any(not item.embedding_failed for item in embedded_chunks)
-            notebook_db = db_for_notebook(source.notebook_id)
-            notebook_db.upsert_document(
-                metadata=metadata,
-                embedded_chunks=embedded_chunks,
-                tags=[],
-                is_enabled=source.is_enabled,
-            )
-            notebook_db.close()
-            source.status = "indexed"
-            source.has_parsing = True
-            source.has_base = True
+            await asyncio.to_thread(_write_document, source.notebook_id, metadata, chunks, embedded_chunks, source.is_enabled)
+            fields = {"status": "indexed", "has_parsing": True, "has_base": True}
             if vector_ready:
-                source.embeddings_status = "available"
-                source.index_warning = None
+                fields.update(embeddings_status="available", index_warning=None)
                 logger.info("[index] %s indexed (vector+fts)", source.id)
             else:
-                source.embeddings_status = "unavailable"
-                source.index_warning = "indexed (text-only)"
+                fields.update(embeddings_status="unavailable", index_warning="indexed (text-only)")
                 logger.warning("[index] %s indexed (text-only): embeddings unavailable", source.id)
-            _global_db.upsert_source(source.model_dump())
+            await asyncio.to_thread(self._set_source_fields, source, fields)
         except Exception:
             logger.exception("[index] failed for source %s", source_id)
-            source.status = "failed"
-            source.has_base = False
             try:
-                _global_db.upsert_source(source.model_dump())
+                await asyncio.to_thread(self._set_source_fields, source, {"status": "failed", "has_base": False})
             except Exception:
                 logger.exception("[persist] failed to persist failed status for source %s", source_id)
 
@@ -296,23 +521,23 @@ class InMemoryStore(InMemoryState):
         source = self.sources.get(source_id)
         if not source:
             return None
-        source.status = "indexing"
-        _global_db.upsert_source(source.model_dump())
-        thread = threading.Thread(target=self._index_source_sync, args=(source.id,), daemon=True)
-        thread.start()
+        self._set_source_fields(source, {"status": "indexing"})
+        self.schedule_index(source.id)
         return source
 
     def reorder_sources(self, notebook_id: str, ordered_ids: list[str]) -> bool:
         """Update sort_order for sources in notebook based on user-provided order."""
-        # Validate all IDs belong to this notebook
-        nb_sources = {s.id for s in self.sources.values() if s.notebook_id == notebook_id}
-        if not all(sid in nb_sources for sid in ordered_ids):
-            return False
-        _global_db.reorder_sources(notebook_id, ordered_ids)
-        # Update in-memory sort_orders
-        for idx, source_id in enumerate(ordered_ids, start=1):
-            if source_id in self.sources:
-                self.sources[source_id].sort_order = idx
+        with self._notebook_lock(notebook_id):
+            # Validate all IDs belong to this notebook
+            nb_sources = self._source_ids_by_notebook.get(notebook_id, {})
+            if not all(sid in nb_sources for sid in ordered_ids):
+                return False
+            _global_db.reorder_sources(notebook_id, ordered_ids)
+            # Update in-memory sort_orders
+            for idx, source_id in enumerate(ordered_ids, start=1):
+                if source_id in self.sources:
+                    self.sources[source_id].sort_order = idx
+            self._invalidate_source_order(notebook_id)
         return True
 
     def delete_source_fully(self, source_id: str) -> bool:
@@ -320,34 +545,32 @@ class InMemoryStore(InMemoryState):
         source = self.sources.get(source_id)
         if not source:
             return False
+        self._index_queue.cancel(source_id)
         notebook_id = source.notebook_id
         # Delete physical file
-        path = Path(source.file_path)
-        if path.exists() and path.is_file():
-            path.unlink(missing_ok=True)
-        # Delete parsing/chunks JSON
-        parsing_file = CHUNKS_DIR / source.notebook_id / f"{source.id}.json"
-        parsing_file.unlink(missing_ok=True)
-        # Remove from notebook SQLite DB
+        _unlink_file(source.file_path)
+        self._forget_name_counters(notebook_id)
+        # Remove from notebook SQLite DB (результат парсинга хранится там же)
         try:
             notebook_db = db_for_notebook(source.notebook_id)
-            notebook_db.conn.execute("DELETE FROM documents WHERE doc_id=?", (source.id,))
-            notebook_db.conn.commit()
+            notebook_db.delete_document(source.id)
             notebook_db.close()
         except Exception:
             logger.exception("[delete_fully] failed to remove from notebook DB for source %s", source_id)
+        # Файлы промежуточного слоя старых инсталляций (до хранения результата парсинга в БД).
+        delete_parsing_files(notebook_id, source_id)
         # Remove from global DB and in-memory store
         _global_db.delete_source(source_id)
-        self.sources.pop(source_id, None)
-        # Renumber remaining sources
-        _global_db.renumber_sort_orders(notebook_id)
-        # Reload sort_orders in memory
-        remaining = sorted(
-            [s for s in self.sources.values() if s.notebook_id == notebook_id],
-            key=lambda s: (s.sort_order, s.added_at),
-        )
-        for idx, s in enumerate(remaining, start=1):
-            s.sort_order = idx
+        self._remove_source(source_id)
+        self._parser_configs.pop(source_id, None)
+        with self._notebook_lock(notebook_id):
+            # Renumber remaining sources
+            _global_db.renumber_sort_orders(notebook_id)
+            # Reload sort_orders in memory
+            remaining = sorted(self.sources_for_notebook(notebook_id), key=lambda s: (s.sort_order, s.added_at))
+            for idx, s in enumerate(remaining, start=1):
+                s.sort_order = idx
+            self._invalidate_source_order(notebook_id)
         # Delete saved citations for this source
         self._delete_citations_for_source(notebook_id, source_id)
         return True
@@ -356,38 +579,50 @@ class InMemoryStore(InMemoryState):
         source = self.sources.get(source_id)
         if not source:
             return False
-        path = Path(source.file_path)
-        if path.exists() and path.is_file():
-            path.unlink(missing_ok=True)
-        source.has_docs = False
-        _global_db.upsert_source(source.model_dump())
+        # Файла больше нет — ожидающая индексация всё равно упала бы.
+        fields: dict = {"has_docs": False}
+        if self._index_queue.cancel(source_id) and source.status == "indexing":
+            fields["status"] = "new"
+        _unlink_file(source.file_path)
+        self._forget_name_counters(source.notebook_id)
+        self._set_source_fields(source, fields)
         return True
 
     def erase_source_data(self, source_id: str) -> bool:
         source = self.sources.get(source_id)
         if not source:
             return False
-        parsing_file = CHUNKS_DIR / source.notebook_id / f"{source.id}.json"
-        parsing_file.unlink(missing_ok=True)
+        self._index_queue.cancel(source_id)
         notebook_db = db_for_notebook(source.notebook_id)
-        notebook_db.conn.execute("DELETE FROM documents WHERE doc_id=?", (source.id,))
-        notebook_db.conn.commit()
+        notebook_db.delete_document(source.id)
         notebook_db.close()
-        source.has_parsing = False
-        source.has_base = False
-        source.status = "new"
-        _global_db.upsert_source(source.model_dump())
+        delete_parsing_files(source.notebook_id, source.id)
+        self._set_source_fields(source, {"has_parsing": False, "has_base": False, "status": "new"})
         return True
 
     def delete_all_source_files(self, notebook_id: str) -> int:
-        removed = 0
-        for source in self.sources.values():
-            if source.notebook_id != notebook_id:
-                continue
-            if source.has_docs:
-                self.delete_source_file(source.id)
-                removed += 1
-        return removed
+        # Только источники этого ноутбука; изменённые колонки сохраняются одной транзакцией.
+        # Каталог документов читается один раз: уже отсутствующие файлы не трогаем.
+        docs_dir = DOCS_DIR / notebook_id
+        present = _existing_names(docs_dir)
+        updates: list[tuple[str, dict]] = []
+        with self._notebook_lock(notebook_id):
+            for source in self.sources_for_notebook(notebook_id):
+                if not source.has_docs:
+                    continue
+                # Как в delete_source_file: ожидающая индексация без файла всё равно упала бы.
+                fields: dict = {"has_docs": False}
+                if self._index_queue.cancel(source.id) and source.status == "indexing":
+                    fields["status"] = "new"
+                path = Path(source.file_path)
+                if path.parent != docs_dir or path.name in present:
+                    _unlink_file(path)
+                for key, value in fields.items():
+                    setattr(source, key, value)
+                updates.append((source.id, fields))
+            _global_db.update_sources_fields_many(updates)
+        self._forget_name_counters(notebook_id)
+        return len(updates)
 
     def persist_source(self, source_id: str) -> None:
         """Сохранить текущее состояние источника в персистентное хранилище."""
@@ -425,7 +660,6 @@ class InMemoryStore(InMemoryState):
 
     def duplicate_notebook(self, notebook_id: str) -> Notebook | None:
         """Дублировать ноутбук со всеми источниками, парсингом и базой данных."""
-        import shutil
         original = self.notebooks.get(notebook_id)
         if not original:
             return None
@@ -434,24 +668,24 @@ class InMemoryStore(InMemoryState):
         new_title = f"Копия: {original.title}"
         new_nb = self.create_notebook(new_title)
         new_nb_id = new_nb.id
+        # Одна метка времени на всю операцию: копии источников добавлены «одновременно».
+        added_at = new_nb.created_at
 
         # Скопировать настройки парсинга
         orig_settings = self.get_parsing_settings(notebook_id)
         self.update_parsing_settings(new_nb_id, orig_settings)
 
         # Построить маппинг old_source_id -> new_source_id
-        orig_sources = [s for s in self.sources.values() if s.notebook_id == notebook_id]
+        orig_sources = self.sources_for_notebook(notebook_id)
         id_map: dict[str, str] = {}
         for src in orig_sources:
-            new_src_id = str(uuid4())
+            new_src_id = uuid4().hex
             id_map[src.id] = new_src_id
 
         # Скопировать файлы документов и создать новые записи источников
-        new_nb_docs_dir = DOCS_DIR / new_nb_id
-        new_nb_docs_dir.mkdir(parents=True, exist_ok=True)
-        new_nb_chunks_dir = CHUNKS_DIR / new_nb_id
-        new_nb_chunks_dir.mkdir(parents=True, exist_ok=True)
+        new_nb_docs_dir = self._ensure_dir(DOCS_DIR / new_nb_id)
 
+        new_rows: list[dict] = []
         for src in orig_sources:
             new_src_id = id_map[src.id]
             orig_path = Path(src.file_path)
@@ -459,13 +693,7 @@ class InMemoryStore(InMemoryState):
 
             # Копировать физический файл (если существует)
             if orig_path.exists():
-                shutil.copy2(str(orig_path), str(new_path))
-
-            # Копировать JSON-файл чанков (если существует)
-            orig_chunks_file = CHUNKS_DIR / notebook_id / f"{src.id}.json"
-            new_chunks_file = new_nb_chunks_dir / f"{new_src_id}.json"
-            if orig_chunks_file.exists():
-                shutil.copy2(str(orig_chunks_file), str(new_chunks_file))
+                reflink_copy(str(orig_path), str(new_path))
 
             # Создать новую запись источника
             new_source = Source(
@@ -476,46 +704,54 @@ class InMemoryStore(InMemoryState):
                 file_type=src.file_type,
                 size_bytes=src.size_bytes,
                 status=src.status if orig_path.exists() else "new",
-                added_at=now_iso(),
+                added_at=added_at,
                 is_enabled=src.is_enabled,
                 has_docs=new_path.exists(),
-                has_parsing=src.has_parsing and orig_chunks_file.exists(),
+                # Результат парсинга переезжает вместе с копией БД ноутбука.
+                has_parsing=src.has_parsing,
                 embeddings_status=src.embeddings_status,
                 index_warning=src.index_warning,
                 individual_config=dict(src.individual_config),
                 sort_order=src.sort_order,
             )
-            self.sources[new_src_id] = new_source
-            _global_db.upsert_source(new_source.model_dump())
+            self._add_source(new_source)
+            new_rows.append(new_source.model_dump())
+        _global_db.upsert_sources_many(new_rows)
 
         # Скопировать и обновить SQLite базу данных ноутбука
         orig_db_path = NOTEBOOKS_DB_DIR / f"{notebook_id}.db"
         new_db_path = NOTEBOOKS_DB_DIR / f"{new_nb_id}.db"
         if orig_db_path.exists():
-            shutil.copy2(str(orig_db_path), str(new_db_path))
-            # Обновить ссылки на источники в новой БД
             import sqlite3
-            conn = sqlite3.connect(str(new_db_path))
+            # Autocommit-режим: транзакцией управляем явно (BEGIN ... COMMIT ниже).
+            conn = sqlite3.connect(str(new_db_path), isolation_level=None, cached_statements=256)
             try:
-                for old_id, new_id in id_map.items():
-                    orig_src = next((s for s in orig_sources if s.id == old_id), None)
-                    new_file_path = str(new_nb_docs_dir / Path(orig_src.file_path).name) if orig_src else ""
-                    # Обновить таблицу documents
-                    conn.execute(
-                        "UPDATE documents SET doc_id=?, source_id=?, filepath=? WHERE doc_id=?",
-                        (new_id, new_id, new_file_path, old_id),
-                    )
-                    # Обновить таблицу chunks
-                    conn.execute(
-                        "UPDATE chunks SET doc_id=? WHERE doc_id=?",
-                        (new_id, old_id),
-                    )
-                    # Обновить таблицу document_tags
-                    conn.execute(
-                        "UPDATE document_tags SET doc_id=? WHERE doc_id=?",
-                        (new_id, old_id),
-                    )
-                conn.commit()
+                # Online backup копирует согласованный снимок вместе с содержимым WAL,
+                # не завися от того, удался ли checkpoint при параллельных читателях.
+                orig_db = db_for_notebook(notebook_id)
+                try:
+                    orig_db.conn.backup(conn)
+                finally:
+                    orig_db.close()
+                # Обновить ссылки на источники в новой БД
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                orig_by_id = {src.id: src for src in orig_sources}
+                doc_rows = [
+                    (new_id, new_id, str(new_nb_docs_dir / Path(orig_by_id[old_id].file_path).name), old_id)
+                    for old_id, new_id in id_map.items()
+                ]
+                id_rows = [(new_id, old_id) for old_id, new_id in id_map.items()]
+                # Все переименования — одной транзакцией; каждый UPDATE компилируется один раз на executemany.
+                conn.execute("BEGIN")
+                try:
+                    conn.executemany("UPDATE documents SET doc_id=?, source_id=?, filepath=? WHERE doc_id=?", doc_rows)
+                    conn.executemany("UPDATE chunks SET doc_id=? WHERE doc_id=?", id_rows)
+                    conn.executemany("UPDATE document_tags SET doc_id=? WHERE doc_id=?", id_rows)
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
             finally:
                 conn.close()
 
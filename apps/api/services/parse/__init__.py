@@ -11,4 +11,14 @@ from .models import (  # noqa: F401
     UnsupportedFormatError,
 )
 from .parser import DocumentParser  # noqa: F401
-from .serializer import load_parsing_result, save_parsing_result  # noqa: F401
+from .serializer import (  # noqa: F401
+    chunk_dicts,
+    decode_parsing_blob,
+    delete_parsing_files,
+    encode_parsing_blob,
+    find_parsing_file,
+    load_parsing_payload,
+    load_parsing_result,
+    read_parsing_payload,
+    save_parsing_result,
+)
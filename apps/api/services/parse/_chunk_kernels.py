@@ -0,0 +1,80 @@
+"""Вычислительные ядра горячего пути парсинга: поиск разрыва колонок PDF и границы окон чанков.
+
+При наличии numba ядра компилируются ``@njit(cache=True)`` (кэш машинного кода на диске,
+компиляция — один раз на окружение). Без numba используются эквивалентные реализации
+на numpy / чистом Python с тем же результатом.
+"""
+# --- Imports ---
+from __future__ import annotations
+
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
+try:
+    import numba
+except Exception:  # noqa: BLE001
+    numba = None
+
+# --- Constants ---
+HAS_NUMBA = numba is not None and np is not None
+
+
+# --- Functions ---
+def _column_split_py(xs):
+    """Векторный поиск наибольшего разрыва в отсортированных x: ``(split_idx, gap, split_x)``."""
+    gaps = np.diff(xs)
+    split_idx = int(gaps.argmax()) + 1
+    split_gap = float(gaps[split_idx - 1])
+    split_x = float(xs[split_idx - 1] + xs[split_idx]) / 2
+    return split_idx, split_gap, split_x
+
+
+def _column_split_loop(xs):
+    """Тот же поиск одним циклом — форма, которую numba компилирует без временных массивов."""
+    split_idx = 1
+    split_gap = xs[1] - xs[0]
+    for idx in range(2, xs.shape[0]):
+        gap = xs[idx] - xs[idx - 1]
+        if gap > split_gap:
+            split_gap = gap
+            split_idx = idx
+    split_x = (xs[split_idx - 1] + xs[split_idx]) / 2
+    return split_idx, split_gap, split_x
+
+
+def _text_windows_loop(prefix, total, step, min_tokens, scale):
+    """Границы окон ``[start, end)``: окно расширяется вдвое, если в нём меньше ``min_tokens``."""
+    bounds = []
+    for offset in range(0, total, step):
+        end = offset + step
+        if end < total:
+            tokens = max(1, int((prefix[end] - prefix[offset]) * scale))
+            if tokens < min_tokens:
+                end = offset + (step * 2)
+        bounds.append((offset, end))
+    return bounds
+
+
+if HAS_NUMBA:
+    _column_split_nb = numba.njit(cache=True)(_column_split_loop)
+    _text_windows_nb = numba.njit(cache=True)(_text_windows_loop)
+else:
+    _column_split_nb = None
+    _text_windows_nb = None
+
+
+def find_column_split(xs) -> tuple[int, float, float]:
+    """Для отсортированного массива x (len >= 2) возвращает ``(split_idx, split_gap, split_x)``."""
+    if _column_split_nb is not None:
+        split_idx, split_gap, split_x = _column_split_nb(xs)
+        return int(split_idx), float(split_gap), float(split_x)
+    return _column_split_py(xs)
+
+
+def text_window_bounds(prefix: list[int], total: int, step: int, min_tokens: int, scale: float) -> list[tuple[int, int]]:
+    """Границы окон слов для ``_chunk_text_block`` по префиксным суммам токенов."""
+    if _text_windows_nb is not None and total > step:
+        return _text_windows_nb(np.asarray(prefix, dtype=np.int64), total, step, min_tokens, scale)
+    return _text_windows_loop(prefix, total, step, min_tokens, scale)
@@ -4,8 +4,9 @@ from __future__ import annotations
 
 from typing import Optional
 
+from .._chunk_kernels import text_window_bounds
 from ..models import ChunkType, ParsedChunk, ParserConfig
-from ..utils import _token_count, _tokenize
+from ..utils import _get_encoder, _token_count, _token_counts, _tokenize, _word_token_prefix
 from .base import BaseChunker
 
 
@@ -42,12 +43,20 @@ class GeneralChunker(BaseChunker):
 
         # apply overlap metadata only
         # На финальном проходе записываем контекст соседей для retriever/LLM.
+        # Хвосты и головы берём ограниченным split/rsplit: режется только overlap слов,
+        # а не весь текст чанка.
         overlap = max(0, self.config.chunk_overlap)
+        if overlap:
+            tails = [" ".join(chunk.text.rsplit(None, overlap)[-overlap:]) for chunk in chunks]
+            heads = [" ".join(chunk.text.split(None, overlap)[:overlap]) for chunk in chunks]
+        else:
+            tails = heads = [None] * len(chunks)
+        last = len(chunks) - 1
         for idx, chunk in enumerate(chunks):
             if idx > 0:
-                chunk.prev_chunk_tail = " ".join(_tokenize(chunks[idx - 1].text)[-overlap:]) if overlap else None
-            if idx < len(chunks) - 1:
-                chunk.next_chunk_head = " ".join(_tokenize(chunks[idx + 1].text)[:overlap]) if overlap else None
+                chunk.prev_chunk_tail = tails[idx - 1]
+            if idx < last:
+                chunk.next_chunk_head = heads[idx + 1]
 
         for idx, chunk in enumerate(chunks):
             chunk.chunk_index = idx
@@ -69,12 +78,13 @@ class GeneralChunker(BaseChunker):
 
         out: list[ParsedChunk] = []
         step = max(1, self.config.chunk_size)
-        for offset in range(0, len(tokens), step):
-            part_tokens = tokens[offset : offset + step]
-            part_text = " ".join(part_tokens).strip()
-            if _token_count(part_text) < self.config.min_chunk_size and offset + step < len(tokens):
-                part_tokens = tokens[offset : offset + (step * 2)]
-                part_text = " ".join(part_tokens).strip()
+        total = len(tokens)
+        # Токены слов считаем один раз на блок; границы окон — по разностям префиксных сумм.
+        prefix = _word_token_prefix(tokens) if total > step else []
+        # Без tiktoken префикс — число слов, переводим его в шкалу приближённого _token_count.
+        scale = 1.0 if _get_encoder() is not None else 1.3
+        for offset, end in text_window_bounds(prefix, total, step, self.config.min_chunk_size, scale):
+            part_text = " ".join(tokens[offset:end]).strip()
             out.append(
                 ParsedChunk(
                     text=part_text,
@@ -114,9 +124,21 @@ class GeneralChunker(BaseChunker):
         body = lines[2:]
         chunks: list[ParsedChunk] = []
         current_rows: list[str] = []
-        for row in body:
-            candidate = "\n".join(header + current_rows + [row])
-            if _token_count(candidate) > self.config.chunk_size and current_rows:
+        # Вместо повторной токенизации всего кандидата на каждой строке ведём
+        # накопительную сумму. С tiktoken: токены заголовка и строк + ~1 токен на
+        # перевод строки. Без него: число слов склеенного кандидата — оценка
+        # ``_token_count`` по нему совпадает с подсчётом всего текста.
+        if _get_encoder() is not None:
+            header_tok = _token_count("\n".join(header))
+            row_toks = _token_counts(body)
+            sep, scale = 1, 1.0
+        else:
+            header_tok = sum(len(_tokenize(line)) for line in header)
+            row_toks = [len(_tokenize(row)) for row in body]
+            sep, scale = 0, 1.3
+        running = header_tok
+        for row, row_tok in zip(body, row_toks):
+            if max(1, int((running + row_tok + sep) * scale)) > self.config.chunk_size and current_rows:
                 chunks.append(
                     ParsedChunk(
                         text="\n".join(header + current_rows),
@@ -132,8 +154,10 @@ class GeneralChunker(BaseChunker):
                     )
                 )
                 current_rows = [row]
+                running = header_tok + row_tok + sep
                 continue
             current_rows.append(row)
+            running += row_tok + sep
 
         if current_rows:
             chunks.append(
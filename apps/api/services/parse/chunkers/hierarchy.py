@@ -7,9 +7,14 @@ from typing import Optional
 
 from ..constants import _HIERARCHY_PATTERNS
 from ..models import ChunkType, ParsedChunk
-from ..utils import _token_count
+from ..utils import _HEADER_STRIP_RE, _token_count
 from .general import GeneralChunker
 
+# --- Constants ---
+# Верхняя оценка числа символов на один BPE-токен: раздел длиннее chunk_size * 6
+# символов заведомо не помещается в один чанк, и токенизатор можно не вызывать.
+_MAX_CHARS_PER_TOKEN = 6
+
 
 # --- Models / Classes ---
 class HierarchyChunker(GeneralChunker):
@@ -34,7 +39,19 @@ class HierarchyChunker(GeneralChunker):
             full_text = "\n".join(b["text"] for b in current_content_blocks)
             page_number = current_content_blocks[0].get("page_number")
 
-            if _token_count(full_text) <= max(1, self.config.chunk_size):
+            # Сначала дешёвая оценка по длине строки: токенов не больше, чем символов,
+            # а на один токен приходится не более _MAX_CHARS_PER_TOKEN символов.
+            # Точный подсчёт токенов нужен только в «серой зоне» между этими границами.
+            cap = max(1, self.config.chunk_size)
+            approx_len = len(full_text)
+            if approx_len <= cap:
+                fits = True
+            elif approx_len > cap * _MAX_CHARS_PER_TOKEN:
+                fits = False
+            else:
+                fits = _token_count(full_text) <= cap
+
+            if fits:
                 # Section fits in one chunk
                 section_text = f"{breadcrumb}\n\n{full_text}".strip() if breadcrumb else full_text
                 chunks.append(ParsedChunk(
@@ -61,11 +78,12 @@ class HierarchyChunker(GeneralChunker):
                     full_text, fake_block, doc_id, source_filename, len(chunks), ChunkType.TEXT
                 )
                 # Prepend breadcrumb to each sub-chunk
-                for sub in sub_chunks:
+                offset = len(chunks)
+                for idx, sub in enumerate(sub_chunks):
                     if breadcrumb:
                         sub.text = f"{breadcrumb}\n\n{sub.text}".strip()
-                    sub.chunk_index = len(chunks)
-                    chunks.append(sub)
+                    sub.chunk_index = offset + idx
+                chunks.extend(sub_chunks)
 
             current_content_blocks = []
 
@@ -76,7 +94,7 @@ class HierarchyChunker(GeneralChunker):
                     _flush(header_level)
                     # Clear sub-levels
                     hierarchy = {k: v for k, v in hierarchy.items() if k < header_level}
-                    hierarchy[header_level] = re.sub(r"^#{1,6}\s*", "", block["text"])
+                    hierarchy[header_level] = _HEADER_STRIP_RE.sub("", block["text"])
                 else:
                     # Unrecognized header: treat as content
                     current_content_blocks.append(block)
@@ -85,10 +103,7 @@ class HierarchyChunker(GeneralChunker):
 
         _flush()
 
-        # Apply overlap metadata
-        for idx, chunk in enumerate(chunks):
-            chunk.chunk_index = idx
-
+        # chunk_index уже выставлен при добавлении в обеих ветках _flush.
         return chunks
 
     def _detect_header_level(self, text: str, patterns: list[tuple[int, re.Pattern]]) -> Optional[int]:
@@ -2,10 +2,44 @@
 # --- Imports ---
 from __future__ import annotations
 
+from typing import Any
+
 from ..models import ChunkType, ParsedChunk
-from ..utils import _tokenize
+from ..utils import _has_content, _tokenize
 from .base import BaseChunker
 
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
+
+# --- Functions ---
+def _pcr_index_plan(n_tokens: int, parent_step: int, child_step: int) -> Any:
+    """Строит план окон PCR: по строке ``(p_start, p_end, c_start, c_end)`` на каждый child-чанк.
+
+    Индексы считаются векторно по всему документу сразу; без numpy — обычными циклами.
+    """
+    if np is None:
+        return [
+            (p_start, min(p_start + parent_step, n_tokens), c_start, min(c_start + child_step, p_start + parent_step, n_tokens))
+            for p_start in range(0, n_tokens, parent_step)
+            for c_start in range(p_start, min(p_start + parent_step, n_tokens), child_step)
+        ]
+    p_starts = np.arange(0, n_tokens, parent_step, dtype=np.int64)
+    p_ends = np.minimum(p_starts + parent_step, n_tokens)
+    children_per_parent = (p_ends - p_starts + child_step - 1) // child_step
+    total = int(children_per_parent.sum())
+    # Порядковый номер child внутри своего parent: сквозной индекс минус смещение начала parent.
+    first_child = np.cumsum(children_per_parent) - children_per_parent
+    local_idx = np.arange(total, dtype=np.int64) - np.repeat(first_child, children_per_parent)
+    plan = np.empty((total, 4), dtype=np.int32)
+    plan[:, 0] = np.repeat(p_starts, children_per_parent)
+    plan[:, 1] = np.repeat(p_ends, children_per_parent)
+    plan[:, 2] = plan[:, 0] + local_idx * child_step
+    plan[:, 3] = np.minimum(plan[:, 2] + child_step, plan[:, 1])
+    return plan
+
 
 # --- Models / Classes ---
 class PCRChunker(BaseChunker):
@@ -14,51 +48,41 @@ class PCRChunker(BaseChunker):
     def chunk(self, blocks: list[dict], doc_id: str, source_filename: str) -> list[ParsedChunk]:
         """Разбивает текст на parent-чанки, каждый из которых нарезается на child-чанки."""
         # Build full text from all non-header blocks
-        all_text_parts = []
-        for block in blocks:
-            if block["chunk_type"] != ChunkType.HEADER and block["text"].strip():
-                all_text_parts.append(block["text"])
-        full_text = "\n".join(all_text_parts)
+        full_text = "\n".join(
+            block["text"] for block in blocks
+            if block["chunk_type"] != ChunkType.HEADER and _has_content(block)
+        )
 
         parent_step = max(1, self.config.parent_chunk_size)
         child_step = max(1, self.config.child_chunk_size)
         parent_tokens = _tokenize(full_text)
+        plan = _pcr_index_plan(len(parent_tokens), parent_step, child_step)
+        rows = plan.tolist() if hasattr(plan, "tolist") else plan
 
-        chunks: list[ParsedChunk] = []
-        parent_idx = 0
-
-        # Шаг Parent: создаем крупные смысловые окна для ответа LLM.
-        for p_offset in range(0, len(parent_tokens), parent_step):
-            parent_token_slice = parent_tokens[p_offset: p_offset + parent_step]
-            parent_text = " ".join(parent_token_slice).strip()
-            if not parent_text:
-                continue
-
-            parent_id = f"{doc_id}:pcr_parent:{parent_idx}"
-            child_tokens = _tokenize(parent_text)
-
-            # Шаг Child: режем parent на мелкие фрагменты для векторного поиска.
-            for c_offset in range(0, len(child_tokens), child_step):
-                child_token_slice = child_tokens[c_offset: c_offset + child_step]
-                child_text = " ".join(child_token_slice).strip()
-                if not child_text:
-                    continue
-
-                chunks.append(ParsedChunk(
-                    text=parent_text,          # Full parent: sent to LLM as context
-                    embedding_text=child_text, # Small child: used for precise embedding
-                    chunk_type=ChunkType.TEXT,
-                    chunk_index=len(chunks),
-                    page_number=None,
-                    section_header=f"Блок {parent_idx + 1}",
-                    parent_header=None,
-                    prev_chunk_tail=None,
-                    next_chunk_head=None,
-                    doc_id=doc_id,
-                    source_filename=source_filename,
-                    parent_chunk_id=parent_id,
-                ))
+        # Шаг Parent: крупные смысловые окна для ответа LLM — по одному тексту/id на parent.
+        parent_texts = [" ".join(parent_tokens[p:p + parent_step]) for p in range(0, len(parent_tokens), parent_step)]
+        parent_ids = [f"{doc_id}:pcr_parent:{idx}" for idx in range(len(parent_texts))]
+        parent_headers = [f"Блок {idx + 1}" for idx in range(len(parent_texts))]
 
-            parent_idx += 1
+        # Шаг Child: режем parent на мелкие фрагменты для векторного поиска.
+        # Токены не содержат пробелов, поэтому child-окна — это срезы тех же токенов,
+        # что и parent: повторная токенизация parent_text не нужна.
+        chunks = [
+            ParsedChunk(
+                text=parent_texts[p_start // parent_step],  # Full parent: sent to LLM as context
+                embedding_text=" ".join(parent_tokens[c_start:c_end]),  # Small child: used for precise embedding
+                chunk_type=ChunkType.TEXT,
+                chunk_index=idx,
+                page_number=None,
+                section_header=parent_headers[p_start // parent_step],
+                parent_header=None,
+                prev_chunk_tail=None,
+                next_chunk_head=None,
+                doc_id=doc_id,
+                source_filename=source_filename,
+                parent_chunk_id=parent_ids[p_start // parent_step],
+            )
+            for idx, (p_start, _p_end, c_start, c_end) in enumerate(rows)
+        ]
 
         return chunks
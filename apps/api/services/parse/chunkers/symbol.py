@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from ..models import ChunkType, ParsedChunk
+from ..utils import _has_content
 from .base import BaseChunker
 
 
@@ -17,7 +18,7 @@ class SymbolChunker(BaseChunker):
         # Join all block texts into full document text
         all_text = "\n".join(
             block["text"] for block in blocks
-            if block["chunk_type"] != ChunkType.HEADER and block["text"].strip()
+            if block["chunk_type"] != ChunkType.HEADER and _has_content(block)
         )
 
         # Пользователь сам управляет семантическими границами через специальный разделитель.
@@ -27,9 +28,8 @@ class SymbolChunker(BaseChunker):
             # Fallback: treat entire text as one chunk
             segments = [all_text.strip()] if all_text.strip() else []
 
-        chunks: list[ParsedChunk] = []
-        for idx, segment in enumerate(segments):
-            chunks.append(ParsedChunk(
+        chunks = [
+            ParsedChunk(
                 text=segment,
                 chunk_type=ChunkType.TEXT,
                 chunk_index=idx,
@@ -40,6 +40,8 @@ class SymbolChunker(BaseChunker):
                 next_chunk_head=None,
                 doc_id=doc_id,
                 source_filename=source_filename,
-            ))
+            )
+            for idx, segment in enumerate(segments)
+        ]
 
         return chunks
@@ -3,12 +3,43 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 from ..models import ChunkType
+from ..utils import _blocks_from_rows
 from .base import BaseExtractor
 
 
+# --- Functions ---
+def _iter_docx_rows(doc) -> Iterator[tuple[str, ChunkType, Optional[str]]]:
+    """Выдаёт ``(text, chunk_type, section_header)`` для параграфов и таблиц документа."""
+    current_header: Optional[str] = None
+    # Параграфы DOCX конвертируем в блоки с учетом стилей (heading/list/plain).
+    for paragraph in doc.paragraphs:
+        text = paragraph.text.strip()
+        if not text:
+            continue
+        style = (paragraph.style.name if paragraph.style is not None else "").lower()
+        if "heading" in style:
+            current_header = text
+            yield text, ChunkType.HEADER, current_header
+        elif "list" in style:
+            yield f"- {text}", ChunkType.TEXT, current_header
+        else:
+            yield text, ChunkType.TEXT, current_header
+
+    # Таблицы приводим к markdown-представлению, чтобы их можно было чанковать как текст.
+    for table in doc.tables:
+        rows = [[cell.text.strip().replace("|", "\\|") for cell in row.cells] for row in table.rows]
+        if not rows:
+            continue
+        header = rows[0]
+        divider = ["---"] * len(header)
+        md_lines = [f"| {' | '.join(header)} |", f"| {' | '.join(divider)} |"]
+        md_lines.extend(f"| {' | '.join(row)} |" for row in rows[1:])
+        yield "\n".join(md_lines), ChunkType.TABLE, current_header
+
+
 # --- Models / Classes ---
 class DocxExtractor(BaseExtractor):
     """Извлекает DOCX в список блоков; таблицы переводит в markdown-вид."""
@@ -26,66 +57,4 @@ class DocxExtractor(BaseExtractor):
                 "section_header": None,
                 "parent_header": None,
             }], None)
-        blocks: list[dict] = []
-        current_header: Optional[str] = None
-        # Параграфы DOCX конвертируем в блоки с учетом стилей (heading/list/plain).
-        for paragraph in doc.paragraphs:
-            text = paragraph.text.strip()
-            if not text:
-                continue
-            style = (paragraph.style.name if paragraph.style is not None else "").lower()
-            if "heading" in style:
-                current_header = text
-                blocks.append(
-                    {
-                        "text": text,
-                        "chunk_type": ChunkType.HEADER,
-                        "page_number": None,
-                        "section_header": current_header,
-                        "parent_header": None,
-                    }
-                )
-                continue
-            if "list" in style:
-                marker = "- "
-                blocks.append(
-                    {
-                        "text": f"{marker}{text}",
-                        "chunk_type": ChunkType.TEXT,
-                        "page_number": None,
-                        "section_header": current_header,
-                        "parent_header": None,
-                    }
-                )
-                continue
-            blocks.append(
-                {
-                    "text": text,
-                    "chunk_type": ChunkType.TEXT,
-                    "page_number": None,
-                    "section_header": current_header,
-                    "parent_header": None,
-                }
-            )
-
-        # Таблицы приводим к markdown-представлению, чтобы их можно было чанковать как текст.
-        for table in doc.tables:
-            rows = [[cell.text.strip().replace("|", "\|") for cell in row.cells] for row in table.rows]
-            if not rows:
-                continue
-            header = rows[0]
-            divider = ["---"] * len(header)
-            md_lines = [f"| {' | '.join(header)} |", f"| {' | '.join(divider)} |"]
-            for row in rows[1:]:
-                md_lines.append(f"| {' | '.join(row)} |")
-            blocks.append(
-                {
-                    "text": "\n".join(md_lines),
-                    "chunk_type": ChunkType.TABLE,
-                    "page_number": None,
-                    "section_header": current_header,
-                    "parent_header": None,
-                }
-            )
-
-        return blocks, None
+        return _blocks_from_rows(_iter_docx_rows(doc), page_number=None), None
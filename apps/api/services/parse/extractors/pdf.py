@@ -2,13 +2,54 @@
 # --- Imports ---
 from __future__ import annotations
 
+import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 from ..models import ChunkType, ParseError
-from ..utils import _sort_pdf_lines_multicolumn
+from ..utils import _blocks_from_rows, _pdf_reading_order
 from .base import BaseExtractor
 
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
+# --- Constants ---
+# Строка из одних цифр — номер страницы в колонтитуле, в текст не попадает.
+_PAGENUM_RE = re.compile(r"^\d+$")
+# С какого числа строк на странице минимум кегля выгоднее считать через numpy.
+_NUMPY_MIN_LINES = 64
+
+
+# --- Functions ---
+def _page_base_font(sizes: list[float]) -> float:
+    """Возвращает минимальный кегль страницы (основной шрифт текста)."""
+    if not sizes:
+        return 11.0
+    if np is not None and len(sizes) > _NUMPY_MIN_LINES:
+        return float(np.asarray(sizes, dtype=np.float64).min())
+    return min(sizes)
+
+
+def _iter_line_rows(
+    texts: list[str],
+    sizes: list[float],
+    base_font: float,
+    section_header: Optional[str],
+) -> Iterator[tuple[str, ChunkType, Optional[str]]]:
+    """Выдаёт ``(text, chunk_type, section_header)`` для строк страницы в порядке чтения."""
+    # Эвристика: увеличенный шрифт считаем заголовком, остальное — текстом.
+    header_font = base_font + 1.5
+    for text, size in zip(texts, sizes):
+        if _PAGENUM_RE.match(text):
+            continue
+        if size >= header_font:
+            section_header = text
+            yield text, ChunkType.HEADER, section_header
+        else:
+            yield text, ChunkType.TEXT, section_header
+
 
 # --- Models / Classes ---
 class PdfExtractor(BaseExtractor):
@@ -40,24 +81,21 @@ class PdfExtractor(BaseExtractor):
                 "parent_header": None,
             }], 1)
 
-        import re
         with doc_ctx as doc:
             total_pages = doc.page_count
-            # Проверяем наличие текстового слоя: это ключевая развилка text-layer vs OCR.
-            text_layer_present = any(page.get_text("text").strip() for page in doc)
-
-            if not text_layer_present:
-                if not self.config.ocr_enabled:
-                    raise ParseError("Scanned PDF detected but OCR is disabled")
-                from .ocr import OcrExtractor
-                ocr_blocks = OcrExtractor(self.config).extract_pages(path)
-                return ocr_blocks, total_pages
+            # Наличие текстового слоя (развилка text-layer vs OCR) фиксируем в том же проходе,
+            # что и извлечение строк, — без отдельного чтения всех страниц.
+            saw_text = False
 
             # Постранично строим список строк с координатами и размером шрифта.
             for page_index in range(total_pages):
                 page = doc.load_page(page_index)
                 data = page.get_text("dict")
-                lines: list[tuple[float, float, str, float]] = []
+                # Строки копим параллельными списками (structure-of-arrays) без кортежа на строку.
+                ys: list[float] = []
+                xs: list[float] = []
+                texts: list[str] = []
+                sizes: list[float] = []
                 for block in data.get("blocks", []):
                     for line in block.get("lines", []):
                         spans = line.get("spans", [])
@@ -66,48 +104,34 @@ class PdfExtractor(BaseExtractor):
                         text = "".join(span.get("text", "") for span in spans).strip()
                         if not text:
                             continue
-                        size = max(span.get("size", 11.0) for span in spans)
                         x0, y0, *_ = line.get("bbox", [0.0, 0.0, 0.0, 0.0])
-                        lines.append((y0, x0, text, size))
-
-                # Переупорядочиваем строки для двухколоночных макетов.
-                lines = _sort_pdf_lines_multicolumn(lines)
-                base_font = min((item[3] for item in lines), default=11.0)
-                # Эвристика: увеличенный шрифт считаем заголовком, остальное — текстом.
-                for _, _, text, size in lines:
-                    if re.match(r"^\d+$", text):
-                        continue
-                    if size >= base_font + 1.5:
-                        section_header = text
-                        blocks.append(
-                            {
-                                "text": text,
-                                "chunk_type": ChunkType.HEADER,
-                                "page_number": page_index + 1,
-                                "section_header": section_header,
-                                "parent_header": None,
-                            }
-                        )
-                    else:
-                        blocks.append(
-                            {
-                                "text": text,
-                                "chunk_type": ChunkType.TEXT,
-                                "page_number": page_index + 1,
-                                "section_header": section_header,
-                                "parent_header": None,
-                            }
-                        )
-
-                for image_idx, _image in enumerate(page.get_images(full=True), start=1):
-                    blocks.append(
-                        {
-                            "text": f"[FORMULA_IMAGE: page_{page_index + 1}_formula_{image_idx}]",
-                            "chunk_type": ChunkType.FORMULA,
-                            "page_number": page_index + 1,
-                            "section_header": section_header,
-                            "parent_header": None,
-                        }
-                    )
+                        ys.append(y0)
+                        xs.append(x0)
+                        texts.append(text)
+                        sizes.append(max([span.get("size", 11.0) for span in spans]))
+
+                saw_text = saw_text or bool(texts)
+                # Переупорядочиваем строки для двухколоночных макетов перестановкой индексов.
+                order = _pdf_reading_order(ys, xs)
+                base_font = _page_base_font(sizes)
+                page_number = page_index + 1
+                page_rows = list(
+                    _iter_line_rows([texts[idx] for idx in order], [sizes[idx] for idx in order], base_font, section_header)
+                )
+                if page_rows:
+                    # Последняя строка страницы несёт актуальный заголовок раздела.
+                    section_header = page_rows[-1][2]
+                page_rows.extend(
+                    (f"[FORMULA_IMAGE: page_{page_number}_formula_{image_idx}]", ChunkType.FORMULA, section_header)
+                    for image_idx, _image in enumerate(page.get_images(full=True), start=1)
+                )
+                blocks.extend(_blocks_from_rows(page_rows, page_number))
+
+        if not saw_text:
+            if not self.config.ocr_enabled:
+                raise ParseError("Scanned PDF detected but OCR is disabled")
+            from .ocr import OcrExtractor
+            ocr_blocks = OcrExtractor(self.config).extract_pages(path)
+            return ocr_blocks, total_pages
 
         return blocks, total_pages
@@ -8,6 +8,10 @@ from typing import Optional
 from ..utils import _text_to_structured_blocks
 from .base import BaseExtractor
 
+# --- Constants ---
+# Буфер чтения: файл разбирается построчно, в памяти держится не больше буфера.
+_READ_BUFFER_BYTES = 1 << 16
+
 
 # --- Models / Classes ---
 class TextExtractor(BaseExtractor):
@@ -15,5 +19,5 @@ class TextExtractor(BaseExtractor):
 
     def extract(self, path: Path) -> tuple[list[dict], Optional[int]]:
         """Возвращает (blocks, total_pages)."""
-        text = path.read_text(encoding="utf-8", errors="ignore")
-        return _text_to_structured_blocks(text, page_number=1), 1
+        with path.open("r", encoding="utf-8", errors="ignore", buffering=_READ_BUFFER_BYTES) as handle:
+            return _text_to_structured_blocks(handle, page_number=1), 1
@@ -24,7 +24,7 @@ class ChunkType(Enum):
     CAPTION = "caption"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ParserConfig:
     """Глобальные настройки парсинга и чанкинга.
 
@@ -50,7 +50,7 @@ class ParserConfig:
     symbol_separator: str = "---chunk---"
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedChunk:
     """Нормализованная модель чанка для БД, поиска и ответа LLM."""
     text: str
@@ -68,7 +68,7 @@ class ParsedChunk:
     parent_chunk_id: Optional[str] = None  # For PCR: child chunks reference their parent
 
 
-@dataclass
+@dataclass(slots=True)
 class DocumentMetadata:
     """Метаданные документа и конфигурации, с которой он был распарсен."""
     doc_id: str
@@ -2,8 +2,9 @@
 # --- Imports ---
 from __future__ import annotations
 
-import hashlib
+import mmap
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
@@ -12,7 +13,117 @@ from .chunkers import get_chunker
 from .extractors import get_extractor
 from .models import ChunkType, DocumentMetadata, ParsedChunk, ParserConfig, UnsupportedFormatError
 from .serializer import save_parsing_result
-from .utils import _token_count
+from .utils import _file_sha256, _token_counts
+
+
+# --- Constants ---
+# Параметры выборочной оценки объема текста для estimate_chunks_count.
+_ESTIMATE_SAMPLES = 30
+_ESTIMATE_WINDOW_BYTES = 300
+_ESTIMATE_PDF_PAGES = 5
+_ESTIMATE_SAFETY = 1.10
+# Подмножество профилей langdetect: основные языки плюс украинский для кириллических документов.
+_LANGDETECT_PROFILES = (
+    "en", "es", "ar", "fr", "de", "it", "pt", "ru", "uk",
+    "ja", "ko", "zh-cn", "zh-tw", "hi", "bn", "id",
+)
+# Служебные слова, по которым ASCII-выборка считается английской без запуска langdetect.
+_ENGLISH_MARKERS = (" the ", " and ", " of ")
+
+
+# --- Functions ---
+@lru_cache(maxsize=1)
+def _language_factory():
+    """Фабрика детекторов langdetect с урезанным набором профилей; создаётся один раз на процесс."""
+    try:
+        from langdetect.detector_factory import PROFILES_DIRECTORY, DetectorFactory
+    except Exception:  # noqa: BLE001
+        return None
+    profiles_dir = Path(PROFILES_DIRECTORY)
+    profiles = [
+        (profiles_dir / code).read_text(encoding="utf-8")
+        for code in _LANGDETECT_PROFILES
+        if (profiles_dir / code).is_file()
+    ]
+    factory = DetectorFactory()
+    factory.load_json_profile(profiles)
+    # Фиксированный seed делает результат детекции воспроизводимым между запусками.
+    factory.set_seed(0)
+    return factory
+
+
+@lru_cache(maxsize=256)
+def _detect_language_cached(text_sample: str) -> str:
+    try:
+        factory = _language_factory()
+        if factory is None:
+            return "unknown"
+        detector = factory.create()
+        detector.append(text_sample)
+        return detector.detect()
+    except Exception:  # noqa: BLE001
+        return "unknown"
+
+
+def _language_sample(blocks: list[dict], limit: int = 1000) -> str:
+    """Первые ``limit`` символов текста документа без склейки всех блоков целиком."""
+    parts: list[str] = []
+    size = 0
+    for block in blocks:
+        text = block["text"]
+        parts.append(text)
+        size += len(text) + 1
+        # size учитывает разделитель после каждого блока, поэтому склейка длиннее limit только при size > limit.
+        if size > limit:
+            break
+    return "\n".join(parts)[:limit]
+
+
+def _estimate_text_file_tokens(path: Path) -> int:
+    """Оценка числа токенов текстового файла по равномерно разнесённым окнам."""
+    size = path.stat().st_size
+    if size == 0:
+        return 0
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        if size <= _ESTIMATE_SAMPLES * _ESTIMATE_WINDOW_BYTES:
+            offsets = [0]
+            window = size
+        else:
+            stride = (size - _ESTIMATE_WINDOW_BYTES) // (_ESTIMATE_SAMPLES - 1)
+            offsets = [idx * stride for idx in range(_ESTIMATE_SAMPLES)]
+            window = _ESTIMATE_WINDOW_BYTES
+        samples = [bytes(view[offset:offset + window]) for offset in offsets]
+    sampled_bytes = sum(len(sample) for sample in samples)
+    tokens = sum(_token_counts([sample.decode("utf-8", errors="ignore") for sample in samples]))
+    return int(tokens / max(1, sampled_bytes) * size * _ESTIMATE_SAFETY)
+
+
+def _pdf_page_count(path: Path) -> int:
+    try:
+        import fitz
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception:  # noqa: BLE001
+        return 1
+
+
+def _estimate_pdf_tokens(path: Path) -> Optional[int]:
+    """Оценка числа токенов PDF по тексту нескольких страниц; None — текстового слоя нет."""
+    try:
+        import fitz
+        with fitz.open(path) as doc:
+            page_count = doc.page_count
+            if page_count == 0:
+                return 0
+            step = max(1, page_count // _ESTIMATE_PDF_PAGES)
+            pages = list(range(0, page_count, step))[:_ESTIMATE_PDF_PAGES]
+            samples = [doc.load_page(idx).get_text("text") for idx in pages]
+    except Exception:  # noqa: BLE001
+        return 0
+    if not any(sample.strip() for sample in samples):
+        return None
+    tokens_per_page = sum(_token_counts(samples)) / len(samples)
+    return int(tokens_per_page * page_count * _ESTIMATE_SAFETY)
 
 
 # --- Models / Classes ---
@@ -27,6 +138,7 @@ class DocumentParser:
         filepath: str,
         notebook_id: str,
         metadata_override: Optional[dict] = None,
+        save_result: bool = True,
     ) -> tuple[DocumentMetadata, list[ParsedChunk]]:
         """Полный пайплайн парсинга документа.
 
@@ -34,7 +146,8 @@ class DocumentParser:
         1) извлечение сырых блоков из файла;
         2) разбиение на чанки выбранным методом;
         3) сбор метаданных;
-        4) сохранение результата в ``CHUNKS_DIR``.
+        4) сохранение результата в ``CHUNKS_DIR`` (если ``save_result``; индексация
+           хранит результат в БД ноутбука и файл не пишет).
         """
         path = Path(filepath)
         if not path.exists():
@@ -60,7 +173,11 @@ class DocumentParser:
             extractor = get_extractor(suffix, self.config)
             blocks, total_pages = extractor.extract(path)
 
-        doc_id = str(metadata_override.get("doc_id") or uuid4())
+        # Признак непустого текста считаем один раз, чтобы чанкеры не сканировали строки повторно.
+        for block in blocks:
+            block["_has_content"] = bool(block["text"].strip())
+
+        doc_id = str(metadata_override.get("doc_id") or uuid4().hex)
         # Далее блоки маршрутизируются в выбранный алгоритм чанкинга.
         chunker = get_chunker(self.config)
         chunks = chunker.chunk(blocks, doc_id=doc_id, source_filename=path.name)
@@ -70,7 +187,7 @@ class DocumentParser:
             notebook_id=notebook_id,
             filename=path.name,
             filepath=str(path),
-            file_hash=hashlib.sha256(path.read_bytes()).hexdigest(),
+            file_hash=_file_sha256(path),
             file_size_bytes=path.stat().st_size,
             title=metadata_override.get("title"),
             authors=metadata_override.get("authors"),
@@ -78,7 +195,7 @@ class DocumentParser:
             source=metadata_override.get("source"),
             total_pages=total_pages,
             total_chunks=len(chunks),
-            language=self.detect_language("\n".join(block["text"] for block in blocks)[:1000]),
+            language=self.detect_language(_language_sample(blocks)),
             parser_version="1.1.0",
             parsed_at=datetime.now(timezone.utc).isoformat(),
             individual_config=metadata_override.get("individual_config")
@@ -98,39 +215,50 @@ class DocumentParser:
             is_enabled=bool(metadata_override.get("is_enabled", True)),
             chunking_method=self.config.chunking_method,
         )
-        # Сохраняем промежуточный JSON, который затем потребляет embedding_service.
-        save_parsing_result(notebook_id, metadata, chunks)
+        if save_result:
+            save_parsing_result(notebook_id, metadata, chunks)
         return metadata, chunks
 
     def detect_language(self, text_sample: str) -> str:
         """Определяет язык документа для метаданных; при ошибке возвращает ``unknown``."""
         if not text_sample.strip():
             return "unknown"
-        try:
-            from langdetect import detect
-            return detect(text_sample)
-        except Exception:
-            return "unknown"
+        # Быстрый путь: чистый ASCII с частыми английскими служебными словами — это "en".
+        if text_sample.isascii():
+            padded = f" {' '.join(text_sample.lower().split())} "
+            if any(marker in padded for marker in _ENGLISH_MARKERS):
+                return "en"
+        return _detect_language_cached(text_sample)
 
     def estimate_chunks_count(self, filepath: str) -> int:
-        """Оценивает количество чанков без полного парсинга."""
+        """Оценивает количество чанков без полного парсинга (по выборке текста)."""
         path = Path(filepath)
         suffix = path.suffix.lower()
+        chunk_size = max(1, self.config.chunk_size)
         if suffix == ".xlsx":
             return 1
         elif suffix in {".html", ".epub"}:
             return 0
+        elif suffix in {".txt", ".md"}:
+            total_tokens = _estimate_text_file_tokens(path)
+        elif suffix == ".pdf":
+            estimated = _estimate_pdf_tokens(path)
+            if estimated is None:
+                # Скан без текстового слоя: без OCR текст неизвестен, считаем ~1 чанк на страницу.
+                return max(1, _pdf_page_count(path))
+            total_tokens = estimated
         else:
+            # DOCX и прочее: экстракция без OCR, оценка по фактическому тексту.
             extractor = get_extractor(suffix, self.config)
             blocks, _ = extractor.extract(path)
-        total_tokens = sum(_token_count(block["text"]) for block in blocks)
-        return max(1, total_tokens // max(1, self.config.chunk_size) + 1)
+            total_tokens = sum(_token_counts([block["text"] for block in blocks]))
+        return max(1, total_tokens // chunk_size + 1)
 
     def save_parsing_result(self, notebook_id: str, metadata: DocumentMetadata, chunks: list[ParsedChunk]) -> str:
         """Сериализует метаданные и чанки в JSON-файл промежуточного слоя."""
         return save_parsing_result(notebook_id, metadata, chunks)
 
     def load_parsing_result(self, notebook_id: str, doc_id: str) -> tuple[DocumentMetadata, list[ParsedChunk]]:
-        """Загружает и десериализует результат парсинга из JSON-файла."""
+        """Загружает и десериализует результат парсинга (БД ноутбука или файл промежуточного слоя)."""
         from .serializer import load_parsing_result as _load
         return _load(notebook_id, doc_id)
@@ -2,34 +2,200 @@
 # --- Imports ---
 from __future__ import annotations
 
+import io
 import json
+import threading
 from dataclasses import asdict
 from pathlib import Path
+from typing import Any, Optional
 
-from ...config import CHUNKS_DIR
+from ...config import CHUNKS_DIR, NOTEBOOKS_DB_DIR, PARSING_COMPRESSION, PARSING_FORMAT
 from .models import ChunkType, DocumentMetadata, ParsedChunk
 
+try:
+    import orjson
+except Exception:  # noqa: BLE001
+    orjson = None
+
+try:
+    import zstandard as zstd
+except Exception:  # noqa: BLE001
+    zstd = None
+
+# --- Constants ---
+# Поддерживаемые расширения файлов промежуточного слоя в порядке приоритета при чтении.
+_PARSING_SUFFIXES = (".jsonl.zst", ".json.zst", ".jsonl", ".json")
+# Прямое и обратное отображение ChunkType <-> строка без обращения к Enum.value на каждый чанк.
+_CHUNKTYPE_TO_STR = {ct: ct.value for ct in ChunkType}
+_STR_TO_CHUNKTYPE = {v: k for k, v in _CHUNKTYPE_TO_STR.items()}
+_ZSTD_LEVEL = 3
+# Магическое число кадра zstd: по нему BLOB в БД ноутбука отличается от несжатого JSON.
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Контексты zstd не потокобезопасны, а индексация идёт из нескольких потоков — держим по одному на поток.
+_zstd_local = threading.local()
+
 
 # --- Functions ---
+def _zstd_compressor() -> Any:
+    cctx = getattr(_zstd_local, "cctx", None)
+    if cctx is None:
+        cctx = _zstd_local.cctx = zstd.ZstdCompressor(level=_ZSTD_LEVEL)
+    return cctx
+
+
+def _zstd_decompressor() -> Any:
+    dctx = getattr(_zstd_local, "dctx", None)
+    if dctx is None:
+        dctx = _zstd_local.dctx = zstd.ZstdDecompressor()
+    return dctx
+
+
+def _dumps(obj: Any, indent: bool = False) -> bytes:
+    """JSON в UTF-8 байтах: orjson, если установлен, иначе стандартный json."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _output_suffix() -> str:
+    suffix = ".jsonl" if PARSING_FORMAT == "jsonl" else ".json"
+    if PARSING_COMPRESSION == "zstd" and zstd is not None:
+        suffix += ".zst"
+    return suffix
+
+
+def chunk_dicts(chunks: list[ParsedChunk]) -> list[dict[str, Any]]:
+    """Чанки в виде словарей промежуточного слоя (``chunk_type`` — строка)."""
+    return [{**asdict(chunk), "chunk_type": _CHUNKTYPE_TO_STR[chunk.chunk_type]} for chunk in chunks]
+
+
+def encode_parsing_blob(metadata: DocumentMetadata, chunks: list[dict[str, Any]]) -> bytes:
+    """Результат парсинга одним BLOB-ом для колонки ``documents.chunks_blob`` (zstd, если доступен)."""
+    data = _dumps({"metadata": asdict(metadata), "chunks": chunks})
+    return _zstd_compressor().compress(data) if zstd is not None else data
+
+
+def decode_parsing_blob(blob: bytes) -> dict[str, Any]:
+    """Обратное к :func:`encode_parsing_blob`: словарь вида {"metadata": ..., "chunks": [...]}."""
+    data = bytes(blob)
+    if data.startswith(_ZSTD_MAGIC):
+        if zstd is None:
+            raise RuntimeError("zstandard is required to read compressed parsing data")
+        data = _zstd_decompressor().decompressobj().decompress(data)
+    return _loads(data)
+
+
 def save_parsing_result(notebook_id: str, metadata: DocumentMetadata, chunks: list[ParsedChunk]) -> str:
-    """Сериализует метаданные и чанки в JSON-файл промежуточного слоя."""
+    """Сериализует метаданные и чанки в файл промежуточного слоя (JSON или JSON Lines, опционально zstd)."""
     target_dir = CHUNKS_DIR / notebook_id
     target_dir.mkdir(parents=True, exist_ok=True)
-    output = target_dir / f"{metadata.doc_id}.json"
-    payload = {
-        "metadata": asdict(metadata),
-        "chunks": [{**asdict(chunk), "chunk_type": chunk.chunk_type.value} for chunk in chunks],
-    }
-    output.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    suffix = _output_suffix()
+    output = target_dir / f"{metadata.doc_id}{suffix}"
+    compress = suffix.endswith(".zst")
+    if suffix.startswith(".jsonl"):
+        # Построчная запись: в памяти одновременно находится только один сериализованный чанк.
+        with output.open("wb", buffering=65536) as raw:
+            sink = _zstd_compressor().stream_writer(raw, closefd=False) if compress else raw
+            sink.write(_dumps(asdict(metadata)) + b"\n")
+            for chunk in chunks:
+                item = {**asdict(chunk), "chunk_type": _CHUNKTYPE_TO_STR[chunk.chunk_type]}
+                sink.write(_dumps(item) + b"\n")
+            if compress:
+                sink.close()
+    else:
+        payload = {"metadata": asdict(metadata), "chunks": chunk_dicts(chunks)}
+        data = _dumps(payload, indent=True)
+        output.write_bytes(_zstd_compressor().compress(data) if compress else data)
+    # Файл в другом формате от предыдущего парсинга устарел и не должен перекрывать новый.
+    for stale in _PARSING_SUFFIXES:
+        if stale != suffix:
+            (target_dir / f"{metadata.doc_id}{stale}").unlink(missing_ok=True)
     return str(output)
 
 
+def find_parsing_file(notebook_id: str, doc_id: str, root: Optional[Path] = None) -> Optional[Path]:
+    """Возвращает путь к существующему файлу результата парсинга в любом поддерживаемом формате."""
+    base = (root or CHUNKS_DIR) / notebook_id
+    for suffix in _PARSING_SUFFIXES:
+        candidate = base / f"{doc_id}{suffix}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def delete_parsing_files(notebook_id: str, doc_id: str, root: Optional[Path] = None) -> None:
+    """Удаляет файлы результата парсинга документа во всех поддерживаемых форматах."""
+    base = (root or CHUNKS_DIR) / notebook_id
+    for suffix in _PARSING_SUFFIXES:
+        (base / f"{doc_id}{suffix}").unlink(missing_ok=True)
+
+
+def read_parsing_payload(path: Path) -> dict[str, Any]:
+    """Читает файл промежуточного слоя и возвращает словарь вида {"metadata": ..., "chunks": [...]}.
+
+    JSON Lines (в том числе ``.jsonl.zst``) разбирается построчно из потока: в памяти нет ни
+    сжатого, ни распакованного файла целиком. Целиком читается только одиночный JSON-документ.
+    """
+    name = path.name
+    compressed = name.endswith(".zst")
+    if compressed:
+        if zstd is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        name = name[: -len(".zst")]
+    with path.open("rb") as fh:
+        # stream_reader не требует размера содержимого в заголовке кадра (его нет у потоковой записи).
+        stream = io.BufferedReader(_zstd_decompressor().stream_reader(fh, read_across_frames=True)) if compressed else fh
+        if name.endswith(".jsonl"):
+            lines = (line for line in stream if line.strip())
+            first = next(lines, None)
+            metadata = _loads(first) if first is not None else {}
+            return {"metadata": metadata, "chunks": [_loads(line) for line in lines]}
+        payload = _loads(stream.read())
+    if isinstance(payload, list):
+        return {"metadata": {}, "chunks": payload}
+    return payload
+
+
+def load_parsing_payload(notebook_id: str, doc_id: str, root: Optional[Path] = None) -> dict[str, Any]:
+    """Результат парсинга документа в виде {"metadata": ..., "chunks": [...]}.
+
+    Основной источник — ``documents.chunks_blob`` в БД ноутбука (пишется при индексации);
+    файл промежуточного слоя читается для старых инсталляций и ``save_result=True``.
+    С явным ``root`` (другое дерево файлов) БД не используется.
+    """
+    if root is None:
+        payload = _db_parsing_payload(notebook_id, doc_id)
+        if payload is not None:
+            return payload
+    path = find_parsing_file(notebook_id, doc_id, root=root)
+    if path is None:
+        raise FileNotFoundError((root or CHUNKS_DIR) / notebook_id / f"{doc_id}.json")
+    return read_parsing_payload(path)
+
+
+def _db_parsing_payload(notebook_id: str, doc_id: str) -> Optional[dict[str, Any]]:
+    if not (NOTEBOOKS_DB_DIR / f"{notebook_id}.db").exists():
+        return None
+    # Ленивый импорт: пакет notebook_db сам импортирует модели парсинга.
+    from ..notebook_db import db_for_notebook
+
+    notebook_db = db_for_notebook(notebook_id)
+    try:
+        blob = notebook_db.get_chunks_blob(doc_id)
+    finally:
+        notebook_db.close()
+    return decode_parsing_blob(blob) if blob is not None else None
+
+
 def load_parsing_result(notebook_id: str, doc_id: str) -> tuple[DocumentMetadata, list[ParsedChunk]]:
-    """Загружает и десериализует результат парсинга из JSON-файла."""
-    path = CHUNKS_DIR / notebook_id / f"{doc_id}.json"
-    if not path.exists():
-        raise FileNotFoundError(path)
-    payload = json.loads(path.read_text(encoding="utf-8"))
+    """Загружает и десериализует результат парсинга (БД ноутбука или файл промежуточного слоя)."""
+    payload = load_parsing_payload(notebook_id, doc_id)
     metadata = DocumentMetadata(**payload["metadata"])
-    chunks = [ParsedChunk(**{**item, "chunk_type": ChunkType(item["chunk_type"])}) for item in payload["chunks"]]
+    chunks = [ParsedChunk(**{**item, "chunk_type": _STR_TO_CHUNKTYPE[item["chunk_type"]]}) for item in payload["chunks"]]
     return metadata, chunks
@@ -2,16 +2,30 @@
 # --- Imports ---
 from __future__ import annotations
 
+import hashlib
 import re
-from typing import Optional
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
 
+from ._chunk_kernels import find_column_split
 from .models import ChunkType
 
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
 try:
     import tiktoken
 except Exception:  # noqa: BLE001
     tiktoken = None
 
+# --- Constants ---
+_HEADER_RE = re.compile(r"^(#{1,6}\s+.+|\d+(?:\.\d+)*\s+.+)$")
+_HEADER_STRIP_RE = re.compile(r"^#{1,6}\s*")
+
 
 # --- Functions ---
 def _tokenize(text: str) -> list[str]:
@@ -19,67 +33,151 @@ def _tokenize(text: str) -> list[str]:
     return text.split()
 
 
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Возвращает энкодер cl100k_base, загруженный один раз на процесс.
+
+    Неудача загрузки (нет пакета или офлайн-среда без кэша BPE) тоже кэшируется:
+    подсчёт токенов сразу идёт по приближенной формуле без повторных попыток.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def _file_sha256(path: Path) -> str:
+    """SHA-256 файла потоковым чтением, без загрузки всего файла в память."""
+    with open(path, "rb") as fh:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(fh, "sha256").hexdigest()
+        digest = hashlib.sha256()
+        while chunk := fh.read(1 << 20):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _has_content(block: dict) -> bool:
+    """Возвращает признак непустого текста блока, вычисленный при извлечении.
+
+    Блоки, собранные в обход ``DocumentParser.parse``, флага не имеют — для них
+    признак вычисляется на месте.
+    """
+    flag = block.get("_has_content")
+    if flag is None:
+        flag = bool(block["text"].strip())
+    return flag
+
+
 def _token_count(text: str) -> int:
     """Подсчет токенов через tiktoken, либо приближенная оценка длины."""
     if not text.strip():
         return 0
-    if tiktoken is not None:
-        try:
-            enc = tiktoken.get_encoding("cl100k_base")
-            return len(enc.encode(text))
-        except Exception:  # noqa: BLE001
-            pass
+    enc = _get_encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
     return max(1, int(len(_tokenize(text)) * 1.3))
 
 
-def _sort_pdf_lines_multicolumn(lines: list[tuple[float, float, str, float]]) -> list[tuple[float, float, str, float]]:
-    """Пытается восстановить порядок чтения для двухколоночного PDF."""
-    if len(lines) < 3:
-        return sorted(lines, key=lambda item: (item[0], item[1]))
+def _token_counts(texts: list[str]) -> list[int]:
+    """Число токенов для каждой строки списка; с tiktoken — одним пакетным вызовом."""
+    enc = _get_encoder()
+    if enc is not None:
+        return [len(ids) for ids in enc.encode_ordinary_batch(texts)]
+    return [_token_count(text) for text in texts]
+
+
+def _word_token_prefix(words: list[str]) -> list[int]:
+    """Префиксные суммы числа токенов по словам: ``prefix[j] - prefix[i]`` — токены слов ``i..j-1``.
 
-    sorted_by_x = sorted(lines, key=lambda item: item[1])
-    xs = [item[1] for item in sorted_by_x]
-    gaps = [xs[idx + 1] - xs[idx] for idx in range(len(xs) - 1)]
-    split_gap = max(gaps) if gaps else 0
+    Слова кодируются одним пакетным вызовом с ведущим пробелом, как они стоят
+    внутри склеенного текста. Без tiktoken каждое слово считается одним токеном.
+    """
+    enc = _get_encoder()
+    if enc is None:
+        return list(range(len(words) + 1))
+    counts = (len(ids) for ids in enc.encode_ordinary_batch([f" {word}" for word in words]))
+    return list(accumulate(counts, initial=0))
+
+
+def _pdf_reading_order(ys: list[float], xs: list[float]) -> list[int]:
+    """Перестановка индексов строк страницы в порядке чтения (учитывает две колонки).
+
+    Строки передаются параллельными списками координат; результат — индексы, по которым
+    вызывающий код переупорядочивает свои массивы текста/кегля без сборки кортежей.
+    """
+    count = len(ys)
+    if np is not None and count >= 3:
+        y_arr = np.asarray(ys, dtype=np.float64)
+        x_arr = np.asarray(xs, dtype=np.float64)
+        # Поиск разрыва между колонками — один векторный проход по отсортированным x.
+        _split_idx, split_gap, split_x = find_column_split(np.sort(x_arr))
+        if split_gap < 80:
+            return np.lexsort((x_arr, y_arr)).tolist()
+        left = np.flatnonzero(x_arr <= split_x)
+        right = np.flatnonzero(x_arr > split_x)
+        left = left[np.argsort(y_arr[left], kind="stable")]
+        right = right[np.argsort(y_arr[right], kind="stable")]
+        return np.concatenate((left, right)).tolist()
+
+    if count < 3:
+        return sorted(range(count), key=lambda idx: (ys[idx], xs[idx]))
+
+    sorted_xs = sorted(xs)
+    gaps = [sorted_xs[idx + 1] - sorted_xs[idx] for idx in range(count - 1)]
+    split_gap = max(gaps)
     if split_gap < 80:
-        return sorted(lines, key=lambda item: (item[0], item[1]))
+        return sorted(range(count), key=lambda idx: (ys[idx], xs[idx]))
 
     split_idx = gaps.index(split_gap) + 1
-    split_x = (xs[split_idx - 1] + xs[split_idx]) / 2
-
-    left = [line for line in lines if line[1] <= split_x]
-    right = [line for line in lines if line[1] > split_x]
-    left.sort(key=lambda item: item[0])
-    right.sort(key=lambda item: item[0])
+    split_x = (sorted_xs[split_idx - 1] + sorted_xs[split_idx]) / 2
+    left = sorted((idx for idx in range(count) if xs[idx] <= split_x), key=lambda idx: ys[idx])
+    right = sorted((idx for idx in range(count) if xs[idx] > split_x), key=lambda idx: ys[idx])
     return left + right
 
 
-def _text_to_structured_blocks(text: str, page_number: int) -> list[dict]:
-    """Нормализует plain text в блоки HEADER/TEXT для общего пайплайна."""
-    blocks: list[dict] = []
+def _sort_pdf_lines_multicolumn(lines: list[tuple[float, float, str, float]]) -> list[tuple[float, float, str, float]]:
+    """Пытается восстановить порядок чтения для двухколоночного PDF."""
+    order = _pdf_reading_order([item[0] for item in lines], [item[1] for item in lines])
+    return [lines[idx] for idx in order]
+
+
+def _blocks_from_rows(rows: Iterable[tuple[str, ChunkType, Optional[str]]], page_number: Optional[int]) -> list[dict]:
+    """Собирает блоки пайплайна из кортежей ``(text, chunk_type, section_header)`` одним проходом."""
+    return [
+        {
+            "text": text,
+            "chunk_type": chunk_type,
+            "page_number": page_number,
+            "section_header": section_header,
+            "parent_header": None,
+        }
+        for text, chunk_type, section_header in rows
+    ]
+
+
+def _text_to_structured_blocks(text: str | Iterable[str], page_number: int) -> list[dict]:
+    """Нормализует plain text в блоки HEADER/TEXT для общего пайплайна.
+
+    Принимает строку целиком либо итерируемый источник строк (например, открытый
+    файл) — тогда текст обрабатывается потоково, без загрузки в память целиком.
+    """
+    lines = text.splitlines() if isinstance(text, str) else text
+    return _blocks_from_rows(_iter_text_rows(lines), page_number)
+
+
+def _iter_text_rows(lines: Iterable[str]) -> Iterator[tuple[str, ChunkType, Optional[str]]]:
+    """Выдаёт ``(text, chunk_type, section_header)`` для непустых строк текста."""
     current_header: Optional[str] = None
     # Идем построчно: заголовки помечаем отдельно, чтобы не терять структуру документа.
-    for line in [ln.strip() for ln in text.splitlines() if ln.strip()]:
-        is_header = bool(re.match(r"^(#{1,6}\s+.+|\d+(?:\.\d+)*\s+.+)$", line))
-        if is_header:
-            current_header = re.sub(r"^#{1,6}\s*", "", line)
-            blocks.append(
-                {
-                    "text": current_header,
-                    "chunk_type": ChunkType.HEADER,
-                    "page_number": page_number,
-                    "section_header": current_header,
-                    "parent_header": None,
-                }
-            )
+    for raw in lines:
+        line = raw.strip()
+        if not line:
             continue
-        blocks.append(
-            {
-                "text": line,
-                "chunk_type": ChunkType.TEXT,
-                "page_number": page_number,
-                "section_header": current_header,
-                "parent_header": None,
-            }
-        )
-    return blocks
+        if _HEADER_RE.match(line) is not None:
+            current_header = _HEADER_STRIP_RE.sub("", line)
+            yield current_header, ChunkType.HEADER, current_header
+        else:
+            yield line, ChunkType.TEXT, current_header
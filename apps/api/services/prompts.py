@@ -2,7 +2,11 @@
 # --- Imports ---
 from __future__ import annotations
 
-from pathlib import Path
+from collections import deque
+from collections.abc import Sized
+from functools import lru_cache
+from itertools import islice
+from os.path import basename
 from typing import Iterable
 
 from ..schemas import ChatMessage
@@ -71,7 +75,18 @@ _SYSTEM_AGENT_TEMPLATE = (
 # --- Functions ---
 def build_chat_history(messages: Iterable[ChatMessage], limit: int = DEFAULT_MODEL_HISTORY) -> list[dict[str, str]]:
     """Обрезает историю диалога до окна контекста модели и убирает пустые реплики."""
-    window = list(messages)[-limit:]
+    # Берём только хвост окна: без копии всей истории (list — срез, deque/итератор — ограниченный проход).
+    if isinstance(messages, (list, tuple)):
+        window = messages[-limit:]
+    elif limit <= 0:
+        window = list(messages)[-limit:]
+    elif isinstance(messages, deque):
+        # Хвост deque — обход с конца, без прохода по всей (длинной) истории.
+        window = list(islice(reversed(messages), limit))[::-1]
+    elif isinstance(messages, Sized):
+        window = islice(messages, max(0, len(messages) - limit), None)
+    else:
+        window = deque(messages, maxlen=limit)
     return [{"role": item.role, "content": item.content} for item in window if item.content.strip()]
 
 
@@ -88,20 +103,34 @@ def build_rag_context(chunks: list[dict], source_order_map: dict[str, int] | Non
     """
     if not chunks:
         return ""
-    parts: list[str] = []
-    for i, chunk in enumerate(chunks, start=1):
-        src = Path(chunk.get("source", "")).name or "unknown"
-        page = chunk.get("page")
-        page_str = f" (стр. {page})" if isinstance(page, int) else ""
-        text = (chunk.get("text") or "").strip()
-        if text:
-            source_id = chunk.get("source_id", "")
-            if source_order_map and source_id in source_order_map:
-                ref_num = source_order_map[source_id]
-            else:
-                ref_num = i
-            parts.append(f"[{ref_num}] {src}{page_str}:\n{text}")
-    return "\n\n".join(parts)
+    return "\n\n".join(
+        _format_context_chunk(chunk, text, i, source_order_map)
+        for i, chunk in enumerate(chunks, start=1)
+        if (text := (chunk.get("text") or "").strip())
+    )
+
+
+def _format_context_chunk(chunk: dict, text: str, index: int, source_order_map: dict[str, int] | None) -> str:
+    """Один фрагмент контекста: ``[N] file (стр. P):\ntext``."""
+    # basename вместо Path(...).name: имя файла без создания объекта Path на каждый чанк.
+    src = basename(chunk.get("source", "")) or "unknown"
+    page = chunk.get("page")
+    page_str = f" (стр. {page})" if isinstance(page, int) else ""
+    source_id = chunk.get("source_id", "")
+    ref_num = source_order_map[source_id] if source_order_map and source_id in source_order_map else index
+    return f"[{ref_num}] {src}{page_str}:\n{text}"
+
+
+@lru_cache(maxsize=64)
+def _format_system(chat_mode: str, rag_context: str, sources_found: bool) -> str:
+    """Системный промпт режима; повторный ход с тем же контекстом не форматирует шаблон заново."""
+    if chat_mode == "rag":
+        return _SYSTEM_RAG_WITH_SOURCES.format(rag_context=rag_context)
+    if chat_mode == "agent":
+        return _SYSTEM_AGENT_TEMPLATE.format(agent_context=rag_context or "id=agent\nrole=generalist")
+    if sources_found and rag_context:
+        return _SYSTEM_MODEL_WITH_SOURCES.format(rag_context=rag_context)
+    return _SYSTEM_MODEL_NO_SOURCES
 
 
 def build_messages_for_mode(
@@ -118,18 +147,7 @@ def build_messages_for_mode(
         rag_context: Отформатированный контекст из retrieved чанков.
         sources_found: Были ли найдены релевантные источники.
     """
-    if chat_mode == "rag":
-        system_content = _SYSTEM_RAG_WITH_SOURCES.format(rag_context=rag_context)
-    elif chat_mode == "agent":
-        system_content = _SYSTEM_AGENT_TEMPLATE.format(
-            agent_context=rag_context or "id=agent\nrole=generalist"
-        )
-    elif sources_found and rag_context:
-        system_content = _SYSTEM_MODEL_WITH_SOURCES.format(rag_context=rag_context)
-    else:
-        system_content = _SYSTEM_MODEL_NO_SOURCES
-
-    system_msg = {"role": "system", "content": system_content}
+    system_msg = {"role": "system", "content": _format_system(chat_mode, rag_context, sources_found)}
     return [system_msg] + history
 
 
@@ -3,40 +3,219 @@
 # --- Imports ---
 from __future__ import annotations
 
+import hashlib
+import heapq
 import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Any
+from typing import Any, Hashable
 
 from .embedding_service import EmbeddingConfig, EmbeddingEngine, EmbeddingProviderConfig
-from ..config import EMBEDDING_BASE_URL, EMBEDDING_DIM, EMBEDDING_ENABLED, EMBEDDING_ENDPOINT, EMBEDDING_PROVIDER
-from .notebook_db import db_for_notebook
+from ..config import EMBEDDING_BASE_URL, EMBEDDING_CACHE_PATH, EMBEDDING_DIM, EMBEDDING_ENABLED, EMBEDDING_ENDPOINT, EMBEDDING_PROVIDER
+from .notebook_db import db_for_notebook, notebook_version
+
+try:
+    import numpy as np
+except Exception:  # noqa: BLE001
+    np = None
+
+
+@dataclass(frozen=True)
+class _EngineState:
+    """Runtime-переопределения эмбеддинга и построенный по ним движок — заменяются целиком."""
+
+    provider: str | None = None
+    base_url: str | None = None
+    model: str | None = None
+    engine: EmbeddingEngine | None = None
+
 
-_ENGINE: EmbeddingEngine | None = None
 # Глобальный singleton движка: лениво инициализируется, может быть пересоздан через reconfigure_engine.
-_OVERRIDE_PROVIDER: str | None = None
-_OVERRIDE_BASE_URL: str | None = None
-_OVERRIDE_MODEL: str | None = None
+# Состояние неизменяемое и подменяется атомарно под _ENGINE_LOCK; чтение готового движка — без блокировки.
+_ENGINE_STATE = _EngineState()
+_ENGINE_LOCK = threading.Lock()
+
+# Кэш эмбеддингов запросов: повторный вопрос не идёт к серверу эмбеддингов.
+_QUERY_CACHE_MAX = 2048
+_QUERY_CACHE_TTL_S = 600.0
+# Кэш готовой выдачи search() для точных повторов (пагинация, повторный запрос UI).
+_RESULT_CACHE_MAX = 512
+_RESULT_CACHE_TTL_S = 60.0
+# Семантический кэш выдачи: близкие по смыслу запросы (cosine >= порога) получают
+# готовый результат без повторных vector/FTS-сканов.
+_SEMANTIC_CACHE_SIZE = 128
+_SEMANTIC_CACHE_THRESHOLD = 0.97
+# Reciprocal Rank Fusion: веса 1 / (k + rank) для первых рангов считаются один раз.
+_RRF_K = 60
+_RRF_WEIGHTS = [1.0 / (_RRF_K + rank) for rank in range(1, 1024)]
+# Пул для параллельных vector/FTS-запросов: каждый идёт через своё соединение SQLite (WAL).
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
 
 
 # --- Основные блоки ---
+class _TTLCache:
+    """Потокобезопасный LRU-кэш с TTL и счётчиками попаданий (векторы запросов, выдача search)."""
+
+    def __init__(self, maxsize: int, ttl_s: float):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_s, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+class _SemanticResultCache:
+    """Кольцевой буфер (вектор запроса → выдача) с поиском ближайшего одним матрично-векторным умножением.
+
+    Записи привязаны к области поиска: ноутбук, выбранные источники, top_n и версия
+    содержимого ноутбука — после любой записи в БД старые результаты не совпадут.
+    Без numpy кэш отключён.
+    """
+
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries: list[tuple[tuple, list[dict[str, Any]]] | None] = [None] * capacity
+        self._next = 0
+
+    @staticmethod
+    def _unit(vector: list[float]):
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(arr))
+        return arr / norm if norm > 0.0 else None
+
+    def lookup(self, scope: tuple, vector: list[float]) -> list[dict[str, Any]] | None:
+        if np is None:
+            return None
+        query = self._unit(vector)
+        with self._lock:
+            if query is None or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                return None
+            sims = self._vectors @ query
+            for idx in np.argsort(sims)[::-1]:
+                if sims[idx] < self.threshold:
+                    break
+                entry = self._entries[idx]
+                if entry is not None and entry[0] == scope:
+                    return [dict(item) for item in entry[1]]
+        return None
+
+    def store(self, scope: tuple, vector: list[float], results: list[dict[str, Any]]) -> None:
+        if np is None:
+            return
+        unit = self._unit(vector)
+        if unit is None:
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != unit.shape[0]:
+                self._vectors = np.zeros((self.capacity, unit.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.capacity
+                self._next = 0
+            slot = self._next
+            self._vectors[slot] = unit
+            self._entries[slot] = (scope, [dict(item) for item in results])
+            self._next = (slot + 1) % self.capacity
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors = None
+            self._entries = [None] * self.capacity
+            self._next = 0
+
+
+_QUERY_CACHE = _TTLCache(_QUERY_CACHE_MAX, _QUERY_CACHE_TTL_S)
+_RESULT_CACHE = _TTLCache(_RESULT_CACHE_MAX, _RESULT_CACHE_TTL_S)
+_SEMANTIC_CACHE = _SemanticResultCache(_SEMANTIC_CACHE_SIZE, _SEMANTIC_CACHE_THRESHOLD)
+
+
 def reconfigure_engine(provider: str, base_url: str, model_name: str) -> None:
     """Сбросить движок и применить новые настройки эмбеддинга."""
-    global _ENGINE, _OVERRIDE_PROVIDER, _OVERRIDE_BASE_URL, _OVERRIDE_MODEL
-    _OVERRIDE_PROVIDER = provider
-    _OVERRIDE_BASE_URL = base_url
-    _OVERRIDE_MODEL = model_name
-    _ENGINE = None
+    global _ENGINE_STATE
+    with _ENGINE_LOCK:
+        _ENGINE_STATE = _EngineState(provider=provider, base_url=base_url, model=model_name)
+    # Векторы старой модели несовместимы с новой — кэши запросов сбрасываем.
+    _QUERY_CACHE.clear()
+    _RESULT_CACHE.clear()
+    _SEMANTIC_CACHE.clear()
+
+
+def query_cache_stats() -> dict[str, int]:
+    """Счётчики кэша эмбеддингов запросов: hits / misses / size."""
+    return _QUERY_CACHE.stats()
+
+
+def _embed_query_cached(engine: EmbeddingEngine, message: str) -> list[float]:
+    """Эмбеддинг запроса с кэшированием по (provider, base_url, model, text)."""
+    provider = engine.config.provider
+    raw_key = f"{provider.provider}|{provider.base_url}|{provider.model_name}|{message}"
+    key = hashlib.blake2b(raw_key.encode("utf-8"), digest_size=16).digest()
+    vector = _QUERY_CACHE.get(key)
+    if vector is None:
+        vector = engine.embed_query(message)
+        # Нулевой вектор — признак сбоя провайдера; его не кэшируем, чтобы не закрепить ошибку.
+        if any(vector):
+            _QUERY_CACHE.put(key, vector)
+    return vector
+
+
+def _engine_identity(state: _EngineState) -> tuple[str, str, str]:
+    """(provider, base_url, model) движка с учётом runtime-переопределений и значений по умолчанию."""
+    return (
+        state.provider or EMBEDDING_PROVIDER,
+        state.base_url or EMBEDDING_BASE_URL,
+        state.model or os.getenv("EMBEDDING_MODEL", "nomic-embed-text"),
+    )
 
 
 def _engine() -> EmbeddingEngine | None:
     """Ленивая фабрика EmbeddingEngine с учетом runtime-переопределений."""
-    global _ENGINE
-    if _ENGINE is None:
+    global _ENGINE_STATE
+    state = _ENGINE_STATE
+    if state.engine is not None:
+        return state.engine
+    # Двойная проверка: движок строит один поток, остальные получают готовый экземпляр.
+    with _ENGINE_LOCK:
+        state = _ENGINE_STATE
+        if state.engine is not None:
+            return state.engine
+        provider, base_url, model_name = _engine_identity(state)
         try:
-            provider = _OVERRIDE_PROVIDER or EMBEDDING_PROVIDER
-            base_url = _OVERRIDE_BASE_URL or EMBEDDING_BASE_URL
-            model_name = _OVERRIDE_MODEL or os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
-            _ENGINE = EmbeddingEngine(
+            engine = EmbeddingEngine(
                 EmbeddingConfig(
                     embedding_dim=EMBEDDING_DIM,
                     provider=EmbeddingProviderConfig(
@@ -46,79 +225,140 @@ def _engine() -> EmbeddingEngine | None:
                         endpoint=EMBEDDING_ENDPOINT,
                         enabled=EMBEDDING_ENABLED,
                         fallback_dim=EMBEDDING_DIM,
+                        cache_path=EMBEDDING_CACHE_PATH,
                     )
                 )
             )
         except Exception:
-            _ENGINE = None
-    return _ENGINE
+            return None
+        _ENGINE_STATE = replace(state, engine=engine)
+        return engine
+
+
+def warmup_engine() -> bool:
+    """Строит движок заранее (при старте сервера) и прогревает HTTP-соединение пробным эмбеддингом.
+
+    Возвращает ``True``, если провайдер эмбеддингов доступен. Вызывается вне event loop.
+    """
+    engine = _engine()
+    if engine is None or not engine.is_embedding_available:
+        return False
+    try:
+        engine.embed_query("warmup")
+    except Exception:  # noqa: BLE001
+        return False
+    return True
 
 
 def _rrf_merge(vector_rows: list[dict[str, Any]], fts_rows: list[dict[str, Any]], top_n: int) -> list[dict[str, Any]]:
     """Сливает vector+FTS выдачу по алгоритму Reciprocal Rank Fusion."""
-    k = 60
-    by_id: dict[str, dict[str, Any]] = {}
+    scores: defaultdict[str, float] = defaultdict(float)
+    # Тело строки берём из первого списка, где встретился чанк; копируем только итоговые top_n.
+    bodies: dict[str, dict[str, Any]] = {}
 
-    for rank, row in enumerate(vector_rows, start=1):
-        key = row["chunk_id"]
-        by_id.setdefault(key, {**row, "rrf": 0.0})["rrf"] += 1.0 / (k + rank)
+    for ranked in (vector_rows, fts_rows):
+        for rank, row in enumerate(ranked):
+            key = row["chunk_id"]
+            scores[key] += _RRF_WEIGHTS[rank] if rank < len(_RRF_WEIGHTS) else 1.0 / (_RRF_K + rank + 1)
+            bodies.setdefault(key, row)
 
-    for rank, row in enumerate(fts_rows, start=1):
-        key = row["chunk_id"]
-        by_id.setdefault(key, {**row, "rrf": 0.0})["rrf"] += 1.0 / (k + rank)
+    top = heapq.nlargest(top_n, scores.items(), key=lambda item: item[1])
+    return [{**bodies[key], "rrf": score} for key, score in top]
 
-    merged = sorted(by_id.values(), key=lambda item: item["rrf"], reverse=True)
-    return merged[:top_n]
 
-
-def search(notebook_id: str, message: str, selected_source_ids: list[str], top_n: int = 5) -> list[dict[str, Any]]:
-    """Гибридный retrieval: vector + FTS, затем нормализация к общему формату API."""
+def _vector_rows(
+    notebook_id: str, query_vector: list[float], top_k: int, selected_source_ids: list[str] | None
+) -> list[dict[str, Any]]:
+    """Semantic retrieval через собственное соединение с БД ноутбука."""
     notebook_db = db_for_notebook(notebook_id)
     try:
-        # 1) Пытаемся поднять embedding engine; если недоступен — продолжаем только через FTS.
-        engine = _engine()
-        if engine is not None and engine.is_embedding_available:
-            # Вектор запроса используется для semantic retrieval в notebook_db.search_vector().
-            query_vector = engine.embed_query(message)
-            vector_rows = notebook_db.search_vector(
-                query_vector=query_vector,
-                top_k=max(top_n * 3, 10),
-                selected_source_ids=selected_source_ids or None,
-                only_enabled_tags=True,
-            )
-        else:
-            vector_rows = []
+        return notebook_db.search_vector(
+            query_vector=query_vector,
+            top_k=top_k,
+            selected_source_ids=selected_source_ids,
+            only_enabled_tags=True,
+        )
+    finally:
+        notebook_db.close()
+
+
+def _fts_rows(notebook_id: str, message: str, top_k: int, selected_source_ids: list[str] | None) -> list[dict[str, Any]]:
+    """Lexical retrieval (FTS) через собственное соединение; ошибка FTS не прерывает поиск."""
+    try:
+        notebook_db = db_for_notebook(notebook_id)
         try:
-            # 2) Параллельно запрашиваем FTS-кандидатов, чтобы покрыть lexical match.
-            fts_rows = notebook_db.search_fts(
+            return notebook_db.search_fts(
                 query=message,
-                top_k=max(top_n * 3, 10),
-                selected_source_ids=selected_source_ids or None,
+                top_k=top_k,
+                selected_source_ids=selected_source_ids,
                 only_enabled_tags=True,
             )
-        except Exception:
-            fts_rows = []
-    finally:
-        notebook_db.close()
+        finally:
+            notebook_db.close()
+    except Exception:
+        return []
+
+
+def search(notebook_id: str, message: str, selected_source_ids: list[str], top_n: int = 5) -> list[dict[str, Any]]:
+    """Гибридный retrieval: vector + FTS, затем нормализация к общему формату API."""
+    # Версию фиксируем до чтения БД: запись во время поиска не попадёт в кэш под новой версией.
+    # Выдача зависит и от модели эмбеддинга: в область входит (provider, base_url, model) движка.
+    scope = (
+        notebook_id,
+        tuple(sorted(selected_source_ids or ())),
+        top_n,
+        notebook_version(notebook_id),
+        _engine_identity(_ENGINE_STATE),
+    )
+    # Точный повтор запроса в той же области, версии ноутбука и модели — без RPC и сканов БД.
+    result_key = (message, *scope)
+    cached = _RESULT_CACHE.get(result_key)
+    if cached is not None:
+        return [dict(item) for item in cached]
+
+    top_k = max(top_n * 3, 10)
+    source_filter = selected_source_ids or None
+    # 1) FTS не зависит от вектора запроса — запускаем его до обращения к серверу эмбеддингов,
+    # чтобы lexical-скан шёл параллельно с RPC.
+    fts_future = _SEARCH_POOL.submit(_fts_rows, notebook_id, message, top_k, source_filter)
+    # 2) Пытаемся поднять embedding engine; если недоступен — продолжаем только через FTS.
+    engine = _engine()
+    query_vector: list[float] | None = None
+    if engine is not None and engine.is_embedding_available:
+        query_vector = _embed_query_cached(engine, message)
+        cached = _SEMANTIC_CACHE.lookup(scope, query_vector)
+        if cached is not None:
+            fts_future.cancel()
+            return cached
+
+    # Vector-скан — параллельно с ещё идущим FTS, каждый через своё соединение.
+    if query_vector is not None:
+        vector_future = _SEARCH_POOL.submit(_vector_rows, notebook_id, query_vector, top_k, source_filter)
+        vector_rows = vector_future.result()
+    else:
+        vector_rows = []
+    fts_rows = fts_future.result()
 
     # 3) Если векторов нет — возвращаем FTS, иначе объединяем выдачу через RRF.
     merged = fts_rows[:top_n] if not vector_rows else _rrf_merge(vector_rows, fts_rows, top_n)
     # 4) Приводим записи БД к единому контракту ответа для chat/retrieval API.
-    result: list[dict[str, Any]] = []
-    for row in merged:
-        result.append(
-            {
-                "source_id": row.get("doc_id"),
-                "source": row.get("filepath") or row.get("filename") or "",
-                "page": row.get("page_number") or 1,
-                "section_id": row.get("chunk_id"),
-                "section_title": row.get("section_header") or "__root__",
-                "text": row.get("chunk_text", ""),
-                "type": "text",
-                "doc_id": row.get("doc_id"),
-                "score": row.get("rrf", 0.0),
-            }
-        )
+    result: list[dict[str, Any]] = [
+        {
+            "source_id": row.get("doc_id"),
+            "source": row.get("filepath") or row.get("filename") or "",
+            "page": row.get("page_number") or 1,
+            "section_id": row.get("chunk_id"),
+            "section_title": row.get("section_header") or "__root__",
+            "text": row.get("chunk_text", ""),
+            "type": "text",
+            "doc_id": row.get("doc_id"),
+            "score": row.get("rrf", 0.0),
+        }
+        for row in merged
+    ]
+    if query_vector is not None:
+        _SEMANTIC_CACHE.store(scope, query_vector, result)
+    _RESULT_CACHE.put(result_key, [dict(item) for item in result])
     return result
 
 
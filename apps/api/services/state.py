@@ -4,17 +4,93 @@ from __future__ import annotations
 
 import json
 import logging
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from uuid import uuid4
 
-from ..config import CITATIONS_DIR, NOTES_DIR
+from ..config import CITATIONS_DIR, MAX_CHAT_MESSAGES, NOTES_DIR
 from ..schemas import ChatMessage, CitationLocation, GlobalNote, SavedCitation, now_iso
 
+try:
+    import orjson
+except Exception:  # noqa: BLE001
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 
+# --- Constants ---
+# Холодный листинг читает файлы параллельно: независимые read() перекрываются в пуле.
+_LISTING_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="listing")
+# Для коротких листингов накладные расходы пула больше выигрыша — читаем последовательно.
+_LISTING_PARALLEL_MIN = 8
+
+
+# --- Functions ---
+def _read_json(path: Path):
+    """Читает JSON-файл: orjson разбирает байты напрямую, без промежуточной str."""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _load_model(path: Path, model: type, label: str):
+    """Загружает один JSON-файл как ``model``; при ошибке пишет в лог и возвращает None."""
+    try:
+        return model(**_read_json(path))
+    except Exception:
+        logger.exception("Failed to load %s file %s", label, path)
+        return None
+
+
+def _write_model(path: Path, model) -> None:
+    """Атомарно сохраняет pydantic-модель как JSON с отступом 2 пробела.
+
+    Данные пишутся во временный файл рядом с целевым и подменяются через os.replace:
+    параллельный листинг никогда не видит недописанный JSON.
+    """
+    if orjson is not None:
+        payload = orjson.dumps(model.model_dump(), option=orjson.OPT_INDENT_2)
+    else:
+        payload = model.model_dump_json(indent=2).encode("utf-8")
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.stem}.", suffix=".tmp", delete=False) as tmp:
+        tmp.write(payload)
+    try:
+        os.replace(tmp.name, path)
+    except BaseException:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+
 
 # --- Models / Classes ---
+@dataclass(slots=True)
+class ChatMessageRow:
+    """Сообщение чата во внутреннем хранилище: без валидации и ``__dict__`` на каждый экземпляр.
+
+    Pydantic-модель :class:`ChatMessage` строится только на границе API (:meth:`to_schema`).
+    """
+
+    id: str
+    notebook_id: str
+    role: str
+    content: str
+    created_at: str
+
+    def to_schema(self) -> ChatMessage:
+        return ChatMessage.model_construct(
+            id=self.id,
+            notebook_id=self.notebook_id,
+            role=self.role,
+            content=self.content,
+            created_at=self.created_at,
+        )
+
+
 class InMemoryState:
     """Чистое in-memory хранилище: словари состояния и простые геттеры/сеттеры.
 
@@ -25,44 +101,158 @@ class InMemoryState:
         from ..schemas import Notebook, ParsingSettings, Source
         self.notebooks: dict[str, Notebook] = {}
         self.sources: dict[str, Source] = {}
-        self.messages: dict[str, list[ChatMessage]] = {}
+        # История чата — deque с ограничением длины: O(1) append, старые реплики вытесняются.
+        self.messages: dict[str, deque[ChatMessageRow]] = {}
         self.chat_versions: dict[str, int] = {}
         self.parsing_settings: dict[str, ParsingSettings] = {}
+        # Индекс источников по ноутбукам (упорядоченное множество id) и кэш карт нумерации:
+        # выборка источников одного ноутбука — O(k) вместо скана всех источников.
+        self._source_ids_by_notebook: dict[str, dict[str, None]] = {}
+        self._source_order_cache: dict[str, dict[str, int]] = {}
+        # Мутации состояния ноутбука (индекс и поля источников, порядок, история чата) — под его
+        # собственным RLock: индексация одного ноутбука не блокирует запросы к другим, а корректность
+        # не опирается на GIL. Чтение — по снимку списка id.
+        self._source_locks: dict[str, threading.RLock] = {}
+        # Кэш разобранных JSON-листингов (цитаты/заметки): каталог → (mtime_ns, записи).
+        self._listing_cache: dict[Path, tuple[int, list]] = {}
+        # Каталоги ноутбуков, уже созданные этим процессом: mkdir на горячем пути — один раз.
+        self._known_dirs: set[Path] = set()
+
+    def _ensure_dir(self, directory: Path) -> Path:
+        """Создаёт каталог при первом обращении; дальше — без системных вызовов."""
+        if directory not in self._known_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._known_dirs.add(directory)
+        return directory
+
+    def _forget_dir(self, directory: Path) -> None:
+        """Каталог удалён (вместе с ноутбуком или извне) — следующий _ensure_dir создаст его заново."""
+        self._known_dirs.discard(directory)
+
+    def _notebook_lock(self, notebook_id: str) -> threading.RLock:
+        """Блокировка мутаций источников ноутбука (создаётся при первом обращении)."""
+        lock = self._source_locks.get(notebook_id)
+        if lock is None:
+            lock = self._source_locks.setdefault(notebook_id, threading.RLock())
+        return lock
+
+    def _add_source(self, source) -> None:
+        """Регистрирует источник в хранилище и в индексе его ноутбука."""
+        previous = self.sources.get(source.id)
+        if previous is not None and previous.notebook_id != source.notebook_id:
+            self._remove_source(source.id)
+        with self._notebook_lock(source.notebook_id):
+            self.sources[source.id] = source
+            self._source_ids_by_notebook.setdefault(source.notebook_id, {})[source.id] = None
+            self._invalidate_source_order(source.notebook_id)
+
+    def _remove_source(self, source_id: str):
+        """Удаляет источник из хранилища и индекса; возвращает удалённый объект или None."""
+        source = self.sources.get(source_id)
+        if source is None:
+            return None
+        with self._notebook_lock(source.notebook_id):
+            source = self.sources.pop(source_id, None)
+            if source is not None:
+                self._source_ids_by_notebook.get(source.notebook_id, {}).pop(source_id, None)
+                self._invalidate_source_order(source.notebook_id)
+        return source
+
+    def _pop_notebook_sources(self, notebook_id: str) -> list:
+        """Снимает с учёта все источники ноутбука разом и возвращает их (для удаления ноутбука)."""
+        with self._notebook_lock(notebook_id):
+            source_ids = self._source_ids_by_notebook.pop(notebook_id, {})
+            removed = [source for source_id in source_ids if (source := self.sources.pop(source_id, None)) is not None]
+            self._invalidate_source_order(notebook_id)
+        return removed
+
+    def _invalidate_source_order(self, notebook_id: str) -> None:
+        """Сбрасывает кэш нумерации после добавления/удаления/переупорядочивания источников."""
+        self._source_order_cache.pop(notebook_id, None)
+
+    def sources_for_notebook(self, notebook_id: str) -> list:
+        """Источники ноутбука (без учёта порядка отображения); снимок, безопасный к параллельным мутациям."""
+        with self._notebook_lock(notebook_id):
+            source_ids = list(self._source_ids_by_notebook.get(notebook_id, ()))
+        return [source for source_id in source_ids if (source := self.sources.get(source_id)) is not None]
 
     def get_source_order_map(self, notebook_id: str) -> dict[str, int]:
-        """Return mapping of source_id → sequential display number (1-based) for the notebook."""
-        nb_sources = sorted(
-            [s for s in self.sources.values() if s.notebook_id == notebook_id],
-            key=lambda s: (s.sort_order, s.added_at),
-        )
-        return {s.id: idx for idx, s in enumerate(nb_sources, start=1)}
+        """Return mapping of source_id → sequential display number (1-based) for the notebook.
+
+        The map is cached per notebook until its sources change; treat it as read-only.
+        """
+        cached = self._source_order_cache.get(notebook_id)
+        if cached is not None:
+            return cached
+        # Под блокировкой: карта не может закэшироваться поверх параллельной инвалидации.
+        with self._notebook_lock(notebook_id):
+            nb_sources = sorted(self.sources_for_notebook(notebook_id), key=lambda s: (s.sort_order, s.added_at))
+            order_map = {s.id: idx for idx, s in enumerate(nb_sources, start=1)}
+            self._source_order_cache[notebook_id] = order_map
+        return order_map
 
     def get_parsing_settings(self, notebook_id: str):
         """Возвращает настройки парсинга для ноутбука, создавая дефолтные при отсутствии."""
         from ..schemas import ParsingSettings
         return self.parsing_settings.setdefault(notebook_id, ParsingSettings())
 
-    def add_message(self, notebook_id: str, role: str, content: str) -> ChatMessage:
+    def add_message(self, notebook_id: str, role: str, content: str) -> ChatMessageRow:
         """Добавляет сообщение в историю чата ноутбука."""
-        message = ChatMessage(
-            id=str(uuid4()),
-            notebook_id=notebook_id,
-            role=role,
-            content=content,
-            created_at=now_iso(),
-        )
-        self.messages.setdefault(notebook_id, []).append(message)
+        message = ChatMessageRow(uuid4().hex, notebook_id, role, content, now_iso())
+        with self._notebook_lock(notebook_id):
+            self.chat_history(notebook_id).append(message)
         return message
 
+    def chat_history(self, notebook_id: str) -> deque[ChatMessageRow]:
+        """История чата ноутбука (создаётся пустой при первом обращении)."""
+        history = self.messages.get(notebook_id)
+        if history is None:
+            history = self.messages.setdefault(notebook_id, deque(maxlen=MAX_CHAT_MESSAGES))
+        return history
+
     def clear_messages(self, notebook_id: str) -> int:
         """Очищает историю чата и инкрементирует версию."""
-        self.messages[notebook_id] = []
-        self.chat_versions[notebook_id] = self.chat_versions.get(notebook_id, 0) + 1
-        return self.chat_versions[notebook_id]
+        # Новый список подменяется одной операцией; старый опустошается сразу, не дожидаясь GC,
+        # даже если на него ещё держит ссылку читатель.
+        with self._notebook_lock(notebook_id):
+            previous = self.messages.get(notebook_id)
+            self.messages[notebook_id] = deque(maxlen=MAX_CHAT_MESSAGES)
+            if previous is not None:
+                previous.clear()
+            version = self.chat_versions[notebook_id] = self.chat_versions.get(notebook_id, 0) + 1
+        return version
 
     def get_chat_version(self, notebook_id: str) -> int:
         return self.chat_versions.get(notebook_id, 0)
 
+    # --- JSON listings (cached by directory mtime) ---
+
+    def _load_listing(self, directory: Path, model: type, label: str) -> list:
+        """Читает все ``*.json`` каталога как модели ``model``, отсортированные по created_at.
+
+        Результат кэшируется по mtime каталога: создание/удаление файла меняет mtime,
+        повторный листинг без изменений обходится без glob и разбора JSON.
+        """
+        try:
+            mtime_ns = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        cached = self._listing_cache.get(directory)
+        if cached is not None and cached[0] == mtime_ns:
+            return list(cached[1])
+        files = sorted(directory.glob("*.json"))
+        if len(files) >= _LISTING_PARALLEL_MIN:
+            loaded = _LISTING_POOL.map(lambda f: _load_model(f, model, label), files)
+        else:
+            loaded = (_load_model(f, model, label) for f in files)
+        results = [item for item in loaded if item is not None]
+        results.sort(key=lambda item: item.created_at)
+        self._listing_cache[directory] = (mtime_ns, results)
+        return list(results)
+
+    def _invalidate_listing(self, directory: Path) -> None:
+        self._listing_cache.pop(directory, None)
+
     # --- Saved Citations (persistent, per-notebook) ---
 
     def _citation_path(self, notebook_id: str, citation_id: str) -> Path:
@@ -72,15 +262,7 @@ class InMemoryState:
         nb_dir = CITATIONS_DIR / notebook_id
         if not nb_dir.exists():
             return []
-        results = []
-        for f in sorted(nb_dir.glob("*.json")):
-            try:
-                data = json.loads(f.read_text(encoding="utf-8"))
-                results.append(SavedCitation(**data))
-            except Exception:
-                logger.exception("Failed to load citation file %s", f)
-        results.sort(key=lambda c: c.created_at)
-        return results
+        return self._load_listing(nb_dir, SavedCitation, "citation")
 
     def save_citation(
         self,
@@ -95,7 +277,7 @@ class InMemoryState:
         source_type: str = "notebook",
     ) -> SavedCitation:
         citation = SavedCitation(
-            id=str(uuid4()),
+            id=uuid4().hex,
             notebook_id=notebook_id,
             source_id=source_id,
             filename=filename,
@@ -106,17 +288,16 @@ class InMemoryState:
             source_notebook_id=source_notebook_id,
             source_type=source_type,
         )
-        nb_dir = CITATIONS_DIR / notebook_id
-        nb_dir.mkdir(parents=True, exist_ok=True)
-        self._citation_path(notebook_id, citation.id).write_text(
-            citation.model_dump_json(indent=2), encoding="utf-8"
-        )
+        nb_dir = self._ensure_dir(CITATIONS_DIR / notebook_id)
+        _write_model(self._citation_path(notebook_id, citation.id), citation)
+        self._invalidate_listing(nb_dir)
         return citation
 
     def delete_saved_citation(self, notebook_id: str, citation_id: str) -> bool:
         path = self._citation_path(notebook_id, citation_id)
         if path.exists():
             path.unlink(missing_ok=True)
+            self._invalidate_listing(path.parent)
             return True
         return False
 
@@ -127,11 +308,12 @@ class InMemoryState:
             return
         for f in nb_dir.glob("*.json"):
             try:
-                data = json.loads(f.read_text(encoding="utf-8"))
+                data = _read_json(f)
                 if data.get("source_id") == source_id:
                     f.unlink(missing_ok=True)
             except Exception:
                 logger.exception("Failed to check citation file %s", f)
+        self._invalidate_listing(nb_dir)
 
     # --- Global Notes (persistent, cross-notebook) ---
 
@@ -139,15 +321,7 @@ class InMemoryState:
         return NOTES_DIR / f"{note_id}.json"
 
     def list_global_notes(self) -> list[GlobalNote]:
-        results = []
-        for f in sorted(NOTES_DIR.glob("*.json")):
-            try:
-                data = json.loads(f.read_text(encoding="utf-8"))
-                results.append(GlobalNote(**data))
-            except Exception:
-                logger.exception("Failed to load note file %s", f)
-        results.sort(key=lambda n: n.created_at)
-        return results
+        return self._load_listing(NOTES_DIR, GlobalNote, "note")
 
     def save_global_note(
         self,
@@ -157,19 +331,21 @@ class InMemoryState:
         source_refs: list[dict] | None = None,
     ) -> GlobalNote:
         note = GlobalNote(
-            id=str(uuid4()),
+            id=uuid4().hex,
             content=content,
             source_notebook_id=source_notebook_id,
             source_notebook_title=source_notebook_title,
             created_at=now_iso(),
             source_refs=source_refs or [],
         )
-        self._note_path(note.id).write_text(note.model_dump_json(indent=2), encoding="utf-8")
+        _write_model(self._note_path(note.id), note)
+        self._invalidate_listing(NOTES_DIR)
         return note
 
     def delete_global_note(self, note_id: str) -> bool:
         path = self._note_path(note_id)
         if path.exists():
             path.unlink(missing_ok=True)
+            self._invalidate_listing(NOTES_DIR)
             return True
         return False
@@ -7,7 +7,9 @@ from pathlib import Path
 
 import pytest
 
+from apps.api.services.parse.chunkers.hierarchy import HierarchyChunker
 from apps.api.services.parse_service import ChunkType, DocumentParser, ParserConfig
+from apps.api.schemas import Source
 from apps.api.store import InMemoryStore
 
 
@@ -207,3 +209,38 @@ def test_individual_merge() -> None:
     indiv = source.individual_config or {}
     merged_chunk_size = int(indiv.get('chunk_size') or settings.chunk_size)
     assert merged_chunk_size == 77
+
+
+def test_hierarchy_chunk_indexes_are_sequential() -> None:
+    config = ParserConfig(chunk_size=8, min_chunk_size=1, chunking_method="hierarchy", doc_type="markdown")
+    long_text = " ".join(f"word{i}" for i in range(40))
+    blocks = [
+        {"text": "# Intro", "chunk_type": ChunkType.HEADER, "page_number": 1},
+        {"text": "short intro", "chunk_type": ChunkType.TEXT, "page_number": 1},
+        {"text": "## Large", "chunk_type": ChunkType.HEADER, "page_number": 1},
+        {"text": long_text, "chunk_type": ChunkType.TEXT, "page_number": 2},
+        {"text": "## Tail", "chunk_type": ChunkType.HEADER, "page_number": 3},
+        {"text": "tail text", "chunk_type": ChunkType.TEXT, "page_number": 3},
+    ]
+
+    chunks = HierarchyChunker(config).chunk(blocks, doc_id="doc", source_filename="doc.md")
+
+    assert len(chunks) > 3
+    assert chunks[0].text.startswith("Intro")
+    assert chunks[-1].text.startswith("Intro > Tail")
+    assert [chunk.chunk_index for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_parser_config_is_cached_until_settings_change() -> None:
+    store = InMemoryStore()
+    notebook_id = next(iter(store.notebooks))
+    source = Source.model_construct(id="src-cfg", notebook_id=notebook_id, individual_config={"chunk_size": 7})
+
+    first = store._parser_config(source)
+    assert first.chunk_size == 7
+    assert store._parser_config(source) is first
+
+    source.individual_config = {"chunk_size": None}
+    second = store._parser_config(source)
+    assert second is not first
+    assert second.chunk_size == store.get_parsing_settings(notebook_id).chunk_size
@@ -11,6 +11,7 @@ from apps.api.services.embedding_service import (
     EmbeddingEngine,
     EmbeddingProviderConfig,
     QuantizationConfig,
+    decode_chunk_embedding,
     suggest_quantization,
 )
 
@@ -107,6 +108,32 @@ def test_embed_document_from_parsing_returns_embedded_chunks(tmp_path, monkeypat
     assert source.exists() is True
 
 
+def test_process_document_stores_int8_embeddings_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.setattr("apps.api.services.embedding_service.EmbeddingClient", DummyClient)
+
+    parsing_root = tmp_path / "parsing"
+    base_root = tmp_path / "base"
+    (parsing_root / "nb1").mkdir(parents=True)
+    chunks = [{"text": "hello", "chunk_type": "text"}, {"text": "fail item", "chunk_type": "text"}]
+    (parsing_root / "nb1" / "doc3.json").write_text(json.dumps({"chunks": chunks}), encoding="utf-8")
+
+    engine = EmbeddingEngine(
+        EmbeddingConfig(
+            provider=EmbeddingProviderConfig(base_url="http://localhost:11434", model_name="dummy"),
+            parsing_root=str(parsing_root),
+            base_root=str(base_root),
+            quantize_chunk_files=True,
+        )
+    )
+    embedded = engine.process_document("nb1", "doc3")
+
+    data = json.loads((base_root / "nb1" / "chunks" / "doc3.json").read_text(encoding="utf-8"))
+    assert data[0]["quant"] == "int8"
+    decoded = decode_chunk_embedding(data[0])
+    assert max(abs(a - b) for a, b in zip(decoded, embedded[0].embedding)) < 0.01
+    assert decode_chunk_embedding(data[1]) == [0.0, 0.0, 0.0, 0.0]
+
+
 class FakeResponse:
     def __init__(self, status_code: int, payload: dict | None = None):
         self.status_code = status_code
@@ -171,6 +198,60 @@ def test_base_url_api_suffix_is_not_duplicated(monkeypatch):
     assert all('/api/api/' not in url for url in client._client.posts)
 
 
+class FakeHTTPClientBatchedEmbed(FakeHTTPClient):
+    def __init__(self, *_args, **_kwargs):
+        super().__init__()
+        self.gets: list[str] = []
+
+    def get(self, url: str) -> FakeResponse:
+        self.gets.append(url)
+        return super().get(url)
+
+    def post(self, url: str, json: dict) -> FakeResponse:
+        self.posts.append(url)
+        if url.endswith('/api/embed'):
+            return FakeResponse(200, {'embeddings': [[float(len(text)), 0.0, 0.0, 0.0] for text in json['input']]})
+        return FakeResponse(404)
+
+
+def test_batched_endpoint_is_cached_after_first_success(monkeypatch):
+    from apps.api.services import embedding_service
+
+    monkeypatch.setattr(embedding_service.httpx, 'Client', FakeHTTPClientBatchedEmbed)
+    client = embedding_service.EmbeddingClient(
+        EmbeddingProviderConfig(base_url='http://localhost:11434', model_name='dummy', provider='ollama')
+    )
+    client._client.posts.clear()
+    client._client.gets.clear()
+
+    vectors = client.get_embeddings(['a', 'bb', 'ccc'])
+    assert [vector[0] for vector in vectors] == [1.0, 2.0, 3.0]
+    assert client._client.posts == ['http://localhost:11434/api/embed']
+    assert client._client.gets == []
+    assert client._batched is True
+
+
+def test_embedding_cache_sends_only_uncached_texts(tmp_path, monkeypatch):
+    from apps.api.services import embedding_service
+
+    monkeypatch.setattr(embedding_service.httpx, 'Client', FakeHTTPClientBatchedEmbed)
+    provider = EmbeddingProviderConfig(
+        base_url='http://localhost:11434', model_name='dummy', provider='ollama', cache_path=str(tmp_path / 'cache.db')
+    )
+    client = embedding_service.EmbeddingClient(provider)
+    client.get_embeddings(['a', 'bb'])
+
+    # Новый клиент (как после рестарта) берёт векторы из того же файла кэша.
+    client = embedding_service.EmbeddingClient(provider)
+    client._client.posts.clear()
+    vectors = client.get_embeddings(['bb', 'ccc', 'a'])
+    assert [vector[0] for vector in vectors] == [2.0, 3.0, 1.0]
+    assert len(client._client.posts) == 1
+
+    client.get_embeddings(['a', 'ccc'])
+    assert len(client._client.posts) == 1
+
+
 class FakeHTTPClientV1Only(FakeHTTPClient):
     def post(self, url: str, json: dict) -> FakeResponse:
         self.posts.append(url)
@@ -240,6 +321,58 @@ def test_embedding_model_alias_fallback_from_tagged_name(monkeypatch):
     assert vectors[0] == [1.0, 2.0, 3.0, 4.0]
 
 
+def test_embedding_cache_keys_vectors_by_model_that_answered(tmp_path, monkeypatch):
+    from apps.api.services import embedding_service
+
+    monkeypatch.setattr(embedding_service.httpx, 'Client', FakeHTTPClientModelAlias)
+    client = embedding_service.EmbeddingClient(
+        EmbeddingProviderConfig(
+            base_url='http://localhost:11434/api',
+            model_name='qwen3-embedding:0.6b',
+            provider='ollama',
+            cache_path=str(tmp_path / 'cache.db'),
+        )
+    )
+    # Пробный запрос ушёл к 'qwen3-embedding:0.6b', ответила fallback-модель — в кэш ничего не легло.
+    assert client._active_model == 'qwen3-embedding'
+    probe = [client._cache.text_hash('dimension probe')]
+    assert client._cache.get_many(probe, ('ollama', 'http://localhost:11434', 'qwen3-embedding:0.6b')) == {}
+    assert client._cache.get_many(probe, ('ollama', 'http://localhost:11434', 'qwen3-embedding')) == {}
+
+    client.get_embeddings(['hello'])
+    hello = [client._cache.text_hash('hello')]
+    assert client._cache.get_many(hello, ('ollama', 'http://localhost:11434', 'qwen3-embedding:0.6b')) == {}
+    assert client._cache.get_many(hello, ('ollama', 'http://localhost:11434', 'qwen3-embedding'))
+    assert client._cache.get_many(hello, ('ollama', 'http://other-host:11434', 'qwen3-embedding')) == {}
+
+
+class FakeHTTPClientModelGoesAway(FakeHTTPClient):
+    """'emb:v1' отвечает на первые три запроса, потом пропадает; базовая 'emb' работает всегда."""
+
+    def post(self, url: str, json: dict) -> FakeResponse:
+        self.posts.append(url)
+        if not url.endswith('/api/embed'):
+            return FakeResponse(404)
+        if json['model'] == 'emb:v1' and len(self.posts) <= 3:
+            return FakeResponse(200, {'embeddings': [[1.0, 0.0] for _ in json['input']]})
+        if json['model'] == 'emb':
+            return FakeResponse(200, {'embeddings': [[0.0, 1.0] for _ in json['input']]})
+        return FakeResponse(404)
+
+
+def test_document_vectors_come_from_one_model_when_model_switches(monkeypatch):
+    from apps.api.services import embedding_service
+
+    monkeypatch.setattr(embedding_service.httpx, 'Client', FakeHTTPClientModelGoesAway)
+    engine = EmbeddingEngine(
+        EmbeddingConfig(provider=EmbeddingProviderConfig(base_url='http://localhost:11434', model_name='emb:v1', provider='ollama'))
+    )
+
+    vectors = engine.embed_batch([f'text {idx}' for idx in range(8)], max_batch_size=1)
+    assert engine.client._active_model == 'emb'
+    assert vectors == [[0.0, 1.0]] * 8
+
+
 def test_disable_retries_when_model_absent(monkeypatch):
     from apps.api.services import embedding_service
 
@@ -255,3 +388,25 @@ def test_disable_retries_when_model_absent(monkeypatch):
     assert all(value == 0.0 for value in first[0])
     assert all(value == 0.0 for value in second[0])
     assert len(client._client.posts) == posts_after_first
+
+
+def test_token_budget_batches_respect_count_and_token_limits():
+    from apps.api.services.embedding_service import _token_budget_batches
+
+    assert _token_budget_batches(["a"] * 5, max_batch_tokens=100, max_batch_size=2) == [(0, 2), (2, 4), (4, 5)]
+    assert _token_budget_batches(["x" * 40, "x" * 40, "x" * 400, "y"], max_batch_tokens=25, max_batch_size=10) == [(0, 2), (2, 3), (3, 4)]
+    assert _token_budget_batches([], 100, 10) == []
+
+
+def test_embed_batch_keeps_order_across_parallel_batches(monkeypatch):
+    class EchoClient(DummyClient):
+        def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+            return [[float(text), 1.0, 0.0, 0.0] for text in texts]
+
+    monkeypatch.setattr("apps.api.services.embedding_service.EmbeddingClient", EchoClient)
+    engine = EmbeddingEngine(
+        EmbeddingConfig(provider=EmbeddingProviderConfig(base_url="http://localhost:11434", model_name="dummy"), normalize_embeddings=False)
+    )
+    texts = [str(idx) for idx in range(10)]
+    vectors = engine.embed_batch(texts, max_batch_size=3)
+    assert [vec[0] for vec in vectors] == [float(idx) for idx in range(10)]
@@ -0,0 +1,35 @@
+"""Тесты фоновой очереди индексации."""
+
+# --- Imports ---
+from __future__ import annotations
+
+import threading
+
+from apps.api.services.index_queue import IndexQueue
+
+
+# --- Основные блоки ---
+def test_cancelled_source_is_skipped_by_worker():
+    gate = threading.Event()
+    done = threading.Event()
+    handled: list[str] = []
+
+    async def handler(source_id: str) -> None:
+        if source_id == "blocker":
+            gate.wait(5)
+        handled.append(source_id)
+        if source_id == "last":
+            done.set()
+
+    queue = IndexQueue(handler, workers=1)
+    queue.submit("blocker")
+    cancelled = queue.submit("cancelled")
+    last = queue.submit("last")
+    assert queue.cancel("cancelled") is True
+    assert queue.cancel("unknown") is False
+    gate.set()
+
+    assert done.wait(5)
+    last.result(5)
+    assert handled == ["blocker", "last"]
+    assert cancelled.cancelled()
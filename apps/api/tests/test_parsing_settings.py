@@ -3,13 +3,12 @@
 # --- Imports ---
 from __future__ import annotations
 
-import json
 import time
 
 from fastapi.testclient import TestClient
 
-from apps.api.config import CHUNKS_DIR
 from apps.api.main import app
+from apps.api.services.parse import load_parsing_payload
 
 client = TestClient(app)
 
@@ -21,6 +20,10 @@ def _first_notebook_id() -> str:
     return response.json()[0]['id']
 
 
+def _parsing_payload(notebook_id: str, source_id: str) -> dict:
+    return load_parsing_payload(notebook_id, source_id)
+
+
 def _wait_source(source_id: str, timeout_s: float = 10.0) -> dict:
     deadline = time.time() + timeout_s
     while time.time() < deadline:
@@ -50,9 +53,7 @@ def test_global_and_individual_settings_are_applied() -> None:
     source = _wait_source(source_id)
     assert source['status'] == 'indexed'
 
-    initial_json = CHUNKS_DIR / notebook_id / f"{source_id}.json"
-    assert initial_json.exists()
-    payload_json = json.loads(initial_json.read_text(encoding='utf-8'))
+    payload_json = _parsing_payload(notebook_id, source_id)
     assert payload_json['metadata']['individual_config']['chunk_size'] is None
 
     patch = client.patch(
@@ -73,5 +74,5 @@ def test_global_and_individual_settings_are_applied() -> None:
     source = _wait_source(source_id)
     assert source['status'] == 'indexed'
 
-    payload_json = json.loads((CHUNKS_DIR / notebook_id / f"{source_id}.json").read_text(encoding='utf-8'))
+    payload_json = _parsing_payload(notebook_id, source_id)
     assert payload_json['metadata']['individual_config']['chunk_size'] == 5
@@ -0,0 +1,114 @@
+"""Тесты сервиса retrieval-поиска."""
+
+# --- Imports ---
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from apps.api.services import search_service
+from apps.api.services.embedding_service import EmbeddingProviderConfig
+
+
+# --- Основные блоки ---
+class CountingEngine:
+    def __init__(self, vector: list[float]):
+        self.config = SimpleNamespace(provider=EmbeddingProviderConfig(base_url="http://localhost:11434", model_name="dummy"))
+        self.vector = vector
+        self.calls = 0
+
+    def embed_query(self, query_text: str) -> list[float]:
+        self.calls += 1
+        return self.vector
+
+
+def test_query_embedding_cache_reuses_vector_and_resets_on_reconfigure(monkeypatch):
+    monkeypatch.setattr(search_service, "_QUERY_CACHE", search_service._TTLCache(8, 60.0))
+    engine = CountingEngine([1.0, 0.0])
+
+    first = search_service._embed_query_cached(engine, "hello")
+    second = search_service._embed_query_cached(engine, "hello")
+    assert first == second == [1.0, 0.0]
+    assert engine.calls == 1
+    assert search_service.query_cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    monkeypatch.setattr(search_service, "_ENGINE_STATE", search_service._EngineState())
+    search_service.reconfigure_engine("ollama", "http://localhost:11434", "dummy")
+    search_service._embed_query_cached(engine, "hello")
+    assert engine.calls == 2
+
+
+def test_query_embedding_cache_skips_failed_zero_vectors(monkeypatch):
+    monkeypatch.setattr(search_service, "_QUERY_CACHE", search_service._TTLCache(8, 60.0))
+    engine = CountingEngine([0.0, 0.0])
+
+    search_service._embed_query_cached(engine, "hello")
+    search_service._embed_query_cached(engine, "hello")
+    assert engine.calls == 2
+
+
+def test_semantic_cache_matches_close_vectors_within_same_scope():
+    cache = search_service._SemanticResultCache(4, 0.97)
+    scope = ("nb1", (), 5, 0)
+    cache.store(scope, [1.0, 0.0, 0.0], [{"section_id": "c1", "score": 0.5}])
+
+    assert cache.lookup(scope, [0.99, 0.05, 0.0]) == [{"section_id": "c1", "score": 0.5}]
+    assert cache.lookup(scope, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(("nb1", (), 5, 1), [1.0, 0.0, 0.0]) is None
+
+
+def test_rrf_merge_copies_only_winners_and_keeps_inputs_intact():
+    vector_rows = [{"chunk_id": "a", "chunk_text": "A"}, {"chunk_id": "b", "chunk_text": "B"}]
+    fts_rows = [{"chunk_id": "b", "chunk_text": "B-fts"}, {"chunk_id": "c", "chunk_text": "C"}]
+
+    merged = search_service._rrf_merge(vector_rows, fts_rows, top_n=2)
+
+    assert [row["chunk_id"] for row in merged] == ["b", "a"]
+    assert merged[0]["chunk_text"] == "B"
+    assert merged[0]["rrf"] == 1.0 / 62 + 1.0 / 61
+    assert all("rrf" not in row for row in vector_rows + fts_rows)
+
+
+def test_search_reuses_result_until_notebook_changes(monkeypatch):
+    monkeypatch.setattr(search_service, "_RESULT_CACHE", search_service._TTLCache(8, 60.0))
+    monkeypatch.setattr(search_service, "_engine", lambda: None)
+    calls = []
+
+    def fake_fts_rows(notebook_id, message, top_k, selected_source_ids):
+        calls.append(message)
+        return [{"chunk_id": "c1", "doc_id": "d1", "chunk_text": "hello", "page_number": 2}]
+
+    monkeypatch.setattr(search_service, "_fts_rows", fake_fts_rows)
+    version = {"value": 0}
+    monkeypatch.setattr(search_service, "notebook_version", lambda _notebook_id: version["value"])
+
+    first = search_service.search("nb-cache", "hello", [])
+    first[0]["text"] = "mutated"
+    second = search_service.search("nb-cache", "hello", [])
+    assert len(calls) == 1
+    assert second[0]["text"] == "hello"
+
+    version["value"] += 1
+    search_service.search("nb-cache", "hello", [])
+    assert len(calls) == 2
+
+
+def test_search_result_cache_is_scoped_by_embedding_model(monkeypatch):
+    monkeypatch.setattr(search_service, "_RESULT_CACHE", search_service._TTLCache(8, 60.0))
+    monkeypatch.setattr(search_service, "_engine", lambda: None)
+    monkeypatch.setattr(search_service, "notebook_version", lambda _notebook_id: 0)
+    calls = []
+
+    def fake_fts_rows(notebook_id, message, top_k, selected_source_ids):
+        calls.append(message)
+        return [{"chunk_id": "c1", "doc_id": "d1", "chunk_text": "hello", "page_number": 2}]
+
+    monkeypatch.setattr(search_service, "_fts_rows", fake_fts_rows)
+    monkeypatch.setattr(search_service, "_ENGINE_STATE", search_service._EngineState(model="model-a"))
+    search_service.search("nb-model", "hello", [])
+    search_service.search("nb-model", "hello", [])
+    assert len(calls) == 1
+
+    # Результат, сохранённый под старой моделью, не отдаётся после смены модели даже без сброса кэша.
+    monkeypatch.setattr(search_service, "_ENGINE_STATE", search_service._EngineState(model="model-b"))
+    search_service.search("nb-model", "hello", [])
+    assert len(calls) == 2
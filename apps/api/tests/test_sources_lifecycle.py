@@ -3,12 +3,19 @@
 # --- Imports ---
 from __future__ import annotations
 
+import sqlite3
+import threading
 import time
+from uuid import uuid4
 
+import pytest
 from fastapi.testclient import TestClient
 
+from apps.api.config import CHUNKS_DIR, NOTEBOOKS_DB_DIR
 from apps.api.main import app
-from apps.api.config import CHUNKS_DIR
+from apps.api.services.notebook_db import close_notebook_connections, db_for_notebook
+from apps.api.services.parse import load_parsing_payload
+from apps.api.store import store
 
 client = TestClient(app)
 
@@ -20,6 +27,14 @@ def _first_notebook_id() -> str:
     return response.json()[0]['id']
 
 
+def _has_parsing_result(notebook_id: str, source_id: str) -> bool:
+    try:
+        return bool(load_parsing_payload(notebook_id, source_id)['chunks'])
+    except FileNotFoundError:
+        return False
+
+
+
 def _wait_source_status(source_id: str, status: str, timeout_s: float = 10.0) -> None:
     deadline = time.time() + timeout_s
     while time.time() < deadline:
@@ -47,7 +62,7 @@ def test_source_lifecycle_lamps() -> None:
     source_state = next(item for item in listed if item['id'] == source['id'])
     assert source_state['has_docs'] is True
     assert source_state['has_parsing'] is True
-    assert (CHUNKS_DIR / notebook_id / f"{source['id']}.json").exists()
+    assert _has_parsing_result(notebook_id, source['id'])
 
     delete = client.delete(f"/api/sources/{source['id']}")
     assert delete.status_code == 204
@@ -55,14 +70,14 @@ def test_source_lifecycle_lamps() -> None:
     source_state = next(item for item in listed if item['id'] == source['id'])
     assert source_state['has_docs'] is False
     assert source_state['has_parsing'] is True
-    assert (CHUNKS_DIR / notebook_id / f"{source['id']}.json").exists()
+    assert _has_parsing_result(notebook_id, source['id'])
 
     erase = client.delete(f"/api/sources/{source['id']}/erase")
     assert erase.status_code == 204
     listed = client.get(f'/api/notebooks/{notebook_id}/sources').json()
     source_state = next(item for item in listed if item['id'] == source['id'])
     assert source_state['has_parsing'] is False
-    assert not (CHUNKS_DIR / notebook_id / f"{source['id']}.json").exists()
+    assert not _has_parsing_result(notebook_id, source['id'])
 
 
 def test_parsing_settings_endpoints() -> None:
@@ -75,3 +90,68 @@ def test_parsing_settings_endpoints() -> None:
     updated = client.patch(f'/api/notebooks/{notebook_id}/parsing-settings', json=payload)
     assert updated.status_code == 200
     assert updated.json()['chunk_size'] == 333
+
+
+def test_erase_removes_legacy_parsing_file(tmp_path) -> None:
+    notebook = store.create_notebook('legacy')
+    try:
+        doc = tmp_path / 'legacy.txt'
+        doc.write_text('legacy text', encoding='utf-8')
+        source = store.add_source_from_path(notebook.id, str(doc))
+        legacy = CHUNKS_DIR / notebook.id / f'{source.id}.json'
+        legacy.parent.mkdir(parents=True, exist_ok=True)
+        legacy.write_text('{"metadata": {}, "chunks": [{"text": "old"}]}', encoding='utf-8')
+        # Без записи в БД результат парсинга читается из файла старого формата.
+        assert load_parsing_payload(notebook.id, source.id)['chunks'] == [{'text': 'old'}]
+
+        assert store.erase_source_data(source.id)
+        assert not legacy.exists()
+    finally:
+        store.delete_notebook(notebook.id)
+
+
+def test_upload_name_is_reused_after_file_deletion() -> None:
+    notebook = store.create_notebook('names')
+    try:
+        first = store._next_available_path(notebook.id, 'report.txt')
+        second = store._next_available_path(notebook.id, 'report.txt')
+        assert (first.name, second.name) == ('report.txt', 'report_1.txt')
+
+        first.unlink()
+        assert store._next_available_path(notebook.id, 'report.txt').name == 'report.txt'
+        assert store._next_available_path(notebook.id, 'report.txt').name == 'report_2.txt'
+    finally:
+        store.delete_notebook(notebook.id)
+    assert notebook.id not in store._name_counters
+
+
+def test_notebook_connections_close_after_owner_returns_them() -> None:
+    notebook_id = f'pool-{uuid4().hex}'
+    seen: dict = {}
+    leased = threading.Event()
+
+    def owner() -> None:
+        notebook_db = db_for_notebook(notebook_id)
+        seen['db'] = notebook_db
+        leased.set()
+        time.sleep(0.2)
+        # Удаление ждёт возврата соединения и не закрывает его посреди работы владельца.
+        seen['usable'] = notebook_db.conn.execute('SELECT 1').fetchone()[0]
+        notebook_db.close()
+
+    thread = threading.Thread(target=owner)
+    thread.start()
+    leased.wait(5)
+    close_notebook_connections(notebook_id)
+    thread.join(5)
+
+    assert seen['usable'] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        seen['db'].conn.execute('SELECT 1')
+    with pytest.raises(LookupError):
+        db_for_notebook(notebook_id)
+    for suffix in ('.db', '.db-wal', '.db-shm'):
+        path = NOTEBOOKS_DB_DIR / f'{notebook_id}{suffix}'
+        # Ни одного открытого дескриптора: удаление прошло бы и на Windows.
+        path.unlink(missing_ok=True)
+        assert not path.exists()